@@ -0,0 +1,425 @@
+"""Pick and build the FAISS index type from the number of vectors.
+
+Small indexes stay exact (IndexFlatL2). Mid-sized ones become HNSW graphs.
+The largest become IVF with coarse centroids trained on a random sample.
+Stores are always written through LangChain's FAISS wrapper, and only
+``faiss_db.index`` is swapped, so the docstore mapping is unchanged
+(positions 0..n-1 in insertion order).
+
+Neither HNSW nor IVF can delete the way LangChain expects (remove and
+renumber positions), and a memory-mapped index (faiss_store) cannot be
+written at all. Before a write, ensure_flat() turns a per-document index
+back into an exact in-memory one; optimize_store() picks the right type
+again before the next save.
+
+The corpus index (corpus_index) is too large to rebuild on every upload.
+build_id_index() wraps its trained index in an IndexIDMap2, so rows are
+added and removed by id. Flat indexes remove rows for real; HNSW and IVF
+cannot, so their deleted rows stay behind as tombstones that searches
+exclude. needs_rebuild() says when to retrain instead: when the live count
+calls for another type or quantization, when tombstones pass
+ANN_MAX_DELETED, when IVF lists drift out of balance (ANN_MAX_IMBALANCE) or
+were sized for a very different count, or when a quantized index holds less
+than half or more than twice the vectors its codebooks were trained on, or
+encodes the rows added since ANN_MAX_CODEC_DRIFT times worse than those.
+
+Search-time knobs: ANN_NPROBE (IVF lists probed) and ANN_EF_SEARCH (HNSW
+candidate list size). Run ``python benchmarks.py ann-recall`` to choose them.
+
+Vectors can also be stored quantized (ANN_QUANTIZATION or a per-entry
+option). fp16 halves RAM, int8 quarters it, and pq keeps one byte per
+ANN_PQ_DIMS dimensions. The exact float32 vectors of a quantized index go
+to ``vectors.f32.npy`` next to it. Searches open that file memory-mapped and
+re-rank ANN_RERANK x k (ANN_PQ_RERANK x k for pq) candidates on it, so only the rows that are touched
+are paged in. The write path also rebuilds from it, so quantization error
+never accumulates across incremental updates.
+"""
+import math
+import os
+import shutil
+from typing import Optional, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+
+from faiss_store import INDEX_FILE, is_mapped, make_writable, store_dir
+
+ANN_FLAT_MAX = int(os.environ.get("ANN_FLAT_MAX", "100000"))
+ANN_HNSW_MAX = int(os.environ.get("ANN_HNSW_MAX", "1000000"))
+ANN_HNSW_M = int(os.environ.get("ANN_HNSW_M", "32"))
+ANN_EF_CONSTRUCTION = int(os.environ.get("ANN_EF_CONSTRUCTION", "80"))
+ANN_EF_SEARCH = int(os.environ.get("ANN_EF_SEARCH", "64"))
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "16"))
+# IVF centroids are trained on at most this many sampled vectors per list.
+ANN_IVF_TRAIN_PER_LIST = int(os.environ.get("ANN_IVF_TRAIN_PER_LIST", "64"))
+QUANTIZATIONS = ("none", "fp16", "int8", "pq")
+ANN_QUANTIZATION = os.environ.get("ANN_QUANTIZATION", "none")
+ANN_PQ_DIMS = int(os.environ.get("ANN_PQ_DIMS", "8"))
+# Candidates fetched per requested result and re-scored on exact vectors (int8 / pq only).
+ANN_RERANK = int(os.environ.get("ANN_RERANK", "4"))
+ANN_PQ_RERANK = int(os.environ.get("ANN_PQ_RERANK", "32"))
+EXACT_VECTORS_FILE = "vectors.f32.npy"
+# Id-mapped indexes (see build_id_index) are rebuilt past these.
+ANN_MAX_DELETED = float(os.environ.get("ANN_MAX_DELETED", "0.2"))
+ANN_MAX_IMBALANCE = float(os.environ.get("ANN_MAX_IMBALANCE", "2.0"))
+ANN_MAX_CODEC_DRIFT = float(os.environ.get("ANN_MAX_CODEC_DRIFT", "2.0"))
+# PQ codebooks have 256 centroids per sub-quantizer; below this, int8 is used instead.
+PQ_MIN_VECTORS = 1024
+
+
+def choose_index_type(n_vectors: int) -> str:
+    if n_vectors <= ANN_FLAT_MAX:
+        return "flat"
+    if n_vectors <= ANN_HNSW_MAX:
+        return "hnsw"
+    return "ivf"
+
+
+def choose_quantization(n_vectors: int, quantization: Optional[str] = None) -> str:
+    quantization = quantization or ANN_QUANTIZATION
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"unknown quantization {quantization!r}; expected one of {QUANTIZATIONS}")
+    if quantization == "pq" and n_vectors < PQ_MIN_VECTORS:
+        return "int8"
+    return quantization
+
+
+def _base(index):
+    return index.base if isinstance(index, RerankingIndex) else index
+
+
+def _inner(index):
+    """The index an IndexIDMap2 wraps, for inspecting and tuning it (the wrapper owns it)."""
+    index = _base(index)
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap2) else index
+
+
+def _codec_quantization(codec) -> str:
+    codec = faiss.downcast_index(codec) if codec is not None else None
+    if isinstance(codec, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if codec.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    if isinstance(codec, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def index_spec(index) -> Tuple[str, str]:
+    """(kind, quantization) of a FAISS index, e.g. ("hnsw", "int8")."""
+    index = _inner(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw", _codec_quantization(index.storage)
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf", _codec_quantization(index)
+    return "flat", _codec_quantization(index)
+
+
+def index_kind(index) -> str:
+    return index_spec(index)[0]
+
+
+def ivf_nlist(n_vectors: int) -> int:
+    return max(1, min(65536, int(4 * math.sqrt(n_vectors))))
+
+
+def pq_subquantizers(d: int) -> int:
+    """Largest divisor of d that gives at least ANN_PQ_DIMS dimensions per sub-quantizer."""
+    target = max(1, d // max(1, ANN_PQ_DIMS))
+    return next(m for m in range(target, 0, -1) if d % m == 0)
+
+
+def _factory_string(kind: str, quantization: str, n: int, d: int) -> str:
+    codec = {"none": "Flat", "fp16": "SQfp16", "int8": "SQ8", "pq": f"PQ{pq_subquantizers(d)}"}[quantization]
+    if kind == "hnsw":
+        return f"HNSW{ANN_HNSW_M},{codec}"
+    if kind == "ivf":
+        return f"IVF{ivf_nlist(n)},{codec}"
+    return codec
+
+
+def _trained_index(vectors: np.ndarray, kind: str, quantization: str, seed: int):
+    n, d = vectors.shape
+    index = faiss.index_factory(d, _factory_string(kind, quantization, n, d))
+    if kind == "hnsw":
+        index.hnsw.efConstruction = ANN_EF_CONSTRUCTION
+    if not index.is_trained and n:
+        # IVF: ANN_IVF_TRAIN_PER_LIST per list; SQ8 / PQ codebooks: 40 per PQ centroid
+        lists = ivf_nlist(n) if kind == "ivf" else 1
+        sample_size = min(n, max(lists * ANN_IVF_TRAIN_PER_LIST, 256 * 40))
+        sample = vectors[np.random.default_rng(seed).choice(n, sample_size, replace=False)]
+        index.train(sample)
+    if kind == "ivf":
+        # Lets ensure_flat() and reconstruct() read vectors back later.
+        index.make_direct_map()
+    return index
+
+
+def build_index(vectors: np.ndarray, kind: Optional[str] = None, quantization: str = "none", seed: int = 1234):
+    """A new index of the given (or size-chosen) kind holding vectors at positions 0..n-1."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    kind = kind or choose_index_type(len(vectors))
+    index = _trained_index(vectors, kind, quantization, seed)
+    if len(vectors):
+        index.add(vectors)
+    apply_search_params(index)
+    return index
+
+
+def build_id_index(vectors: np.ndarray, ids: np.ndarray, kind: Optional[str] = None, quantization: str = "none",
+                   seed: int = 1234):
+    """Like build_index(), wrapped in an IndexIDMap2 that holds vectors under ids."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    kind = kind or choose_index_type(len(vectors))
+    index = faiss.IndexIDMap2(_trained_index(vectors, kind, quantization, seed))
+    if len(vectors):
+        index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    apply_search_params(index)
+    return index
+
+
+def stored_ids(index) -> np.ndarray:
+    """Ids index returns as labels: an IndexIDMap2's ids, else positions 0..n-1."""
+    index = _base(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def vector_rows(index) -> int:
+    """Rows of index's exact-vector file: one per label up to the largest."""
+    ids = stored_ids(index)
+    return int(ids.max()) + 1 if len(ids) else 0
+
+
+def can_remove(index) -> bool:
+    """True if remove_ids() really deletes rows of this id-mapped index (flat); HNSW and IVF keep tombstones."""
+    return index_kind(index) == "flat"
+
+
+def codec_error(index, vectors: np.ndarray, sample: int = 1024) -> float:
+    """Mean relative error of (a sample of) vectors after a round trip through index's encoding."""
+    inner = _inner(index)
+    codec = faiss.downcast_index(inner.storage) if isinstance(inner, faiss.IndexHNSW) else inner
+    x = np.ascontiguousarray(vectors[::max(1, len(vectors) // sample)][:sample], dtype=np.float32)
+    if not len(x) or not codec.is_trained:
+        return 0.0
+    decoded = codec.sa_decode(codec.sa_encode(x))
+    return float(np.mean(np.linalg.norm(x - decoded, axis=1) / np.maximum(np.linalg.norm(x, axis=1), 1e-12)))
+
+
+def needs_rebuild(index, live: int, quantization: Optional[str] = None, trained_on: Optional[int] = None,
+                  trained_error: Optional[float] = None, added: Optional[np.ndarray] = None) -> bool:
+    """True if an index updated in place should be rebuilt from its live vectors instead.
+
+    live is the number of rows that are not tombstones. trained_on and
+    trained_error, if known, are the vector count and codec_error() of the
+    last rebuild; added holds the vectors added since.
+    """
+    if not isinstance(_base(index), faiss.IndexIDMap2):
+        return True
+    kind, quantized = index_spec(index)
+    if (kind, quantized) != (choose_index_type(live), choose_quantization(live, quantization)):
+        return True
+    if quantized != "none" and trained_on is not None and not trained_on / 2 <= live <= trained_on * 2:
+        return True
+    if (quantized != "none" and trained_error is not None and added is not None and len(added)
+            and codec_error(index, added) > ANN_MAX_CODEC_DRIFT * max(trained_error, 1e-6)):
+        return True
+    total = _base(index).ntotal
+    if total and (total - live) / total > ANN_MAX_DELETED:
+        return True
+    if kind == "ivf":
+        ivf = _inner(index)
+        if not 0.5 <= ivf_nlist(live) / ivf.nlist <= 2.0:
+            return True
+        if ivf.invlists.imbalance_factor() > ANN_MAX_IMBALANCE:
+            return True
+    return False
+
+
+def apply_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    index = _inner(index)
+    kind = index_kind(index)
+    if kind == "ivf":
+        index.nprobe = min(nprobe or ANN_NPROBE, index.nlist)
+    elif kind == "hnsw":
+        index.hnsw.efSearch = ef_search or ANN_EF_SEARCH
+
+
+def search_parameters(index, selector=None):
+    """SearchParameters of the right subclass so an IDSelector keeps the index's knobs."""
+    index = _inner(index)
+    kind = index_kind(index)
+    if kind == "ivf":
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def all_vectors(index) -> np.ndarray:
+    """Vectors as stored in index (lossy for quantized indexes; see exact_vectors)."""
+    index = _base(index)
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    if index_kind(index) == "ivf":
+        try:
+            return index.reconstruct_n(0, index.ntotal)
+        except RuntimeError:
+            index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def load_exact_vectors(db_path: Optional[str], ntotal: Optional[int]) -> Optional[np.ndarray]:
+    """Memory-mapped float32 vectors saved next to a quantized index, if they have ntotal rows (or any, for None)."""
+    if not db_path:
+        return None
+    path = os.path.join(db_path, EXACT_VECTORS_FILE)
+    try:
+        vectors = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return vectors if ntotal is None or vectors.shape[0] == ntotal else None
+
+
+def exact_vectors(index, db_path: Optional[str] = None) -> np.ndarray:
+    if index_spec(index)[1] != "none":
+        stored = load_exact_vectors(db_path, _base(index).ntotal)
+        if stored is not None:
+            return np.asarray(stored)
+    return all_vectors(index)
+
+
+def write_exact_vectors(db_path: str, vectors: np.ndarray):
+    os.makedirs(db_path, exist_ok=True)
+    path = os.path.join(db_path, EXACT_VECTORS_FILE)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(tmp, path)
+
+
+def ensure_flat(faiss_db, db_path: Optional[str] = None) -> bool:
+    """Swap an approximate, quantized or memory-mapped index for an exact in-memory one before writes.
+
+    A lazy chunk store is read into memory as well.
+
+    Returns True if the index changed.
+    """
+    make_writable(faiss_db)
+    if (index_spec(faiss_db.index) == ("flat", "none") and not isinstance(faiss_db.index, RerankingIndex)
+            and not is_mapped(faiss_db)):
+        return False
+    faiss_db.index = build_index(exact_vectors(faiss_db.index, store_dir(faiss_db, db_path)), "flat")
+    return True
+
+
+def writable_index(faiss_db, db_path: Optional[str] = None):
+    """faiss_db.index in memory and without search wrappers, for add_with_ids / remove_ids; nothing is retrained.
+
+    A memory-mapped index is read again from its file, and a lazy chunk store
+    is read into memory.
+    """
+    make_writable(faiss_db)
+    index = _base(faiss_db.index)
+    if getattr(faiss_db, "mapped_index", None) is index:
+        index = faiss.read_index(os.path.join(store_dir(faiss_db, db_path), INDEX_FILE))
+        faiss_db.mapped_index = None
+    faiss_db.index = index
+    return index
+
+
+def _wanted_spec(faiss_db, quantization: Optional[str], kind: Optional[str]) -> Tuple[str, str]:
+    n = _base(faiss_db.index).ntotal
+    return kind or choose_index_type(n), choose_quantization(n, quantization)
+
+
+def needs_optimize(faiss_db, quantization: Optional[str] = None, kind: Optional[str] = None) -> bool:
+    """True if optimize_store() would rebuild faiss_db.index."""
+    return index_spec(faiss_db.index) != _wanted_spec(faiss_db, quantization, kind)
+
+
+def _copy_exact_vectors(source: Optional[str], db_path: str):
+    src = os.path.join(source, EXACT_VECTORS_FILE) if source else None
+    dst = os.path.join(db_path, EXACT_VECTORS_FILE)
+    if not src or not os.path.exists(src) or os.path.exists(dst) or os.path.abspath(src) == os.path.abspath(dst):
+        return
+    try:
+        # Versions are immutable, so the new one can share the file.
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def optimize_store(faiss_db, db_path: Optional[str] = None, quantization: Optional[str] = None,
+                   kind: Optional[str] = None) -> bool:
+    """Rebuild faiss_db.index as the type and quantization its size calls for; True if rebuilt.
+
+    With a db_path, exact vectors of a quantized index are written (or carried
+    over from the version faiss_db was loaded from) next to it.
+    """
+    wanted = _wanted_spec(faiss_db, quantization, kind)
+    source = store_dir(faiss_db, db_path)
+    faiss_db.index = _base(faiss_db.index)
+    if db_path and wanted[1] == "none" and os.path.exists(os.path.join(db_path, EXACT_VECTORS_FILE)):
+        os.remove(os.path.join(db_path, EXACT_VECTORS_FILE))
+    if index_spec(faiss_db.index) == wanted:
+        apply_search_params(faiss_db.index)
+        if db_path and wanted[1] != "none":
+            _copy_exact_vectors(source, db_path)
+        return False
+    vectors = exact_vectors(faiss_db.index, source)
+    faiss_db.index = build_index(vectors, *wanted)
+    if db_path and wanted[1] != "none":
+        write_exact_vectors(db_path, vectors)
+    return True
+
+
+class RerankingIndex:
+    """Search-only wrapper: ANN search on quantized codes, final order from exact vectors."""
+
+    def __init__(self, base, exact: np.ndarray, factor: int = ANN_RERANK):
+        self.base = base
+        self.exact = exact
+        self.factor = max(1, factor)
+
+    @property
+    def ntotal(self) -> int:
+        return self.base.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.base.d
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.exact[i], dtype=np.float32)
+
+    def search(self, x, k: int, params=None):
+        x = np.asarray(x, dtype=np.float32)
+        fetch = min(self.ntotal, k * self.factor)
+        _, candidates = self.base.search(x, fetch, params=params)
+        distances = np.full((len(x), k), np.inf, dtype=np.float32)
+        labels = np.full((len(x), k), -1, dtype=np.int64)
+        for row, ids in enumerate(candidates):
+            # Sorted ids read the memory-mapped rows in file order.
+            ids = np.sort(ids[ids >= 0])
+            if not len(ids):
+                continue
+            exact = ((np.asarray(self.exact[ids]) - x[row]) ** 2).sum(axis=1)
+            best = np.argsort(exact)[:k]
+            distances[row, :len(best)] = exact[best]
+            labels[row, :len(best)] = ids[best]
+        return distances, labels
+
+
+def rerank_factor(quantization: str) -> int:
+    return {"int8": ANN_RERANK, "pq": ANN_PQ_RERANK}.get(quantization, 1)
+
+
+def prepare_for_search(faiss_db, db_path: Optional[str]):
+    """Apply search knobs and, for int8 / pq indexes, re-rank on the memory-mapped exact vectors."""
+    apply_search_params(faiss_db.index)
+    factor = rerank_factor(index_spec(faiss_db.index)[1])
+    if factor > 1 and not isinstance(faiss_db.index, RerankingIndex):
+        exact = load_exact_vectors(store_dir(faiss_db, db_path), vector_rows(faiss_db.index))
+        if exact is not None:
+            faiss_db.index = RerankingIndex(faiss_db.index, exact, factor)
+    return faiss_db
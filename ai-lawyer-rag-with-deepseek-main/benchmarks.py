@@ -0,0 +1,591 @@
+"""Micro-benchmarks for the indexing and retrieval pipeline.
+
+Run e.g. ``python benchmarks.py embed-throughput --chunks 512``. Nothing here
+needs a real Ollama or Groq account; stand-in servers are started locally.
+"""
+import argparse
+import hashlib
+import json
+import math
+import pickle
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+
+from langchain_community.embeddings import OllamaEmbeddings  # type: ignore
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ann_index import RerankingIndex, apply_search_params, build_index, ivf_nlist, rerank_factor
+from embedding_pipeline import BatchedEmbeddings
+from legal_chunker import LegalTextSplitter, annotate_headings
+from pdf_extract import iter_pdf_pages
+
+SAMPLE_PDF = "universal_declaration_of_human_rights.pdf"
+
+
+# ==================== Embedding throughput ====================
+
+def _fake_vector(text: str, dim: int) -> List[float]:
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [seed[i % len(seed)] / 255.0 for i in range(dim)]
+
+
+def start_standin_embedding_server(latency_ms: float = 20.0, dim: int = 768) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve Ollama's /api/embeddings on localhost with a fixed per-request latency."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(latency_ms / 1000.0)
+            body = json.dumps({"embedding": _fake_vector(payload.get("prompt", ""), dim)}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench_embed_throughput(args):
+    server, base_url = start_standin_embedding_server(args.latency_ms, args.dim)
+    texts = [f"Article {i}. Everyone has the right to benchmark chunk {i}." for i in range(args.chunks)]
+    client = OllamaEmbeddings(model="stand-in", base_url=base_url)
+    configs = [("sequential", None, None)] + [
+        (f"batch={b} workers={w}", b, w) for b in args.batch_sizes for w in args.concurrency
+    ]
+    print(f"{args.chunks} chunks, {args.latency_ms:.0f} ms/request stand-in server at {base_url}")
+    print(f"{'mode':<28}{'seconds':>10}{'chunks/sec':>14}")
+    try:
+        for label, batch_size, workers in configs:
+            if batch_size is None:
+                embedder = client
+            else:
+                embedder = BatchedEmbeddings(client, batch_size=batch_size, concurrency=workers)
+            start = time.perf_counter()
+            vectors = embedder.embed_documents(texts)
+            elapsed = time.perf_counter() - start
+            assert len(vectors) == len(texts)
+            print(f"{label:<28}{elapsed:>10.2f}{len(texts) / elapsed:>14.1f}")
+    finally:
+        server.shutdown()
+
+
+# ==================== Chunking ====================
+
+class HashedBowEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors (hashed, L2-normalised) for offline recall tests."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _vector(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for word in re.findall(r"[a-z]{3,}", text.lower()):
+            vec[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+# (question, phrase that only the answering provision contains) for the sample PDF.
+UDHR_QUERIES: List[Tuple[str, str]] = [
+    ("Can I seek asylum in another country to escape persecution?", "asylum from\npersecution"),
+    ("Is slavery or the slave trade allowed?", "slave trade"),
+    ("Am I presumed innocent when charged with a crime?", "presumed\ninnocent"),
+    ("Can someone interfere with my privacy, family or correspondence?", "privacy, family, home"),
+    ("Do I have a right to a nationality?", "right to a nationality"),
+    ("Who can marry and found a family?", "marry and to found a family"),
+    ("Can my property be taken from me arbitrarily?", "deprived of his property"),
+    ("Is there a right to peaceful assembly and association?", "peaceful assembly"),
+    ("Do I have a right to rest, leisure and holidays with pay?", "periodic holidays with pay"),
+    ("Is elementary education free and compulsory?", "compulsory"),
+    ("Do workers have the right to form trade unions?", "trade unions"),
+    ("Can I be subjected to torture or degrading punishment?", "torture"),
+]
+
+
+def _chunkers() -> Dict[str, Callable[[List], List]]:
+    recursive = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+    return {
+        "recursive 1000/200": recursive.split_documents,
+        "legal": lambda pages: LegalTextSplitter().split_documents(annotate_headings(pages)),
+    }
+
+
+def bench_chunking(args):
+    from langchain_community.vectorstores import FAISS  # type: ignore
+    import faiss  # type: ignore
+
+    embeddings = HashedBowEmbeddings(args.dim)
+    source_chars = sum(len(p.page_content) for p in iter_pdf_pages(args.pdf))
+    print(f"{args.pdf}: {source_chars} chars, {len(UDHR_QUERIES)} queries, recall@{args.k}")
+    print(f"{'splitter':<22}{'chunks':>8}{'indexed chars':>15}{'index bytes':>13}{'recall':>9}")
+    for label, split in _chunkers().items():
+        chunks = split(list(iter_pdf_pages(args.pdf)))
+        db = FAISS.from_documents(chunks, embeddings)
+        size = len(faiss.serialize_index(db.index)) + len(pickle.dumps((db.docstore, db.index_to_docstore_id)))
+        hits = 0
+        for question, phrase in UDHR_QUERIES:
+            top = db.similarity_search(question, k=args.k)
+            hits += any(phrase in d.page_content for d in top)
+        indexed = sum(len(c.page_content) for c in chunks)
+        print(f"{label:<22}{len(chunks):>8}{indexed:>15}{size:>13}{hits / len(UDHR_QUERIES):>9.2f}")
+
+
+# ==================== ANN index: recall vs latency ====================
+
+def _clustered_vectors(n: int, dim: int, clusters: int, rng):
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.35 * rng.standard_normal((n, dim))).astype("float32")
+
+
+def _timed_search(index, queries, k: int):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, (time.perf_counter() - start) * 1000.0 / len(queries)
+
+
+def bench_ann_recall(args):
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    data = _clustered_vectors(args.vectors, args.dim, max(16, args.vectors // 2000), rng)
+    queries = data[rng.choice(args.vectors, args.queries, replace=False)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)).astype("float32")
+
+    flat = build_index(data, "flat")
+    truth, flat_ms = _timed_search(flat, queries, args.k)
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k} vs exact search")
+    print(f"{'index':<8}{'knob':<14}{'build s':>9}{'ms/query':>10}{'recall':>9}")
+    print(f"{'flat':<8}{'-':<14}{0.0:>9.2f}{flat_ms:>10.3f}{1.0:>9.3f}")
+
+    def recall(found) -> float:
+        return float(np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)]))
+
+    for kind, knob, values in (("ivf", "nprobe", args.nprobe), ("hnsw", "efSearch", args.ef_search)):
+        start = time.perf_counter()
+        index = build_index(data, kind)
+        built = time.perf_counter() - start
+        label = f"ivf nlist={ivf_nlist(args.vectors)}" if kind == "ivf" else "hnsw"
+        print(f"# {label}")
+        for value in values:
+            if kind == "ivf":
+                apply_search_params(index, nprobe=value)
+            else:
+                apply_search_params(index, ef_search=value)
+            found, ms = _timed_search(index, queries, args.k)
+            print(f"{kind:<8}{f'{knob}={value}':<14}{built:>9.2f}{ms:>10.3f}{recall(found):>9.3f}")
+
+
+# ==================== Quantized vector storage ====================
+
+def bench_quantization(args):
+    import os
+    import tempfile
+
+    import faiss  # type: ignore
+    import numpy as np
+
+    rng = np.random.default_rng(11)
+    data = _clustered_vectors(args.vectors, args.dim, max(16, args.vectors // 500), rng)
+    queries = data[rng.choice(args.vectors, args.queries, replace=False)] + 0.05 * rng.standard_normal(
+        (args.queries, args.dim)).astype("float32")
+    # Exact vectors are read back memory-mapped, as prepare_for_search() does.
+    exact_path = os.path.join(tempfile.mkdtemp(), "vectors.f32.npy")
+    np.save(exact_path, data)
+    exact = np.load(exact_path, mmap_mode="r")
+
+    flat = build_index(data, args.kind, "none")
+    truth, _ = _timed_search(flat, queries, args.k)
+    baseline = len(faiss.serialize_index(flat))
+    print(f"{args.vectors} vectors x {args.dim} dims, {args.kind} index, recall@{args.k} vs float32 {args.kind}")
+    print(f"{'storage':<18}{'index MB':>10}{'vs float32':>12}{'ms/query':>10}{'recall':>9}")
+    for quantization in ("none", "fp16", "int8", "pq"):
+        index = flat if quantization == "none" else build_index(data, args.kind, quantization)
+        size = len(faiss.serialize_index(index))
+        variants = [(quantization, index)]
+        factor = args.rerank or rerank_factor(quantization)
+        if quantization in ("int8", "pq") and factor > 1:
+            variants.append((f"{quantization}+rerank x{factor}", RerankingIndex(index, exact, factor)))
+        for label, searcher in variants:
+            found, ms = _timed_search(searcher, queries, args.k)
+            hit = float(np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)]))
+            print(f"{label:<18}{size / 2**20:>10.1f}{size / baseline:>11.0%} {ms:>10.3f}{hit:>9.3f}")
+
+
+# ==================== Memory-mapped index loading ====================
+
+def _rss_mb() -> float:
+    import os
+    import resource
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _load_probe(db_path: str, dim: int, mmap: bool, queries: int) -> Tuple[float, float, float, float]:
+    """Runs in a fresh process: (index.faiss ms, whole-store ms, RSS MB the store added, ms/query)."""
+    import os
+
+    import faiss  # type: ignore
+    import numpy as np
+
+    from faiss_store import _MMAP_FLAGS, load_store
+
+    start = time.perf_counter()
+    index = faiss.read_index(os.path.join(db_path, "index.faiss"), _MMAP_FLAGS if mmap else 0)
+    index_ms = (time.perf_counter() - start) * 1000.0
+    del index
+    before = _rss_mb()
+    start = time.perf_counter()
+    faiss_db = load_store(db_path, HashedBowEmbeddings(dim), mmap=mmap)
+    store_ms = (time.perf_counter() - start) * 1000.0
+    grown = _rss_mb() - before
+    q = np.random.default_rng(3).standard_normal((queries, dim)).astype("float32")
+    found, ms = _timed_search(faiss_db.index, q, 10)
+    # Fetch the hits' chunks the way similarity_search does
+    for pos in found[0]:
+        faiss_db.docstore.search(faiss_db.index_to_docstore_id[int(pos)])
+    return index_ms, store_ms, grown, ms
+
+
+def bench_mmap_load(args):
+    import multiprocessing
+    import tempfile
+
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+    from langchain_community.vectorstores import FAISS  # type: ignore
+    from langchain_core.documents import Document
+
+    from faiss_store import save_store
+
+    rng = np.random.default_rng(5)
+    data = rng.standard_normal((args.vectors, args.dim)).astype("float32")
+    ids = [str(i) for i in range(args.vectors)]
+    docstore = InMemoryDocstore({i: Document(page_content=f"chunk {i}") for i in ids})
+    for quantization in args.quantization:
+        db_path = tempfile.mkdtemp()
+        index = build_index(data, args.kind, quantization)
+        save_store(FAISS(HashedBowEmbeddings(args.dim), index, docstore, dict(enumerate(ids))), db_path)
+        print(f"# {args.vectors} vectors x {args.dim} dims, {args.kind}/{quantization}, cold process per load")
+        print(f"{'load':<8}{'index ms':>10}{'store ms':>10}{'+RSS MB':>10}{'ms/query':>10}")
+        ctx = multiprocessing.get_context("spawn")
+        for mmap in (False, True):
+            with ctx.Pool(1) as pool:
+                index_ms, store_ms, grown, ms = pool.apply(_load_probe, (db_path, args.dim, mmap, args.queries))
+            print(f"{'mmap' if mmap else 'heap':<8}{index_ms:>10.1f}{store_ms:>10.1f}{grown:>10.1f}{ms:>10.3f}")
+
+
+# ==================== Manifest filters ====================
+
+def bench_manifest_filter(args):
+    import os
+    import random
+    import tempfile
+
+    from manifest import ManifestStore
+
+    rng = random.Random(11)
+    words = ["lease", "contract", "supply", "employment", "tenancy", "appeal", "judgment", "petition",
+             "agreement", "affidavit", "notice", "bail", "sale", "deed", "partnership", "licence"]
+    tags = [f"tag{i}" for i in range(50)]
+    entries = [{
+        "doc_id": f"{i:064x}",
+        "name": f"{rng.choice(words).title()} {rng.choice(words)} {i}.pdf",
+        "created_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "tags": rng.sample(tags, 2),
+    } for i in range(args.documents)]
+    store = ManifestStore(os.path.join(tempfile.mkdtemp(), "manifest.sqlite3"), json_path=None)
+    start = time.perf_counter()
+    store.upsert(entries)
+    print(f"# {args.documents} documents, insert {time.perf_counter() - start:.2f}s")
+    store.entries()  # warm the per-process entry cache, as a running app has
+    cases = [
+        ("tag", {"tags": ["tag7"]}, lambda e: "tag7" in e["tags"]),
+        ("prefix", {"name_prefix": "Bail sale"}, lambda e: e["name"].lower().startswith("bail sale")),
+        ("substring", {"name_contains": "deed 12"}, lambda e: "deed 12" in e["name"].lower()),
+        ("substring-rare", {"name_contains": "9999"}, lambda e: "9999" in e["name"].lower()),
+    ]
+    print(f"{'filter':<16}{'hits':>8}{'index ms':>10}{'entries ms':>12}{'scan ms':>10}")
+    for label, filters, match in cases:
+        timings = []
+        for lookup in (store.match_ids, store.query, lambda **_: [e for e in store.entries() if match(e)]):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                hits = lookup(**filters)
+            timings.append((time.perf_counter() - start) * 1000.0 / args.repeat)
+        assert len(hits) == len(store.match_ids(**filters)), label
+        print(f"{label:<16}{len(hits):>8}{timings[0]:>10.3f}{timings[1]:>12.3f}{timings[2]:>10.3f}")
+
+
+# ==================== BM25: precomputed corpus index vs per-query ====================
+
+def bench_bm25(args):
+    import os
+    import random
+    import tempfile
+
+    from langchain_community.vectorstores import FAISS  # type: ignore
+    from langchain_core.documents import Document
+    from rank_bm25 import BM25Okapi
+
+    from bm25_index import bm25_path, hybrid_search, store_bm25, tokenize
+    from faiss_store import bind_version, save_store
+
+    rng = random.Random(3)
+    # Zipf-like vocabulary: a few very common words and a long tail of rare ones
+    vocab = [f"w{i}" for i in range(args.vocab)]
+    weights = [1.0 / (i + 1) for i in range(args.vocab)]
+    texts = [" ".join(rng.choices(vocab, weights, k=args.chunk_words)) for _ in range(args.chunks)]
+    emb = HashedBowEmbeddings(args.dim)
+    db_path = tempfile.mkdtemp()
+    faiss_db = FAISS.from_embeddings(list(zip(texts, emb.embed_documents(texts))), emb,
+                                     ids=[str(i) for i in range(args.chunks)])
+    start = time.perf_counter()
+    save_store(faiss_db, db_path, lexical=False)
+    base_ms = (time.perf_counter() - start) * 1000.0
+    start = time.perf_counter()
+    save_store(faiss_db, db_path)
+    print(f"# {args.chunks} chunks of {args.chunk_words} words; bm25.sqlite {os.path.getsize(bm25_path(db_path)) / 2**20:.1f} MB, "
+          f"save {base_ms:.0f} ms without / {(time.perf_counter() - start) * 1000.0:.0f} ms with it")
+    bind_version(faiss_db, db_path)
+    index = store_bm25(faiss_db)
+    queries = [" ".join(rng.sample(texts[rng.randrange(args.chunks)].split(), 3)) for _ in range(args.queries)]
+
+    def vector_search(query):
+        time.sleep(args.embed_ms / 1000.0)  # query embedding round trip (Ollama)
+        return faiss_db.max_marginal_relevance_search(query, k=10, fetch_k=40)
+
+    def candidates_only(query):
+        docs = vector_search(query)
+        return BM25Okapi([tokenize(d.page_content) for d in docs]).get_scores(tokenize(query)), docs
+
+    def sequential(query):
+        docs = vector_search(query)
+        return docs, index.search(query)
+
+    rows = [
+        ("per-query", "BM25Okapi over the 10 vector candidates", candidates_only),
+        ("index", "precomputed corpus BM25, top 40", lambda q: index.search(q)),
+        ("corpus-okapi", "BM25Okapi built over every chunk", None),
+        ("sequential", "vector search, then index BM25", sequential),
+        ("parallel", "hybrid_search: both at once + RRF", lambda q: hybrid_search(faiss_db, q, lambda: vector_search(q))),
+    ]
+    chunk_ids = {t: str(i) for i, t in enumerate(texts)}
+    truth = {q: {str(p) for p, _ in index.search(q, args.k)} for q in queries}
+    print(f"{'mode':<14}{'ms/query':>10}{'lexical recall@' + str(args.k):>19}  what")
+    for label, what, run in rows:
+        if run is None:
+            start = time.perf_counter()
+            BM25Okapi([tokenize(t) for t in texts]).get_scores(tokenize(queries[0]))
+            print(f"{label:<14}{(time.perf_counter() - start) * 1000.0:>10.1f}{'':>19}  {what}")
+            continue
+        start = time.perf_counter()
+        results = [run(q) for q in queries]
+        ms = (time.perf_counter() - start) * 1000.0 / len(queries)
+        found = 0
+        for q, result in zip(queries, results):
+            if label == "per-query":
+                docs = result[1]
+            elif label == "index":
+                docs = [Document(page_content=texts[p], id=str(p)) for p, _ in result]
+            elif label == "sequential":
+                docs = result[0] + [Document(page_content=texts[p], id=str(p)) for p, _ in result[1]]
+            else:
+                docs = [d for d, _ in result[0]]
+            found += len(truth[q] & {chunk_ids[d.page_content] for d in docs})
+        print(f"{label:<14}{ms:>10.2f}{found / (args.k * len(queries)):>19.2f}  {what}")
+
+
+# ==================== LLM rerank latency and tokens ====================
+
+class StandinChatClient:
+    """Groq-shaped chat client: fixed relevance per chunk, latency = round trip + output tokens.
+
+    Answers both the per-chunk prompt and the listwise JSON prompt of
+    llm_rerank, and counts prompt and completion tokens the same way
+    (llm_rerank.estimate_tokens).
+    """
+
+    def __init__(self, latency_ms: float, slow_ms: float = 0.0, slow_rate: float = 0.0, token_ms: float = 2.0,
+                 seed: int = 7):
+        import random
+        from types import SimpleNamespace
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.latency_ms = latency_ms
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.token_ms = token_ms
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @staticmethod
+    def relevance(chunk: str) -> float:
+        # Keyed on the chunk's first sentence, so truncated chunks keep their score
+        key = chunk.split(".", 1)[0]
+        return int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:4], 16) / 0xFFFF
+
+    def _reply(self, prompt: str, listwise: bool) -> str:
+        if not listwise:
+            return f"{self.relevance(prompt.rsplit('Chunk:' + chr(10), 1)[-1]):.3f}"
+        passages = re.findall(r"\n\[(\d+)\] ([^\n]*)", prompt)
+        items = sorted(({"id": int(n), "score": round(self.relevance(text), 3)} for n, text in passages),
+                       key=lambda item: item["score"], reverse=True)
+        return json.dumps({"scores": items})
+
+    def _create(self, model: str, messages: List[Dict], temperature: float = 0.0, timeout: float = None,
+                response_format: Dict = None, **_):
+        from types import SimpleNamespace
+
+        from llm_rerank import estimate_tokens
+
+        prompt = messages[-1]["content"]
+        content = self._reply(prompt, response_format is not None)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += estimate_tokens(prompt)
+            self.completion_tokens += estimate_tokens(content)
+            slow = self._rng.random() < self.slow_rate
+            delay = self.slow_ms if slow else self.latency_ms * (0.75 + 0.5 * self._rng.random())
+        delay = (delay + estimate_tokens(content) * self.token_ms) / 1000.0
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("stand-in request timed out")
+        time.sleep(delay)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def bench_rerank_latency(args):
+    from llm_rerank import llm_score, rank_listwise, score_chunks
+
+    filler = " Everyone is entitled to the rights and freedoms set forth in this Declaration, without distinction."
+    chunks = [f"Article {i}. Everyone has the right to {i} things under the law." + filler * (args.chunk_chars // len(filler))
+              for i in range(args.candidates)]
+    query = "What rights does everyone have?"
+    truth = [StandinChatClient.relevance(c) for c in chunks]
+    ideal = sorted(range(len(chunks)), key=lambda i: truth[i], reverse=True)[:args.k]
+    print(f"# {args.candidates} candidates of ~{args.chunk_chars} chars, {args.latency_ms:.0f} ms per call "
+          f"+ {args.token_ms:.0f} ms per output token, {args.slow_rate:.0%} of calls take {args.slow_ms:.0f} ms, "
+          f"timeout {args.timeout:.1f}s, listwise budget {args.budget} tokens")
+    print(f"{'mode':<14}{'wall ms':>10}{'calls':>7}{'prompt tok':>12}{'output tok':>12}{'unscored':>10}"
+          f"{'top-k overlap':>15}")
+    modes = {
+        "sequential": lambda client: [llm_score(client, "standin", query, c, timeout=args.timeout) for c in chunks],
+        "concurrent": lambda client: score_chunks(client, "standin", query, chunks, timeout=args.timeout),
+        "listwise": lambda client: rank_listwise(client, "standin", query, chunks, args.timeout, args.budget),
+    }
+    for mode, run in modes.items():
+        client = StandinChatClient(args.latency_ms, args.slow_ms, args.slow_rate, args.token_ms)
+        start = time.perf_counter()
+        scores = run(client)
+        ms = (time.perf_counter() - start) * 1000.0
+        # Missing scores fall back to the retrieval order, as in hybrid_rerank
+        blended = [s if s is not None else 1.0 - i / len(chunks) for i, s in enumerate(scores)]
+        top = sorted(range(len(chunks)), key=lambda i: blended[i], reverse=True)[:args.k]
+        unscored = sum(s is None for s in scores)
+        print(f"{mode:<14}{ms:>10.0f}{client.calls:>7}{client.prompt_tokens:>12}{client.completion_tokens:>12}"
+              f"{unscored:>10}{len(set(top) & set(ideal)) / args.k:>15.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Lawyer RAG benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("embed-throughput", help="Chunks/sec of the batched embedding stage")
+    p.add_argument("--chunks", type=int, default=256)
+    p.add_argument("--latency-ms", type=float, default=20.0)
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32])
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    p.set_defaults(func=bench_embed_throughput)
+
+    p = sub.add_parser("chunking", help="Chunk count, index size and recall@k: recursive vs legal splitter")
+    p.add_argument("--pdf", default=SAMPLE_PDF)
+    p.add_argument("--k", type=int, default=3)
+    p.add_argument("--dim", type=int, default=512)
+    p.set_defaults(func=bench_chunking)
+
+    p = sub.add_parser("ann-recall", help="Recall@k vs latency for Flat, IVF (nprobe) and HNSW (efSearch)")
+    p.add_argument("--vectors", type=int, default=200000)
+    p.add_argument("--dim", type=int, default=128)
+    p.add_argument("--queries", type=int, default=500)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    p.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    p.set_defaults(func=bench_ann_recall)
+
+    p = sub.add_parser("quantization", help="Index RAM and recall@k of fp16 / int8 / PQ storage vs float32")
+    p.add_argument("--vectors", type=int, default=20000)
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--kind", choices=["flat", "hnsw", "ivf"], default="flat")
+    p.add_argument("--rerank", type=int, default=None, help="Override ANN_RERANK / ANN_PQ_RERANK")
+    p.set_defaults(func=bench_quantization)
+
+    p = sub.add_parser("mmap-load", help="Cold load time and resident memory: heap read vs read-only mmap")
+    p.add_argument("--vectors", type=int, default=200000)
+    p.add_argument("--dim", type=int, default=768)
+    p.add_argument("--queries", type=int, default=20)
+    p.add_argument("--kind", choices=["flat", "hnsw", "ivf"], default="flat")
+    p.add_argument("--quantization", nargs="+", default=["none", "int8"])
+    p.set_defaults(func=bench_mmap_load)
+
+    p = sub.add_parser("manifest-filter", help="Tag, name prefix and substring filters: manifest indexes vs full scan")
+    p.add_argument("--documents", type=int, default=20000)
+    p.add_argument("--repeat", type=int, default=20)
+    p.set_defaults(func=bench_manifest_filter)
+
+    p = sub.add_parser("bm25", help="Lexical recall and latency: precomputed corpus BM25 + RRF vs per-query BM25")
+    p.add_argument("--chunks", type=int, default=20000)
+    p.add_argument("--chunk-words", type=int, default=150)
+    p.add_argument("--vocab", type=int, default=30000)
+    p.add_argument("--dim", type=int, default=256)
+    p.add_argument("--queries", type=int, default=50)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--embed-ms", type=float, default=20.0)
+    p.set_defaults(func=bench_bm25)
+
+    p = sub.add_parser("rerank-latency", help="Latency and tokens of LLM reranking: sequential, concurrent, listwise")
+    p.add_argument("--candidates", type=int, default=15)
+    p.add_argument("--chunk-chars", type=int, default=1000)
+    p.add_argument("--token-ms", type=float, default=2.0)
+    p.add_argument("--budget", type=int, default=4000, help="Listwise token budget (RERANK_TOKEN_BUDGET)")
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--latency-ms", type=float, default=400.0)
+    p.add_argument("--slow-ms", type=float, default=5000.0)
+    p.add_argument("--slow-rate", type=float, default=0.1)
+    p.add_argument("--timeout", type=float, default=2.0)
+    p.set_defaults(func=bench_rerank_latency)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
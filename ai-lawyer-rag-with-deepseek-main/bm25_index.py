@@ -0,0 +1,241 @@
+"""Precomputed BM25 index stored next to a FAISS index, and rank fusion.
+
+save_store() writes ``bm25.sqlite`` into every version directory it writes,
+built from that version's chunks.sqlite, so its positions are the vector
+positions of index.faiss. There is one row per term, holding the term's
+posting list (positions, then term frequencies) as a packed int32 blob, and
+the chunk lengths are stored as one blob. A query reads only the rows of its
+own terms and scores them with numpy. IDF, chunk lengths and the average
+length cover the whole index, not a page of candidates. Published versions
+are never modified, so a version saved before this (or with an older
+BM25_FORMAT) has no usable file until its next save; store_bm25() returns
+None for it and callers score their vector candidates instead.
+
+Scoring is Okapi BM25 with BM25_K1 and BM25_B, and uses the non-negative
+IDF log(1 + (N - df + 0.5) / (df + 0.5)). Very common terms therefore add
+little instead of subtracting.
+
+hybrid_search() runs the lexical search and the vector search in parallel
+and merges the two rankings with reciprocal rank fusion:
+score = sum 1 / (RRF_K + rank). Chunks that only one side found still
+reach the reranker.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chunk_store import ChunkStore, chunk_store_path
+
+BM25_FILE = "bm25.sqlite"
+# Bump when tokenize() changes: older files are ignored until the index is saved again.
+BM25_FORMAT = 1
+BM25_K1 = float(os.environ.get("BM25_K1", "1.5"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+BM25_TOP_K = int(os.environ.get("BM25_TOP_K", "40"))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def bm25_path(db_path: str) -> str:
+    return os.path.join(db_path, BM25_FILE)
+
+
+def write_bm25_index(db_path: str, rows: Optional[Iterable[Tuple[int, str]]] = None):
+    """Write db_path/bm25.sqlite from (position, text) rows (default: db_path's chunks.sqlite)."""
+    store = None
+    if rows is None:
+        store = ChunkStore(chunk_store_path(db_path))
+        rows = store.texts()
+    term_ids: Dict[str, int] = {}
+    lengths: List[int] = []
+    term_parts, pos_parts, tf_parts = [], [], []
+    try:
+        for pos, text in rows:
+            tokens = tokenize(text)
+            if pos >= len(lengths):
+                lengths.extend([0] * (pos + 1 - len(lengths)))
+            lengths[pos] = len(tokens)
+            counts = Counter(tokens)
+            term_parts.append(np.array([term_ids.setdefault(t, len(term_ids)) for t in counts], dtype=np.int32))
+            tf_parts.append(np.fromiter(counts.values(), dtype=np.int32, count=len(counts)))
+            pos_parts.append(np.full(len(counts), pos, dtype=np.int32))
+    finally:
+        if store is not None:
+            store.close()
+    terms = np.concatenate(term_parts) if term_parts else np.zeros(0, dtype=np.int32)
+    # Group postings by term; stable, so each list stays in position order
+    order = np.argsort(terms, kind="stable")
+    positions = np.concatenate(pos_parts)[order] if pos_parts else terms
+    freqs = np.concatenate(tf_parts)[order] if tf_parts else terms
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=len(term_ids)))))
+    path = bm25_path(db_path)
+    tmp = f"{path}.{threading.get_ident()}-{time.time_ns()}.tmp"
+    try:
+        conn = sqlite3.connect(tmp)
+        try:
+            # A private file that is renamed into place: no journal needed.
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value)")
+            conn.execute("CREATE TABLE terms (term TEXT PRIMARY KEY, postings BLOB NOT NULL) WITHOUT ROWID")
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("format", BM25_FORMAT),
+                ("lengths", np.asarray(lengths, dtype="<i4").tobytes()),
+            ])
+            conn.executemany(
+                "INSERT INTO terms (term, postings) VALUES (?, ?)",
+                ((term, np.concatenate((positions[bounds[i]:bounds[i + 1]], freqs[bounds[i]:bounds[i + 1]]))
+                  .astype("<i4").tobytes()) for term, i in term_ids.items()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class Bm25Index:
+    """Read-only connection to one bm25.sqlite, safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # immutable=1: the file is never modified in place, only replaced.
+        uri = Path(path).absolute().as_uri() + "?mode=ro&immutable=1"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self.format = meta.get("format")
+        lengths = np.frombuffer(meta.get("lengths") or b"", dtype="<i4").astype(np.float32)
+        self.count = len(lengths)
+        avgdl = float(lengths.mean()) if self.count else 1.0
+        # Per-chunk part of the BM25 denominator, fixed for the life of the file
+        self._norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / max(avgdl, 1e-9))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk position for query."""
+        scores = np.zeros(self.count, dtype=np.float32)
+        terms = sorted(set(tokenize(query)))
+        if not terms or not self.count:
+            return scores
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT postings FROM terms WHERE term IN ({','.join('?' * len(terms))})", terms
+            ).fetchall()
+        for (blob,) in rows:
+            packed = np.frombuffer(blob, dtype="<i4")
+            df = len(packed) // 2
+            positions, tf = packed[:df], packed[df:].astype(np.float32)
+            idf = math.log(1.0 + (self.count - df + 0.5) / (df + 0.5))
+            scores[positions] += idf * tf * (BM25_K1 + 1.0) / (tf + self._norm[positions])
+        return scores
+
+    def search(self, query: str, k: int = BM25_TOP_K) -> List[Tuple[int, float]]:
+        """Top k (position, score) pairs with a non-zero score, best first."""
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(p), float(scores[p])) for p in hits]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_bm25_index(db_path: str, expected_count: Optional[int] = None) -> Optional[Bm25Index]:
+    """The BM25 index of version directory db_path, or None if it is missing or stale."""
+    path = bm25_path(db_path)
+    if not os.path.exists(path):
+        return None
+    index = Bm25Index(path)
+    if index.format == BM25_FORMAT and expected_count in (None, index.count):
+        return index
+    index.close()
+    return None
+
+
+def store_bm25(faiss_db) -> Optional[Bm25Index]:
+    """BM25 index of the version faiss_db was loaded from or saved to, or None if there is none."""
+    version_path = getattr(faiss_db, "store_path", None)
+    if not version_path:
+        return None
+    index = getattr(faiss_db, "bm25_index", None)
+    if index is not None and index.path == bm25_path(version_path):
+        return index
+    try:
+        index = open_bm25_index(version_path, faiss_db.index.ntotal)
+    except Exception:
+        return None
+    if index is not None:
+        faiss_db.bm25_index = index
+    return index
+
+
+def bm25_search(faiss_db, query: str, k: int = BM25_TOP_K) -> List[Tuple[object, float]]:
+    """(document, BM25 score) for the top k chunks of faiss_db's whole index."""
+    index = store_bm25(faiss_db)
+    if index is None:
+        return []
+    results = []
+    for pos, score in index.search(query, k):
+        doc = faiss_db.docstore.search(faiss_db.index_to_docstore_id[pos])
+        if not isinstance(doc, str):
+            results.append((doc, score))
+    return results
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence], key: Callable = lambda d: d.page_content,
+                           k: int = RRF_K) -> List[Tuple[object, float]]:
+    """Items of all rankings with sum(1 / (k + rank)), best first; ties keep first-seen order."""
+    fused: Dict[object, List] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            slot = fused.setdefault(key(item), [item, 0.0])
+            slot[1] += 1.0 / (k + rank)
+    return sorted(((item, score) for item, score in fused.values()), key=lambda x: x[1], reverse=True)
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bm25")
+        return _pool
+
+
+def hybrid_search(faiss_db, query: str, vector_search: Callable[[], List],
+                  k: int = BM25_TOP_K) -> Tuple[List[Tuple[object, float]], Dict[str, float]]:
+    """Vector and BM25 retrieval in parallel, fused with RRF.
+
+    Returns ([(document, fused score)], {page_content: BM25 score}); the
+    second is empty when faiss_db has no usable BM25 index.
+    """
+    lexical = _get_pool().submit(bm25_search, faiss_db, query, k)
+    vector_docs = vector_search()
+    try:
+        lexical_hits = lexical.result()
+    except Exception:
+        lexical_hits = []
+    fused = reciprocal_rank_fusion([vector_docs, [d for d, _ in lexical_hits]])
+    return fused, {d.page_content: s for d, s in lexical_hits}
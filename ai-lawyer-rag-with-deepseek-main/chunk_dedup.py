@@ -0,0 +1,89 @@
+"""Near-duplicate chunk detection with 64-bit SimHash.
+
+Legal PDFs repeat headers, footers, recitals and standard definitions, and
+overlapping windows produce chunks that are almost the same text. Each chunk
+gets a SimHash over word 3-shingles; a chunk within CHUNK_DEDUP_DISTANCE bits
+of an earlier one is not embedded and is listed under that chunk's
+``locations`` instead.
+
+Candidates are found with the usual banding trick: the 64 bits are cut into
+distance + 1 bands, and two signatures within the distance must match
+exactly in at least one band.
+"""
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional
+
+CHUNK_DEDUP = os.environ.get("CHUNK_DEDUP", "1") not in ("0", "false", "False", "")
+CHUNK_DEDUP_DISTANCE = int(os.environ.get("CHUNK_DEDUP_DISTANCE", "3"))
+# Short chunks (headings, page numbers) are cheap and collide too easily to collapse.
+CHUNK_DEDUP_MIN_CHARS = int(os.environ.get("CHUNK_DEDUP_MIN_CHARS", "200"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_BITS = 64
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle:
+        features = [" ".join(words)] if words else []
+    else:
+        features = [" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)]
+    weights = [0] * _BITS
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(_BITS) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimHashIndex:
+    """Signatures of representative chunks, searchable by Hamming distance."""
+
+    def __init__(self, max_distance: int = CHUNK_DEDUP_DISTANCE):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        self._widths = [_BITS // bands + (1 if i < _BITS % bands else 0) for i in range(bands)]
+        self._buckets: List[Dict[int, List[str]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[str, int] = {}
+        self._lengths: Dict[str, int] = {}
+
+    def _bands(self, signature: int) -> List[int]:
+        out, shift = [], 0
+        for width in self._widths:
+            out.append((signature >> shift) & ((1 << width) - 1))
+            shift += width
+        return out
+
+    def add(self, cid: str, signature: int, length: int):
+        self._signatures[cid] = signature
+        self._lengths[cid] = length
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            bucket.setdefault(band, []).append(cid)
+
+    def find(self, signature: int, length: int) -> Optional[str]:
+        """Closest representative within max_distance and of similar length, if any."""
+        best, best_distance = None, self.max_distance + 1
+        seen = set()
+        for bucket, band in zip(self._buckets, self._bands(signature)):
+            for cid in bucket.get(band, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                other = self._lengths[cid]
+                if min(other, length) < 0.9 * max(other, length):
+                    continue
+                distance = hamming(signature, self._signatures[cid])
+                if distance < best_distance:
+                    best, best_distance = cid, distance
+        return best
+
+
+def location(chunk) -> Dict:
+    md = getattr(chunk, "metadata", {}) or {}
+    return {"page": md.get("page"), "start_index": md.get("start_index")}
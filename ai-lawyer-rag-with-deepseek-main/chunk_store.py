@@ -0,0 +1,161 @@
+"""SQLite chunk store that replaces LangChain's pickled index.pkl.
+
+``chunks.sqlite`` next to index.faiss holds one row per vector position:
+(pos, chunk id, text, metadata JSON). Search-only loads open it read-only
+and fetch only the rows of the hits, through a Docstore and a position ->
+id mapping that behave like the in-memory ones LangChain expects. Opening a
+store reads no chunk text, and nothing is unpickled.
+
+The file is always written to a temporary path and renamed into place, the
+same as index.faiss. A session that still has the old file open keeps
+reading the version that matches the index it mapped.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from langchain_community.docstore.base import Docstore  # type: ignore
+from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+from langchain_core.documents import Document
+
+CHUNK_STORE_FILE = "chunks.sqlite"
+
+_SCHEMA = "CREATE TABLE chunks (pos INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+
+
+def chunk_store_path(db_path: str) -> str:
+    return os.path.join(db_path, CHUNK_STORE_FILE)
+
+
+def write_chunk_store(db_path: str, rows: Iterable[Tuple[int, str, Document]]):
+    """Write (position, id, document) rows as db_path/chunks.sqlite, replacing it atomically."""
+    path = chunk_store_path(db_path)
+    tmp = f"{path}.{threading.get_ident()}-{time.time_ns()}.tmp"
+    try:
+        conn = sqlite3.connect(tmp)
+        try:
+            # A private file that is renamed into place: no journal needed.
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(_SCHEMA)
+            conn.executemany(
+                "INSERT INTO chunks (pos, id, text, metadata) VALUES (?, ?, ?, ?)",
+                ((pos, cid, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+                 for pos, cid, doc in rows),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class ChunkStore:
+    """Read-only connection to one chunks.sqlite, safe to share between threads."""
+
+    def __init__(self, path: str):
+        # immutable=1: the file is never modified in place, only replaced.
+        uri = Path(path).absolute().as_uri() + "?mode=ro&immutable=1"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._count = None
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = self._query("SELECT COUNT(*) FROM chunks")[0][0]
+        return self._count
+
+    def id_at(self, pos: int):
+        row = self._query("SELECT id FROM chunks WHERE pos = ?", (int(pos),))
+        return row[0][0] if row else None
+
+    def ids(self) -> List[Tuple[int, str]]:
+        return self._query("SELECT pos, id FROM chunks ORDER BY pos")
+
+    def document(self, cid: str):
+        row = self._query("SELECT text, metadata FROM chunks WHERE id = ?", (cid,))
+        if not row:
+            return None
+        return Document(id=cid, page_content=row[0][0], metadata=json.loads(row[0][1]))
+
+    def texts(self) -> Iterator[Tuple[int, str]]:
+        return iter(self._query("SELECT pos, text FROM chunks ORDER BY pos"))
+
+    def rows(self) -> Iterator[Tuple[int, str, Document]]:
+        for pos, cid, text, metadata in self._query("SELECT pos, id, text, metadata FROM chunks ORDER BY pos"):
+            yield pos, cid, Document(id=cid, page_content=text, metadata=json.loads(metadata))
+
+    def to_memory(self) -> Tuple[InMemoryDocstore, Dict[int, str]]:
+        docs, mapping = {}, {}
+        for pos, cid, doc in self.rows():
+            docs[cid] = doc
+            mapping[pos] = cid
+        return InMemoryDocstore(docs), mapping
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LazyDocstore(Docstore):
+    """Docstore that reads a chunk from SQLite only when it is looked up."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def search(self, search: str) -> Union[str, Document]:
+        doc = self.store.document(search)
+        return doc if doc is not None else f"ID {search} not found."
+
+    def delete(self, ids: List):
+        raise NotImplementedError("read-only chunk store; load the index with mmap=False to modify it")
+
+
+class LazyIdMap(Mapping):
+    """Vector position -> chunk id, looked up per hit."""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, pos: int) -> str:
+        cid = self.store.id_at(pos)
+        if cid is None:
+            raise KeyError(pos)
+        return cid
+
+    def __len__(self) -> int:
+        return self.store.count()
+
+    def __iter__(self):
+        return (pos for pos, _ in self.store.ids())
+
+    def items(self):
+        return self.store.ids()
+
+    def values(self):
+        return [cid for _, cid in self.store.ids()]
+
+
+def open_chunk_store(db_path: str) -> Tuple[LazyDocstore, LazyIdMap]:
+    store = ChunkStore(chunk_store_path(db_path))
+    return LazyDocstore(store), LazyIdMap(store)
+
+
+def read_chunk_store(db_path: str) -> Tuple[InMemoryDocstore, Dict[int, str]]:
+    """Whole store in memory, for code paths that add or delete chunks."""
+    store = ChunkStore(chunk_store_path(db_path))
+    try:
+        return store.to_memory()
+    finally:
+        store.close()
@@ -0,0 +1,346 @@
+"""Optional corpus-wide FAISS index (one per embedding model).
+
+Per-document indexes under vectorstore/db_faiss/<doc_id> stay the source of
+truth (incremental rebuilds, index_state.json). When CORPUS_INDEX=1 their
+vectors are also copied, without re-embedding, into
+vectorstore/db_faiss/_corpus/<embed model>, where every vector id is
+"<doc_id>:<chunk id>" and every chunk carries doc_id metadata. A search
+across the library is then one ANN query; document and tag filters become a
+FAISS IDSelector, so they are applied inside the search rather than after it.
+
+The corpus index is an IndexIDMap2 (see ann_index.build_id_index), so an
+upload adds and removes its own rows and leaves the trained HNSW/IVF index
+as it is. The vector ids ("labels") are reused after deletions. It is
+retrained, and renumbered 0..n-1, only when ann_index.needs_rebuild() says
+so at save time.
+"""
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import faiss  # type: ignore
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from ann_index import (
+    all_vectors, build_id_index, can_remove, choose_index_type, choose_quantization, codec_error, exact_vectors,
+    index_spec,
+    load_exact_vectors, needs_rebuild, prepare_for_search, search_parameters, stored_ids, vector_rows,
+    writable_index, write_exact_vectors,
+)
+from faiss_store import LegacyStoreError, bind_version, load_store, save_store, store_dir
+from index_builder import load_index_state, save_index_state
+from index_versions import active_path, write_version
+from manifest import FAISS_DB_ROOT
+
+CORPUS_INDEX = os.environ.get("CORPUS_INDEX", "0") in ("1", "true", "True")
+CORPUS_DB_ROOT = os.path.join(FAISS_DB_ROOT, "_corpus")
+
+
+def corpus_path(model_name: str) -> str:
+    return os.path.join(CORPUS_DB_ROOT, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+
+
+def _index_stamp(path: str) -> Optional[Tuple[str, float]]:
+    """(active version directory, index mtime), or None if there is no index yet."""
+    version_path = active_path(path)
+    try:
+        return version_path, os.path.getmtime(os.path.join(version_path, "index.faiss"))
+    except OSError:
+        return None
+
+
+class CorpusIndex:
+    """All documents embedded with one model, searchable with a doc_id filter."""
+
+    def __init__(self, model_name: str, embeddings: Embeddings):
+        self.model_name = model_name
+        self.path = corpus_path(model_name)
+        self.embeddings = embeddings
+        self.db: Optional[FAISS] = None
+        self._positions: Optional[Dict[str, List[int]]] = None
+        self._tombstones: Optional[np.ndarray] = None
+        # (labels, exact vectors) added since the last save
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        # {"trained_on": vector count, "codec_error": ...} of the last rebuild (see ann_index.needs_rebuild)
+        self._trained: Dict = {}
+        self._loaded_stamp: Optional[Tuple[str, float]] = None
+        # Set while the store on disk still has a pickled index.pkl (see faiss_store)
+        self.legacy_error: Optional[LegacyStoreError] = None
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        stamp = _index_stamp(self.path)
+        if stamp is None:
+            return
+        self._changed()
+        self._pending = []
+        try:
+            # Mapped read-only; writes read it into memory first (see ann_index.writable_index)
+            self.db = load_store(self.path, self.embeddings)
+            prepare_for_search(self.db, self.path)
+            self._trained = load_index_state(store_dir(self.db, self.path))
+            self._loaded_stamp = stamp
+            self.legacy_error = None
+        except LegacyStoreError as e:
+            # Searches fall back to the per-document indexes; writes would replace the corpus
+            self.db = None
+            self.legacy_error = e
+        except Exception:
+            self.db = None
+
+    def _refresh(self):
+        # Another process (e.g. the migration CLI) may have rewritten the index.
+        stamp = _index_stamp(self.path)
+        if stamp is not None and stamp != self._loaded_stamp:
+            self._load()
+
+    def _changed(self):
+        self._positions = None
+        self._tombstones = None
+
+    def _doc_positions(self) -> Dict[str, List[int]]:
+        if self._positions is None:
+            positions: Dict[str, List[int]] = {}
+            if self.db is not None:
+                for pos, vid in self.db.index_to_docstore_id.items():
+                    positions.setdefault(vid.split(":", 1)[0], []).append(pos)
+            self._positions = positions
+        return self._positions
+
+    def _dead(self) -> np.ndarray:
+        """Labels of deleted rows that an HNSW/IVF index still holds."""
+        if self._tombstones is None:
+            mapping = self.db.index_to_docstore_id
+            live = np.fromiter(iter(mapping), dtype=np.int64, count=len(mapping))
+            self._tombstones = np.setdiff1d(stored_ids(self.db.index), live)
+        return self._tombstones
+
+    def _free_labels(self, n: int) -> np.ndarray:
+        """n labels the index does not hold, lowest first."""
+        used = stored_ids(self.db.index)
+        bound = int(used.max()) + 1 if len(used) else 0
+        free = np.ones(bound, dtype=bool)
+        free[used] = False
+        labels = np.flatnonzero(free)[:n]
+        return np.concatenate((labels, np.arange(bound, bound + n - len(labels)))).astype(np.int64)
+
+    def _vectors(self, labels: np.ndarray) -> np.ndarray:
+        """Exact vectors at labels: rows added since the last save, else the saved exact vectors or the index."""
+        index = self.db.index
+        vectors = np.empty((len(labels), index.d), dtype=np.float32)
+        rest = np.ones(len(labels), dtype=bool)
+        if self._pending:
+            added = np.concatenate([a for a, _ in self._pending])
+            added_vectors = np.concatenate([v for _, v in self._pending])
+            # The last write of a reused label wins
+            added, last = np.unique(added[::-1], return_index=True)
+            added_vectors = added_vectors[::-1][last]
+            hit = np.isin(labels, added)
+            vectors[hit] = added_vectors[np.searchsorted(added, labels[hit])]
+            rest = ~hit
+        wanted = labels[rest]
+        if len(wanted):
+            exact = None
+            if index_spec(index)[1] != "none":
+                exact = load_exact_vectors(store_dir(self.db, self.path), None)
+            if exact is not None and len(exact) > wanted.max():
+                vectors[rest] = exact[wanted]
+            elif isinstance(index, faiss.IndexIDMap2):
+                vectors[rest] = index.reconstruct_batch(wanted)
+            else:
+                vectors[rest] = all_vectors(index)[wanted]
+        return vectors
+
+    def _rebuild(self):
+        """Retrain the index on the live vectors, labelled 0..n-1; tombstones are dropped."""
+        mapping = self.db.index_to_docstore_id
+        labels = np.array(sorted(mapping), dtype=np.int64)
+        vectors = self._vectors(labels)
+        n = len(labels)
+        self.db.index = build_id_index(vectors, np.arange(n), choose_index_type(n), choose_quantization(n))
+        self.db.index_to_docstore_id = {i: mapping[int(label)] for i, label in enumerate(labels)}
+        self._pending = [(np.arange(n, dtype=np.int64), vectors)]
+        self._trained = {"trained_on": n, "codec_error": codec_error(self.db.index, vectors)}
+        self._changed()
+
+    def _writable(self):
+        """self.db.index, in memory and id-mapped, for add_with_ids / remove_ids."""
+        index = writable_index(self.db, self.path)
+        if not isinstance(index, faiss.IndexIDMap2):
+            # Saved before the corpus index was id-mapped: convert it once
+            self._rebuild()
+        return self.db.index
+
+    def doc_ids(self) -> Set[str]:
+        with self._lock:
+            self._refresh()
+            return set(self._doc_positions())
+
+    def remove_document(self, doc_id: str, save: bool = True) -> int:
+        with self._lock:
+            self._refresh()
+            if self.db is None or not self._doc_positions().get(doc_id):
+                return 0
+            index = self._writable()
+            positions = self._doc_positions()[doc_id]
+            if can_remove(index):
+                index.remove_ids(faiss.IDSelectorBatch(np.asarray(positions, dtype=np.int64)))
+            # HNSW and IVF keep the rows as tombstones until needs_rebuild()
+            self.db.docstore.delete([self.db.index_to_docstore_id.pop(p) for p in positions])
+            self._changed()
+            if save:
+                self.save()
+            return len(positions)
+
+    def upsert_document(self, doc_id: str, source: FAISS, doc_name: Optional[str] = None,
+                        save: bool = True, source_path: Optional[str] = None) -> int:
+        """Replace doc_id's vectors with those of its per-document index; returns the count copied."""
+        ntotal = source.index.ntotal
+        vectors = np.ascontiguousarray(exact_vectors(source.index, store_dir(source, source_path)), dtype=np.float32)
+        docs, ids = {}, []
+        for pos in range(ntotal):
+            src_id = source.index_to_docstore_id[pos]
+            doc = source.docstore.search(src_id)
+            if isinstance(doc, str):
+                raise ValueError(f"{doc_id}: docstore entry missing for {src_id}")
+            vid = f"{doc_id}:{src_id}"
+            docs[vid] = Document(id=vid, page_content=doc.page_content,
+                                 metadata={**doc.metadata, "doc_id": doc_id, "doc_name": doc_name})
+            ids.append(vid)
+        with self._lock:
+            self._refresh()
+            if self.legacy_error is not None:
+                raise self.legacy_error
+            self.remove_document(doc_id, save=False)
+            if ntotal:
+                if self.db is None:
+                    empty = build_id_index(np.zeros((0, source.index.d), dtype=np.float32), np.zeros(0), "flat")
+                    self.db = FAISS(self.embeddings, empty, InMemoryDocstore(), {})
+                elif self.db.index.d != source.index.d:
+                    raise ValueError(
+                        f"{doc_id}: dimension {source.index.d} does not match corpus dimension {self.db.index.d}"
+                    )
+                index = self._writable()
+                labels = self._free_labels(ntotal)
+                self.db.docstore.add(docs)
+                self.db.index_to_docstore_id.update(zip(labels.tolist(), ids))
+                self._pending.append((labels, vectors))
+                if index.is_trained:
+                    index.add_with_ids(vectors, labels)
+                else:
+                    # Quantizer of an empty corpus: train it on these vectors
+                    self._rebuild()
+                self._changed()
+            if save:
+                self.save()
+        return ntotal
+
+    def save(self):
+        with self._lock:
+            if self.db is None or self.legacy_error is not None:
+                return
+            index = self._writable()
+            added = np.concatenate([v for _, v in self._pending]) if self._pending else None
+            if needs_rebuild(index, len(self.db.index_to_docstore_id), trained_on=self._trained.get("trained_on"),
+                             trained_error=self._trained.get("codec_error"), added=added):
+                self._rebuild()
+
+            def write(version_path: str):
+                if index_spec(self.db.index)[1] != "none":
+                    # Labelled rows for re-ranking (see ann_index.RerankingIndex); tombstones stay zero
+                    labels = np.fromiter(iter(self.db.index_to_docstore_id), dtype=np.int64)
+                    exact = np.zeros((vector_rows(self.db.index), self.db.index.d), dtype=np.float32)
+                    exact[labels] = self._vectors(labels)
+                    write_exact_vectors(version_path, exact)
+                # Lexical search runs on the per-document indexes
+                save_store(self.db, version_path, lexical=False)
+                save_index_state(version_path, self._trained)
+
+            bind_version(self.db, *write_version(self.path, write))
+            self._pending = []
+            self._loaded_stamp = _index_stamp(self.path)
+            prepare_for_search(self.db, self.path)
+
+    def _search_vector(self, vector, k: int, positions: Optional[List[int]] = None) -> List[Tuple[Document, float]]:
+        params = None
+        if positions is not None:
+            if not positions:
+                return []
+            selector = faiss.IDSelectorBatch(np.asarray(positions, dtype=np.int64))
+            params = search_parameters(self.db.index, selector)
+            k = min(k, len(positions))
+        elif len(self._dead()):
+            dead = faiss.IDSelectorBatch(self._dead())
+            selector = faiss.IDSelectorNot(dead)
+            params = search_parameters(self.db.index, selector)
+        distances, found = self.db.index.search(vector, k, params=params)
+        results = []
+        for distance, pos in zip(distances[0], found[0]):
+            vid = self.db.index_to_docstore_id.get(int(pos)) if pos >= 0 else None
+            if vid is None:
+                continue
+            doc = self.db.docstore.search(vid)
+            if not isinstance(doc, str):
+                results.append((doc, float(distance)))
+        return results
+
+    def search(self, query: str, k: int = 10,
+               doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[Document, float]]:
+        """One ANN search; with doc_ids only those documents' vectors are considered."""
+        with self._lock:
+            self._refresh()
+            if self.db is None or self.db.index.ntotal == 0:
+                return []
+            positions = None
+            if doc_ids is not None:
+                by_doc = self._doc_positions()
+                positions = [p for d in set(doc_ids) for p in by_doc.get(d, [])]
+                if not positions:
+                    return []
+            vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+            return self._search_vector(vector, k, positions)
+
+    def search_per_document(self, query: str, per_doc: int = 3,
+                            doc_ids: Optional[Iterable[str]] = None) -> Dict[str, List[Tuple[Document, float]]]:
+        """Top per_doc chunks of each document, as a search of each per-document index would return.
+
+        One filtered search over all the documents fills most of them; a
+        document crowded out by the others gets its own filtered search.
+        """
+        with self._lock:
+            self._refresh()
+            if self.db is None or self.db.index.ntotal == 0:
+                return {}
+            by_doc = self._doc_positions()
+            wanted = [d for d in dict.fromkeys(doc_ids if doc_ids is not None else by_doc) if by_doc.get(d)]
+            if not wanted:
+                return {}
+            vector = np.asarray([self.embeddings.embed_query(query)], dtype=np.float32)
+            grouped: Dict[str, List[Tuple[Document, float]]] = {d: [] for d in wanted}
+            positions = [p for d in wanted for p in by_doc[d]]
+            for doc, distance in self._search_vector(vector, 2 * per_doc * len(wanted), positions):
+                hits = grouped.get(doc.metadata.get("doc_id"))
+                if hits is not None and len(hits) < per_doc:
+                    hits.append((doc, distance))
+            for doc_id, hits in grouped.items():
+                if len(hits) < min(per_doc, len(by_doc[doc_id])):
+                    grouped[doc_id] = self._search_vector(vector, per_doc, by_doc[doc_id])
+            return grouped
+
+
+_corpora: Dict[str, CorpusIndex] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus_index(model_name: str, embeddings: Embeddings) -> CorpusIndex:
+    """Process-wide corpus index for model_name, loaded on first use."""
+    with _corpora_lock:
+        if model_name not in _corpora:
+            _corpora[model_name] = CorpusIndex(model_name, embeddings)
+        return _corpora[model_name]
@@ -0,0 +1,242 @@
+"""Persistent embedding cache shared by every indexing path.
+
+Vectors are stored in SQLite keyed by (embed_model, sha256 of chunk text), so
+re-indexing an unchanged document never goes back to Ollama.
+
+Query vectors are cached too, keyed by (embed_model, normalized query): first
+in a per-process LRU, then (QUERY_CACHE_PERSIST=1) in the same SQLite table
+under "<model>::query", so saved searches and follow-ups survive restarts.
+Queries get their own key because Ollama embeds queries and documents with
+different instructions.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_CACHE_PATH = os.environ.get("EMBED_CACHE_PATH", "vectorstore/embed_cache.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("EMBED_CACHE_MAX_ENTRIES", "250000"))
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_PERSIST = os.environ.get("QUERY_CACHE_PERSIST", "1") not in ("0", "false", "False", "")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def normalize_query(text: str) -> str:
+    """Whitespace-insensitive form of a query; case is kept because the embedding depends on it."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+
+class EmbeddingCache:
+    """Size-bounded on-disk vector cache with least-recently-used eviction."""
+
+    def __init__(self, path: str = EMBED_CACHE_PATH, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not hashes:
+            return found
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # SQLite caps bound parameters, so look keys up in slices.
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = _unpack(blob)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, _pack(v), now) for h, v in vectors.items()],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def clear(self, model: Optional[str] = None):
+        with self._lock:
+            if model:
+                self._conn.execute("DELETE FROM embeddings WHERE model = ?", (model,))
+            else:
+                self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide cache (one SQLite connection per process)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
+
+
+class QueryVectorCache:
+    """In-memory LRU of query vectors, shared by every session in the process."""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._vectors: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._vectors.get((model, query))
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end((model, query))
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, query: str, vector: List[float]):
+        with self._lock:
+            self._vectors[(model, query)] = vector
+            self._vectors.move_to_end((model, query))
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._vectors), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": (self.hits / lookups) if lookups else 0.0}
+
+
+_query_cache: Optional[QueryVectorCache] = None
+
+
+def get_query_cache() -> QueryVectorCache:
+    global _query_cache
+    with _default_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryVectorCache()
+        return _query_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the underlying model."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model_name, hashes)
+        # Identical chunks inside one document are embedded only once.
+        missing: Dict[str, str] = {}
+        for h, t in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = t
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(self.model_name, computed)
+            found.update(computed)
+        return [found[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        query = normalize_query(text)
+        memo = get_query_cache()
+        vector = memo.get(self.model_name, query)
+        if vector is None:
+            query_model, key = f"{self.model_name}::query", text_hash(query)
+            if QUERY_CACHE_PERSIST:
+                vector = self.cache.get_many(query_model, [key]).get(key)
+            if vector is None:
+                vector = self.embeddings.embed_query(query)
+                if QUERY_CACHE_PERSIST:
+                    self.cache.put_many(query_model, {key: vector})
+            memo.put(self.model_name, query, vector)
+        # Callers may modify the list they get back
+        return list(vector)
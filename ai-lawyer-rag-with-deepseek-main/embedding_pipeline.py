@@ -0,0 +1,94 @@
+"""Batched, concurrent embedding stage in front of the Ollama embedding client.
+
+Texts are cut into bounded batches that a small worker pool sends to the local
+Ollama server. Only a fixed number of batches is in flight at once, and the
+progress callback runs on the calling thread so Streamlit widgets can be
+updated from it.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def running_count(callback: Callable[[int], None]) -> ProgressCallback:
+    """Adapt per-call (done, total) reports into the number of texts embedded over all calls.
+
+    Streaming builds embed one window of chunks per call, so done/total
+    restarts with every window.
+    """
+    state = {"base": 0, "finished": 0}
+
+    def report(done: int, total: int):
+        if state["finished"]:
+            state["base"] += state["finished"]
+            state["finished"] = 0
+        if done >= total:
+            state["finished"] = total
+        callback(state["base"] + done)
+
+    return report
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that fans document batches out over a thread pool."""
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBED_BATCH_SIZE,
+                 concurrency: int = EMBED_CONCURRENCY, progress_callback: Optional[ProgressCallback] = None):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.progress_callback = progress_callback
+
+    def _report(self, done: int, total: int):
+        if self.progress_callback:
+            try:
+                self.progress_callback(done, total)
+            except Exception:
+                pass
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        total = len(texts)
+        if total == 0:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, total, self.batch_size)]
+        if self.concurrency == 1 or len(batches) == 1:
+            vectors: List[List[float]] = []
+            for batch in batches:
+                vectors.extend(self.embeddings.embed_documents(batch))
+                self._report(len(vectors), total)
+            return vectors
+
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        # Backpressure: never queue more than two batches per worker.
+        max_in_flight = self.concurrency * 2
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            pending = {}
+            next_batch = 0
+            while next_batch < len(batches) or pending:
+                while next_batch < len(batches) and len(pending) < max_in_flight:
+                    future = pool.submit(self.embeddings.embed_documents, batches[next_batch])
+                    pending[future] = next_batch
+                    next_batch += 1
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    idx = pending.pop(future)
+                    try:
+                        results[idx] = future.result()
+                    except Exception:
+                        for other in pending:
+                            other.cancel()
+                        raise
+                    done += len(batches[idx])
+                    self._report(done, total)
+        return [vec for batch in results for vec in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
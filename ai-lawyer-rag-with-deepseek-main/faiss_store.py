@@ -0,0 +1,169 @@
+"""Load and save LangChain FAISS stores (index.faiss + chunks.sqlite).
+
+Search-only loads map index.faiss read-only (FAISS_MMAP, on by default)
+instead of reading it into the heap. The flat, SQ and PQ codes then stay in
+the OS page cache, which every Streamlit session and worker process reading
+the same file shares, and a cold load costs a few milliseconds whatever the
+index size. HNSW graphs and IVF lists are still read into memory; only their
+vector codes are mapped. Chunk text and metadata are read from chunks.sqlite
+one hit at a time (see chunk_store). Per-document saves also write the BM25
+index of their chunks (see bm25_index). Stores saved before that still have a
+pickled index.pkl; load_store() refuses them rather than unpickling on every
+load, and ``python vector_database.py check --repair`` converts them once
+(migrate_legacy_store()).
+
+``db_path`` is an index root (see index_versions): loads read its active
+version and hold a lease on it, and save_store() writes one version
+directory, which the caller then publishes.
+
+A mapped index or a lazy chunk store cannot be written to (FAISS aborts the
+process on the former), so callers that modify a store load it with
+``mmap=False`` or go through ann_index.ensure_flat(), which copies both to
+memory first. Saves write to temporary files and rename them over the old
+ones: truncating a file that another process has mapped would crash that
+process.
+"""
+import os
+import pickle
+import shutil
+import threading
+import time
+from typing import Optional
+
+import faiss  # type: ignore
+from langchain_community.vectorstores import FAISS  # type: ignore
+from langchain_core.embeddings import Embeddings
+
+from bm25_index import BM25_FILE, write_bm25_index
+from chunk_store import LazyDocstore, chunk_store_path, open_chunk_store, read_chunk_store, write_chunk_store
+from index_versions import LEASE_FILE, VERSION_POINTER, active_path, open_active, write_version
+
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "1") not in ("0", "false", "False", "")
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+
+
+def is_mapped(faiss_db) -> bool:
+    """True while faiss_db.index is still the read-only mapping made by load_store()."""
+    mapped = getattr(faiss_db, "mapped_index", None)
+    return mapped is not None and mapped is faiss_db.index
+
+
+def bind_version(faiss_db, version_path: str, lease=None):
+    """Record which version directory faiss_db's files (exact vectors, chunks) come from."""
+    faiss_db.store_path = version_path
+    faiss_db.version_lease = lease
+
+
+def store_dir(faiss_db, db_path: Optional[str]) -> Optional[str]:
+    """Version directory faiss_db was loaded from or saved to, else db_path's active version."""
+    path = getattr(faiss_db, "store_path", None)
+    if path:
+        return path
+    return active_path(db_path) if db_path else None
+
+
+def make_writable(faiss_db):
+    """Replace a lazy, read-only chunk store with an in-memory copy."""
+    if isinstance(faiss_db.docstore, LazyDocstore):
+        faiss_db.docstore, faiss_db.index_to_docstore_id = faiss_db.docstore.store.to_memory()
+
+
+class LegacyStoreError(RuntimeError):
+    """The active version still keeps its chunks in a pickled index.pkl."""
+
+
+def has_legacy_docstore(version_path: str) -> bool:
+    """True if version_path has an index.pkl and no chunks.sqlite."""
+    return (not os.path.exists(chunk_store_path(version_path))
+            and os.path.exists(os.path.join(version_path, LEGACY_DOCSTORE_FILE)))
+
+
+def migrate_legacy_store(db_path: str, lexical: bool = True) -> bool:
+    """Convert db_path's pickled index.pkl (from FAISS.save_local) into a new version with chunks.sqlite.
+
+    The active version is not modified: its other files are linked or copied
+    into the new one. Returns False if there was nothing to convert.
+    """
+    source = active_path(db_path)
+    if not has_legacy_docstore(source):
+        return False
+    with open(os.path.join(source, LEGACY_DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    skip = (LEGACY_DOCSTORE_FILE, LEASE_FILE, VERSION_POINTER, BM25_FILE)
+
+    def write(version_path: str):
+        for name in os.listdir(source):
+            src = os.path.join(source, name)
+            if name in skip or name.endswith(".tmp") or not os.path.isfile(src):
+                continue
+            try:
+                os.link(src, os.path.join(version_path, name))
+            except OSError:
+                shutil.copyfile(src, os.path.join(version_path, name))
+        write_chunk_store(version_path, ((pos, cid, docstore.search(cid))
+                                         for pos, cid in sorted(index_to_docstore_id.items())))
+        if lexical:
+            write_bm25_index(version_path)
+
+    _, lease = write_version(db_path, write)
+    lease.release()
+    return True
+
+
+def _read_index(db_path: str, mmap: bool):
+    path = os.path.join(db_path, INDEX_FILE)
+    if mmap and _MMAP_FLAGS:
+        try:
+            return faiss.read_index(path, _MMAP_FLAGS), True
+        except Exception:
+            # Older faiss builds or index types without mmap support
+            pass
+    return faiss.read_index(path), False
+
+
+def load_store(db_path: str, embeddings: Embeddings, mmap: bool = FAISS_MMAP) -> FAISS:
+    """The active store of db_path: mapped and lazy for search (mmap=True), fully in memory otherwise."""
+    path, lease = open_active(db_path)
+    if has_legacy_docstore(path):
+        if lease is not None:
+            lease.release()
+        raise LegacyStoreError(f"{db_path} still has a pickled {LEGACY_DOCSTORE_FILE}; "
+                               "run `python vector_database.py check --repair` to convert it")
+    index, mapped = _read_index(path, mmap)
+    if mmap:
+        docstore, index_to_docstore_id = open_chunk_store(path)
+    else:
+        docstore, index_to_docstore_id = read_chunk_store(path)
+    faiss_db = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    if mapped:
+        faiss_db.mapped_index = index
+    bind_version(faiss_db, path, lease)
+    return faiss_db
+
+
+def save_store(faiss_db: FAISS, db_path: str, lexical: bool = True):
+    """Write index.faiss and chunks.sqlite into db_path (normally a new version directory).
+
+    With lexical, also the BM25 index of the chunks (see bm25_index).
+    """
+    os.makedirs(db_path, exist_ok=True)
+    index_path = os.path.join(db_path, INDEX_FILE)
+    tmp = f"{index_path}.{threading.get_ident()}-{time.time_ns()}.tmp"
+    rows = ((pos, cid, faiss_db.docstore.search(cid)) for pos, cid in sorted(faiss_db.index_to_docstore_id.items()))
+    try:
+        faiss.write_index(faiss_db.index, tmp)
+        # Chunks first: index.faiss's mtime is what readers watch for changes.
+        write_chunk_store(db_path, rows)
+        if lexical:
+            write_bm25_index(db_path)
+        os.replace(tmp, index_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    try:
+        os.remove(os.path.join(db_path, LEGACY_DOCSTORE_FILE))
+    except FileNotFoundError:
+        pass
@@ -1,8 +1,13 @@
 from rag_pipeline import answer_query, retrieve_docs
-from langchain_community.document_loaders import PDFPlumberLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
+from embedding_cache import CachedEmbeddings
+from embedding_pipeline import BatchedEmbeddings
+from index_builder import sync_vector_store
+from pdf_extract import iter_pdf_pages
+from legal_chunker import annotate_headings
+# Same CHUNK_STRATEGY switch and chunk parameters as main.py and the CLI, so all three share indexes
+from vector_database import CHUNK_STRATEGY, chunk_params, create_chunks
+from manifest import FRONTEND_DB_PATH
 import os
 from dotenv import load_dotenv
 import streamlit as st
@@ -17,23 +22,24 @@ def upload_pdf(file):
         f.write(file.getbuffer())
 
 def load_pdf(file_path):
-    loader = PDFPlumberLoader(file_path)
-    return loader.load()
-
-def create_chunks(documents):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        add_start_index=True,
+    # pypdfium2 text with per-page pdfplumber fallback, page ranges extracted in parallel
+    documents = list(iter_pdf_pages(file_path))
+    return documents
+
+def get_embedding_model(model_name: str, progress_callback=None):
+    batched = BatchedEmbeddings(OllamaEmbeddings(model=model_name), progress_callback=progress_callback)
+    return CachedEmbeddings(batched, model_name)
+
+def create_vector_store(db_path: str, documents, model_name: str):
+    bar = st.progress(0.0, text="Embedding chunks")
+    progress = lambda done, total: bar.progress(done / max(1, total), text=f"Embedding chunks: {done}/{total}")
+    if CHUNK_STRATEGY == "legal":
+        # Pages are split one at a time; carry the heading in force across page breaks
+        documents = annotate_headings(documents)
+    # Written to a new version directory and switched in atomically, with the chunking recorded
+    faiss_db, _ = sync_vector_store(
+        db_path, documents, get_embedding_model(model_name, progress), model_name, create_chunks, chunk_params(),
     )
-    return text_splitter.split_documents(documents)
-
-def get_embedding_model(model_name: str):
-    return OllamaEmbeddings(model=model_name)
-
-def create_vector_store(db_path: str, text_chunks, model_name: str):
-    faiss_db = FAISS.from_documents(text_chunks, get_embedding_model(model_name))
-    faiss_db.save_local(db_path)
     return faiss_db
 
 st.set_page_config(page_title="AI Lawyer RAG", page_icon="⚖️", layout="wide")
@@ -63,9 +69,7 @@ if ask_question:
         # Save and index uploaded PDF
         upload_pdf(uploaded_file)
         documents = load_pdf(PDFS_DIR + uploaded_file.name)
-        text_chunks = create_chunks(documents)
-        db_path = "vectorstore/db_faiss"
-        faiss_db = create_vector_store(db_path, text_chunks, OLLAMA_EMBED_MODEL)
+        faiss_db = create_vector_store(FRONTEND_DB_PATH, documents, OLLAMA_EMBED_MODEL)
 
         # RAG Pipeline
         retrieved_docs = retrieve_docs(faiss_db, user_query)[:top_k]
@@ -0,0 +1,272 @@
+"""Build and incrementally patch per-document FAISS indexes.
+
+Next to each index we keep ``index_state.json`` with a content hash per page
+and the ids of the chunks produced from it. A rebuild only re-splits pages
+whose hash changed and only embeds chunks whose id is not already indexed.
+Pages are consumed as a stream (page -> splitter -> embedder -> index writer)
+so no stage holds the whole document.
+
+Near-duplicate chunks (see chunk_dedup) are not embedded: the state maps them
+to the representative chunk, whose metadata lists every ``locations`` entry.
+
+db_path is an index root: every build or patch that changes anything is
+written, with its index_state.json, to a new version directory and published
+atomically (see index_versions).
+"""
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS  # type: ignore
+from langchain_core.embeddings import Embeddings
+
+from ann_index import ensure_flat, index_spec, needs_optimize, optimize_store
+from chunk_dedup import CHUNK_DEDUP, CHUNK_DEDUP_DISTANCE, CHUNK_DEDUP_MIN_CHARS, SimHashIndex, location, simhash
+from faiss_store import bind_version, load_store, save_store
+from index_versions import active_path, active_version, has_index, write_version
+
+INDEX_STATE_FILE = "index_state.json"
+INDEX_STATE_VERSION = 2
+STREAM_CHUNK_WINDOW = int(os.environ.get("STREAM_CHUNK_WINDOW", "256"))
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def page_key(doc, position: int) -> str:
+    md = getattr(doc, "metadata", {}) or {}
+    page = md.get("page")
+    return str(page) if page is not None else f"#{position}"
+
+
+def page_hash(doc) -> str:
+    md = getattr(doc, "metadata", {}) or {}
+    # A heading carried over from the previous page changes how this page is chunked.
+    carry = md.get("section_carry")
+    return _sha256_text(doc.page_content if not carry else f"{carry}\x00{doc.page_content}")
+
+
+def chunk_id(key: str, chunk) -> str:
+    """Stable id for a chunk: same page, offset, section and text give the same id."""
+    md = getattr(chunk, "metadata", {}) or {}
+    raw = f"{key}\x00{md.get('start_index', '')}\x00{chunk.page_content}"
+    if md.get("section"):
+        raw += f"\x00{md['section']}"
+    return _sha256_text(raw)
+
+
+def load_index_state(db_path: str) -> Dict:
+    """State of db_path's active version (db_path may also be a version directory)."""
+    path = os.path.join(active_path(db_path), INDEX_STATE_FILE)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+    return {}
+
+
+def save_index_state(db_path: str, state: Dict):
+    path = os.path.join(db_path, INDEX_STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _dedup_setting() -> Optional[int]:
+    return CHUNK_DEDUP_DISTANCE if CHUNK_DEDUP else None
+
+
+def _new_state(model_name: str, chunk_params: Dict) -> Dict:
+    return {
+        "version": INDEX_STATE_VERSION,
+        "embed_model": model_name,
+        "chunking": chunk_params,
+        "dedup": _dedup_setting(),
+        "pages": {},
+        # duplicate chunk id -> {"rep": representative chunk id, "page", "start_index", "chars"}
+        "aliases": {},
+    }
+
+
+class _Deduper:
+    """Collapses near-duplicate chunks onto the first similar chunk seen in page order."""
+
+    def __init__(self, state: Dict):
+        self.state = state
+        self.index = SimHashIndex(CHUNK_DEDUP_DISTANCE) if CHUNK_DEDUP else None
+
+    def register(self, page_entry: Dict):
+        """Make representatives of a reused page available as dedup targets."""
+        if self.index is None:
+            return
+        for cid, (sig, length) in page_entry.get("sigs", {}).items():
+            self.index.add(cid, int(sig, 16), length)
+
+    def check(self, cid: str, chunk, page_entry: Dict) -> Optional[str]:
+        """Representative id if chunk is a near-duplicate, else None (and remember it)."""
+        text = chunk.page_content
+        if self.index is None or len(text) < CHUNK_DEDUP_MIN_CHARS:
+            return None
+        sig = simhash(text)
+        rep = self.index.find(sig, len(text))
+        if rep is None:
+            self.index.add(cid, sig, len(text))
+            page_entry.setdefault("sigs", {})[cid] = [format(sig, "016x"), len(text)]
+            return None
+        self.state["aliases"][cid] = {"rep": rep, **location(chunk), "chars": len(text)}
+        return rep
+
+
+def _apply_locations(faiss_db: FAISS, state: Dict, old_aliases: Dict) -> bool:
+    """Rewrite ``locations`` on representatives; returns True if any docstore entry changed."""
+    grouped: Dict[str, List[Dict]] = {}
+    for alias in state["aliases"].values():
+        grouped.setdefault(alias["rep"], []).append({"page": alias["page"], "start_index": alias["start_index"]})
+    touched = set(grouped) | {a.get("rep") for a in old_aliases.values()}
+    changed = False
+    for rep in touched:
+        doc = faiss_db.docstore.search(rep)
+        if isinstance(doc, str):
+            continue
+        if rep in grouped:
+            locations = [location(doc)] + grouped[rep]
+            if doc.metadata.get("locations") != locations:
+                doc.metadata["locations"] = locations
+                changed = True
+        elif "locations" in doc.metadata:
+            del doc.metadata["locations"]
+            changed = True
+    return changed
+
+
+def _dedup_report(faiss_db: FAISS, state: Dict) -> Dict:
+    aliases = state["aliases"]
+    chars = sum(a.get("chars", 0) for a in aliases.values())
+    # float32 vector plus the stored text per collapsed chunk
+    saved = len(aliases) * faiss_db.index.d * 4 + chars
+    return {"duplicates": len(aliases), "dedup_chars": chars, "dedup_saved_bytes": saved}
+
+
+def _index_report(faiss_db: FAISS) -> Dict:
+    kind, quantization = index_spec(faiss_db.index)
+    return {"index_type": kind, "quantization": quantization}
+
+
+def _flush(faiss_db: Optional[FAISS], chunks: List, ids: List[str], embeddings: Embeddings,
+           db_path: Optional[str] = None) -> FAISS:
+    """Embed one window of chunks and append it to the index (creating it if needed)."""
+    vectors = embeddings.embed_documents([c.page_content for c in chunks])
+    pairs = list(zip([c.page_content for c in chunks], vectors))
+    metadatas = [c.metadata for c in chunks]
+    if faiss_db is None:
+        return FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+    # Writes go to an exact flat index; optimize_store() re-quantizes before saving.
+    ensure_flat(faiss_db, db_path)
+    faiss_db.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+    return faiss_db
+
+
+def sync_vector_store(db_path: str, documents: Iterable, embeddings: Embeddings, model_name: str,
+                      split_documents: Callable[[List], List], chunk_params: Dict,
+                      progress_callback: Optional[ProgressCallback] = None,
+                      window: int = STREAM_CHUNK_WINDOW,
+                      quantization: Optional[str] = None) -> Tuple[Optional[FAISS], Dict]:
+    """Bring the index at db_path in line with documents, touching only what changed.
+
+    documents may be a generator of pages; they are split, embedded and written
+    in windows of ``window`` chunks so memory does not grow with document length.
+    quantization ("none", "fp16", "int8", "pq") defaults to ANN_QUANTIZATION.
+    Returns the store and a stats dict with added/removed/kept chunk counts.
+    """
+    state = load_index_state(db_path)
+    faiss_db = None
+    reusable = (
+        state.get("version") == INDEX_STATE_VERSION
+        and state.get("embed_model") == model_name
+        and state.get("chunking") == chunk_params
+        and state.get("dedup") == _dedup_setting()
+    )
+    if state and state.get("embed_model") == model_name:
+        try:
+            # Patched in place below, so read into memory rather than mapped
+            faiss_db = load_store(db_path, embeddings, mmap=False)
+        except Exception:
+            faiss_db = None
+    old_pages = state.get("pages", {}) if (reusable and faiss_db is not None) else {}
+    old_aliases = state.get("aliases", {}) if old_pages else {}
+    indexed = set(faiss_db.index_to_docstore_id.values()) if faiss_db is not None else set()
+
+    new_state = _new_state(model_name, chunk_params)
+    deduper = _Deduper(new_state)
+    target = set()
+    pending: List = []
+    pending_ids: List[str] = []
+    added = 0
+    for position, doc in enumerate(documents):
+        key = page_key(doc, position)
+        h = page_hash(doc)
+        previous = old_pages.get(key)
+        own = [c for c in (previous or {}).get("chunks", []) if c not in old_aliases]
+        # Duplicates only point back to earlier pages, so their representatives are already in target.
+        dups = [c for c in (previous or {}).get("chunks", []) if c in old_aliases]
+        if (previous and previous.get("hash") == h and indexed.issuperset(own)
+                and all(old_aliases[c]["rep"] in target for c in dups)):
+            new_state["pages"][key] = previous
+            new_state["aliases"].update({c: old_aliases[c] for c in dups})
+            deduper.register(previous)
+            target.update(own)
+        else:
+            entry = {"hash": h, "chunks": []}
+            for chunk in split_documents([doc]):
+                cid = chunk_id(key, chunk)
+                entry["chunks"].append(cid)
+                if deduper.check(cid, chunk, entry) is not None:
+                    continue
+                if cid not in indexed and cid not in target:
+                    pending.append(chunk)
+                    pending_ids.append(cid)
+                target.add(cid)
+            new_state["pages"][key] = entry
+        if len(pending) >= window:
+            faiss_db = _flush(faiss_db, pending, pending_ids, embeddings, db_path)
+            added += len(pending)
+            pending, pending_ids = [], []
+        if progress_callback:
+            total_pages = (getattr(doc, "metadata", {}) or {}).get("total_pages") or 0
+            progress_callback(position + 1, max(total_pages, position + 1))
+    if pending:
+        faiss_db = _flush(faiss_db, pending, pending_ids, embeddings, db_path)
+        added += len(pending)
+
+    to_remove = [cid for cid in indexed if cid not in target]
+    stats = {"added": added, "removed": len(to_remove), "kept": len(target) - added}
+    if faiss_db is None:
+        return None, stats
+    if to_remove:
+        ensure_flat(faiss_db, db_path)
+        faiss_db.delete(to_remove)
+    relocated = _apply_locations(faiss_db, new_state, old_aliases)
+    new_state["saved"] = _dedup_report(faiss_db, new_state)
+    stats.update(new_state["saved"])
+    # Flat / HNSW / IVF by vector count, quantized as requested (see ann_index)
+    new_state["index"] = _index_report(faiss_db)
+    if (added or to_remove or relocated or needs_optimize(faiss_db, quantization)
+            or new_state != state or not has_index(db_path)):
+
+        def write(version_path: str):
+            optimize_store(faiss_db, version_path, quantization)
+            new_state["index"] = _index_report(faiss_db)
+            save_store(faiss_db, version_path)
+            save_index_state(version_path, new_state)
+
+        bind_version(faiss_db, *write_version(db_path, write))
+    stats.update(new_state["index"])
+    stats["version"] = active_version(db_path)
+    return faiss_db, stats
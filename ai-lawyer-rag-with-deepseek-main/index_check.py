@@ -0,0 +1,404 @@
+"""Consistency check of the document library: manifest, pdfs/ and index directories.
+
+    python vector_database.py check             # report only
+    python vector_database.py check --repair    # fix what can be fixed
+
+Entries are checked in parallel and only headers are read: the first bytes
+of index.faiss (dimension and vector count), the row count of chunks.sqlite
+and the shape of vectors.f32.npy. No index is loaded.
+
+Repairs:
+- db_path / pdf_path written on Windows ("vectorstore/db_faiss\\<doc_id>")
+  are normalized for this platform, and a moved PDF is found again by its
+  doc_id prefix.
+- An index that is missing, unreadable, built with another embed model or
+  dimension, or whose chunk or exact-vector counts disagree with it is
+  queued for a rebuild. A broken active version is retired first, so the
+  rebuild starts from scratch. Queued entries are picked up by the app's
+  ingest worker when it starts, or rebuilt at once with ``--rebuild``.
+- An index whose chunks are still in a pickled index.pkl (written before
+  chunks.sqlite) is converted into a new version; the app refuses to load
+  it until then. Corpus indexes are converted the same way.
+- Disk is reclaimed from index directories that no entry points to, the
+  index older versions of frontend.py wrote at the root of
+  vectorstore/db_faiss, inactive versions, stale temporary files and the
+  page text of deleted documents. frontend.py's own index (FRONTEND_DB_PATH)
+  is kept; only its inactive versions are collected.
+  Unreferenced index directories and temporary files are only removed once
+  older than ORPHAN_GRACE_SECONDS, since bulk ingestion writes an index
+  before its manifest entry. PDFs without an entry are only reported.
+"""
+import glob
+import os
+import shutil
+import struct
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ann_index import EXACT_VECTORS_FILE
+from chunk_store import ChunkStore, chunk_store_path
+from corpus_index import CORPUS_DB_ROOT
+from faiss_store import has_legacy_docstore, migrate_legacy_store
+from index_builder import INDEX_STATE_FILE, load_index_state
+from index_versions import (
+    LEGACY_FILES, STAGING_GRACE_SECONDS, VERSION_POINTER, active_path, active_version, gc_versions, list_versions,
+    retire_active,
+)
+from ingest_jobs import ACTIVE_STATUSES, STATUS_FAILED, STATUS_QUEUED, job_status, set_job_status
+from manifest import FAISS_DB_ROOT, FRONTEND_DB_PATH, PDFS_DIR, load_manifest, update_manifest_entry
+from text_store import TEXT_STORE_ROOT
+
+ORPHAN_GRACE_SECONDS = int(os.environ.get("ORPHAN_GRACE_SECONDS", "3600"))
+CHECK_WORKERS = int(os.environ.get("CHECK_WORKERS", "8"))
+
+# What --repair does about an issue
+NORMALIZE = "normalize"
+RELINK = "relink"
+REBUILD = "rebuild"
+MIGRATE = "migrate"
+FAIL = "fail"
+RECLAIM = "reclaim"
+REPORT = "report"
+
+# Problems with the files of the active version itself: rebuild without reusing them
+_RETIRE_FIRST = ("unreadable_index", "dimension", "chunk_count", "exact_vectors")
+
+
+def normalize_path(path: Optional[str]) -> Optional[str]:
+    """path with either separator, in this platform's form."""
+    if not path:
+        return path
+    return os.path.normpath(path.replace("\\", "/"))
+
+
+def read_index_header(path: str) -> Tuple[int, int]:
+    """(dimension, vector count) from the header every FAISS index file starts with."""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    fourcc, d, ntotal = struct.unpack("<4siq", head)
+    if not fourcc.isalnum() or d <= 0 or ntotal < 0:
+        raise ValueError(f"not a FAISS index: {path}")
+    return d, ntotal
+
+
+def _tree_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _age(path: str) -> float:
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def _issue(kind: str, action: str, detail: str, entry: Optional[Dict] = None, path: Optional[str] = None,
+           size: int = 0) -> Dict:
+    return {
+        "kind": kind, "action": action, "detail": detail, "path": path, "bytes": size,
+        "doc_id": (entry or {}).get("doc_id"), "name": (entry or {}).get("name"),
+    }
+
+
+def _index_facts(db_path: str) -> Dict:
+    """What the active version of db_path holds, from file headers only."""
+    version_path = active_path(db_path)
+    facts = {"version_path": version_path, "has_index": False}
+    index_file = os.path.join(version_path, "index.faiss")
+    if not os.path.exists(index_file):
+        return facts
+    facts["has_index"] = True
+    try:
+        facts["dim"], facts["ntotal"] = read_index_header(index_file)
+    except (OSError, ValueError, struct.error) as e:
+        facts["error"] = f"{type(e).__name__}: {e}"
+        return facts
+    if os.path.exists(chunk_store_path(version_path)):
+        store = ChunkStore(chunk_store_path(version_path))
+        try:
+            facts["chunks"] = store.count()
+        except Exception as e:
+            facts["error"] = f"chunks.sqlite: {type(e).__name__}: {e}"
+        finally:
+            store.close()
+    elif has_legacy_docstore(version_path):
+        facts["legacy_pickle"] = True
+    vectors_file = os.path.join(version_path, EXACT_VECTORS_FILE)
+    if os.path.exists(vectors_file):
+        import numpy as np
+
+        try:
+            facts["vectors_shape"] = tuple(np.load(vectors_file, mmap_mode="r").shape)
+        except Exception as e:
+            facts["error"] = f"{EXACT_VECTORS_FILE}: {type(e).__name__}: {e}"
+    if os.path.exists(os.path.join(version_path, INDEX_STATE_FILE)):
+        facts["state_model"] = load_index_state(db_path).get("embed_model")
+    return facts
+
+
+def _find_pdf(doc_id: str) -> Optional[str]:
+    matches = sorted(glob.glob(os.path.join(glob.escape(PDFS_DIR), glob.escape(doc_id) + "_*.pdf")))
+    return matches[0] if matches else None
+
+
+def _scan_entry(entry: Dict) -> Dict:
+    db_path = normalize_path(entry.get("db_path") or os.path.join(FAISS_DB_ROOT, entry.get("doc_id", "")))
+    pdf_path = normalize_path(entry.get("pdf_path"))
+    scan = {"entry": entry, "db_path": db_path, "pdf_path": pdf_path}
+    scan["pdf_exists"] = bool(pdf_path) and os.path.exists(pdf_path)
+    if not scan["pdf_exists"]:
+        scan["pdf_found"] = _find_pdf(entry.get("doc_id", ""))
+    scan["index"] = _index_facts(db_path)
+    return scan
+
+
+def _entry_issues(scan: Dict, expected_dims: Dict[str, int]) -> List[Dict]:
+    entry, facts = scan["entry"], scan["index"]
+    issues = []
+    if scan["db_path"] != entry.get("db_path") or scan["pdf_path"] != entry.get("pdf_path"):
+        issues.append(_issue("path", NORMALIZE, f"{entry.get('db_path')} -> {scan['db_path']}", entry))
+    if not scan["pdf_exists"]:
+        if scan.get("pdf_found"):
+            issues.append(_issue("pdf_moved", RELINK, f"PDF found at {scan['pdf_found']}", entry))
+        else:
+            if job_status(entry) != STATUS_FAILED:
+                issues.append(_issue("missing_pdf", FAIL, f"PDF missing: {scan['pdf_path']}", entry))
+            return issues
+    if job_status(entry) in ACTIVE_STATUSES or job_status(entry) == STATUS_FAILED:
+        # Being built, or waiting for someone to look at the error
+        return issues
+    model = entry.get("embed_model")
+    problem = None
+    if not facts["has_index"]:
+        problem = ("missing_index", "no index.faiss")
+    elif facts.get("error"):
+        problem = ("unreadable_index", facts["error"])
+    elif facts.get("state_model") and facts["state_model"] != model:
+        problem = ("embed_model", f"index built with {facts['state_model']}, entry says {model}")
+    elif model in expected_dims and facts["dim"] != expected_dims[model]:
+        problem = ("dimension", f"{facts['dim']} dimensions, {model} gives {expected_dims[model]}")
+    elif "chunks" in facts and facts["chunks"] != facts["ntotal"]:
+        problem = ("chunk_count", f"{facts['ntotal']} vectors but {facts['chunks']} chunks")
+    elif "vectors_shape" in facts and facts["vectors_shape"] != (facts["ntotal"], facts["dim"]):
+        problem = ("exact_vectors", f"{EXACT_VECTORS_FILE} is {facts['vectors_shape']}, "
+                                    f"index is {(facts['ntotal'], facts['dim'])}")
+    if problem:
+        issues.append(_issue(problem[0], REBUILD, problem[1], entry, scan["db_path"]))
+    elif facts.get("legacy_pickle"):
+        issues.append(_issue("legacy_pickle", MIGRATE, "chunks are in a pickled index.pkl", entry, scan["db_path"]))
+    return issues
+
+
+def _majority_dims(scans: List[Dict]) -> Dict[str, int]:
+    """Most common index dimension per embed model; a single index is its own majority."""
+    votes: Dict[str, Counter] = {}
+    for scan in scans:
+        dim = scan["index"].get("dim")
+        model = scan["entry"].get("embed_model")
+        if dim and model:
+            votes.setdefault(model, Counter())[dim] += 1
+    return {model: counter.most_common(1)[0][0] for model, counter in votes.items()}
+
+
+def _disk_issues(referenced_roots: set, known_ids: set, grace: int) -> List[Dict]:
+    """Orphaned index directories, the root-level index, inactive versions, temp files and page text."""
+    issues = []
+    index_roots = []
+    try:
+        names = sorted(os.listdir(FAISS_DB_ROOT))
+    except OSError:
+        names = []
+    root_index = [n for n in names if n == VERSION_POINTER or n in LEGACY_FILES] + list_versions(FAISS_DB_ROOT)
+    if root_index:
+        paths = [os.path.join(FAISS_DB_ROOT, n) for n in root_index]
+        if all(_age(p) >= grace for p in paths):
+            issues.append(_issue("root_index", RECLAIM, "index an older frontend.py wrote at the store root",
+                                 path=FAISS_DB_ROOT, size=sum(_tree_size(p) for p in paths)))
+    for name in names:
+        path = os.path.join(FAISS_DB_ROOT, name)
+        if name.endswith(".tmp") and _age(path) >= grace:
+            issues.append(_issue("temp_file", RECLAIM, "left by an interrupted save", path=path, size=_tree_size(path)))
+        if name in root_index or not os.path.isdir(path):
+            continue
+        if os.path.normcase(os.path.abspath(path)) == os.path.normcase(os.path.abspath(CORPUS_DB_ROOT)):
+            # Corpus indexes are derived from the per-document ones and tracked by corpus_index
+            corpus_roots = [os.path.join(path, m) for m in sorted(os.listdir(path))
+                            if os.path.isdir(os.path.join(path, m))]
+            for root in corpus_roots:
+                if has_legacy_docstore(active_path(root)):
+                    issues.append(_issue("legacy_pickle", MIGRATE, "corpus chunks are in a pickled index.pkl",
+                                         path=root))
+            index_roots.extend(corpus_roots)
+            continue
+        if os.path.normcase(os.path.abspath(path)) in referenced_roots:
+            index_roots.append(path)
+        elif ".trash-" in name or _age(path) >= grace:
+            issues.append(_issue("orphan_index", RECLAIM, "no manifest entry points here", path=path,
+                                 size=_tree_size(path)))
+    for root in index_roots:
+        active = active_version(root)
+        if active is None:
+            continue
+        stale = [os.path.join(root, v) for v in list_versions(root)
+                 if v != active and _age(os.path.join(root, v)) >= STAGING_GRACE_SECONDS]
+        stale += [os.path.join(root, n) for n in os.listdir(root) if ".trash-" in n]
+        stale += [os.path.join(root, n) for n in LEGACY_FILES if os.path.exists(os.path.join(root, n))]
+        if stale:
+            issues.append(_issue("old_versions", RECLAIM, f"{len(stale)} inactive version(s) or file(s)",
+                                 path=root, size=sum(_tree_size(p) for p in stale)))
+        for directory in (root, os.path.join(root, active)):
+            for name in os.listdir(directory):
+                tmp = os.path.join(directory, name)
+                if name.endswith(".tmp") and _age(tmp) >= grace:
+                    issues.append(_issue("temp_file", RECLAIM, "left by an interrupted save", path=tmp,
+                                         size=_tree_size(tmp)))
+    try:
+        pdf_names = sorted(os.listdir(PDFS_DIR))
+    except OSError:
+        pdf_names = []
+    for name in pdf_names:
+        path = os.path.join(PDFS_DIR, name)
+        if name.endswith(".part"):
+            if _age(path) >= grace:
+                issues.append(_issue("temp_file", RECLAIM, "interrupted upload", path=path, size=_tree_size(path)))
+        elif name.lower().endswith(".pdf") and name.split("_", 1)[0] not in known_ids:
+            issues.append(_issue("orphan_pdf", REPORT, "PDF without a manifest entry", path=path,
+                                 size=_tree_size(path)))
+    try:
+        text_names = sorted(os.listdir(TEXT_STORE_ROOT))
+    except OSError:
+        text_names = []
+    for name in text_names:
+        doc_id = name.split(".", 1)[0]
+        if doc_id not in known_ids and name.endswith((".zst", ".json")):
+            path = os.path.join(TEXT_STORE_ROOT, name)
+            issues.append(_issue("orphan_text", RECLAIM, "page text of a deleted document", path=path,
+                                 size=_tree_size(path)))
+    return issues
+
+
+def check_library(expected_dims: Optional[Dict[str, int]] = None, grace: int = ORPHAN_GRACE_SECONDS,
+                  workers: int = CHECK_WORKERS) -> List[Dict]:
+    """Every inconsistency between the manifest, pdfs/ and the index directories.
+
+    expected_dims (embed model -> dimension) defaults to the most common
+    dimension among that model's indexes.
+    """
+    entries = load_manifest()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        scans = list(pool.map(_scan_entry, entries))
+    dims = _majority_dims(scans)
+    dims.update(expected_dims or {})
+    issues = []
+    for scan in scans:
+        issues.extend(_entry_issues(scan, dims))
+    # frontend.py's index has no entry but is in use whenever that app runs
+    referenced = {os.path.normcase(os.path.abspath(p)) for p in [s["db_path"] for s in scans] + [FRONTEND_DB_PATH]}
+    issues.extend(_disk_issues(referenced, {e.get("doc_id") for e in entries}, grace))
+    return issues
+
+
+def _remove(path: str):
+    """Rename away, then delete: readers that still have files open keep them until they close."""
+    if os.path.isdir(path):
+        trash = path if ".trash-" in os.path.basename(path) else f"{path}.trash-{time.time_ns()}"
+        if trash != path:
+            os.rename(path, trash)
+        shutil.rmtree(trash, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+def _reclaim_root_index(root: str):
+    try:
+        os.remove(os.path.join(root, VERSION_POINTER))
+    except FileNotFoundError:
+        pass
+    for name in list_versions(root):
+        _remove(os.path.join(root, name))
+    for name in LEGACY_FILES:
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+
+
+def _repair_entry(doc_id: str, issues: List[Dict], scan: Dict):
+    # Paths first: the rebuild below runs against the normalized db_path
+    fields = {}
+    for issue in issues:
+        if issue["action"] == NORMALIZE:
+            fields.update(db_path=scan["db_path"], pdf_path=scan["pdf_path"])
+        elif issue["action"] == RELINK:
+            fields["pdf_path"] = scan["pdf_found"]
+    if fields:
+        update_manifest_entry(doc_id, **fields)
+    for issue in issues:
+        if issue["action"] == FAIL:
+            set_job_status(doc_id, STATUS_FAILED, error=issue["detail"])
+        elif issue["action"] == MIGRATE:
+            migrate_legacy_store(scan["db_path"])
+        elif issue["action"] == REBUILD:
+            if issue["kind"] in _RETIRE_FIRST:
+                retire_active(scan["db_path"])
+            set_job_status(doc_id, STATUS_QUEUED, progress=0.0, error=None)
+
+
+def _reclaim(issue: Dict):
+    kind, path = issue["kind"], issue["path"]
+    if kind == "legacy_pickle":
+        # A corpus index: lexical search runs on the per-document indexes
+        migrate_legacy_store(path, lexical=False)
+    elif kind == "root_index":
+        _reclaim_root_index(path)
+    elif kind == "old_versions":
+        gc_versions(path)
+    else:
+        _remove(path)
+
+
+def repair_library(issues: List[Dict], workers: int = CHECK_WORKERS) -> Dict[str, List]:
+    """Apply the fixes for issues; returns {"queued": doc_ids to rebuild, "fixed": issues, "failed": (issue, error)}."""
+    scans = {}
+    by_entry: Dict[str, List[Dict]] = {}
+    for issue in issues:
+        if issue["doc_id"] and issue["action"] != REPORT:
+            by_entry.setdefault(issue["doc_id"], []).append(issue)
+    for entry in load_manifest():
+        if entry.get("doc_id") in by_entry:
+            scans[entry["doc_id"]] = _scan_entry(entry)
+    result = {"queued": [], "fixed": [], "failed": []}
+
+    def run(job):
+        try:
+            if isinstance(job, str):
+                _repair_entry(job, by_entry[job], scans[job])
+                return [(i, None) for i in by_entry[job]]
+            _reclaim(job)
+            return [(job, None)]
+        except Exception as e:
+            return [(i, f"{type(e).__name__}: {e}") for i in (by_entry[job] if isinstance(job, str) else [job])]
+
+    jobs = [d for d in by_entry if d in scans]
+    jobs += [i for i in issues if i["action"] == RECLAIM or (i["action"] == MIGRATE and not i["doc_id"])]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for outcomes in pool.map(run, jobs):
+            for issue, error in outcomes:
+                if error:
+                    result["failed"].append((issue, error))
+                    continue
+                result["fixed"].append(issue)
+                if issue["action"] == REBUILD and issue["doc_id"] not in result["queued"]:
+                    result["queued"].append(issue["doc_id"])
+    return result
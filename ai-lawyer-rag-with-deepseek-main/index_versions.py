@@ -0,0 +1,234 @@
+"""Versioned index directories with an atomic switch to the new version.
+
+An index root (vectorstore/db_faiss/<doc_id>, or a corpus index) holds one
+directory per build, ``v<time_ns>``, plus a ``CURRENT`` file naming the
+active one:
+
+    <root>/CURRENT            -> "v1718000000000000000"
+    <root>/v1718000000000000000/index.faiss, chunks.sqlite, index_state.json, ...
+
+A build writes a new version directory and then replaces CURRENT with
+os.replace(), so a reader sees either the old index or the new one, never a
+mix, and a crash mid-build leaves the active version untouched. Roots that
+were written before versioning (files directly in the root) keep working as
+the active version until their next build.
+
+Readers take a shared flock on ``<version>/.lease`` for as long as they hold
+the store, and writers hold one on their unpublished version. gc_versions()
+deletes a version only if it can take the lock exclusively. Where flock is
+unavailable (Windows) the version directory is renamed before deletion,
+which fails while any of its files are open.
+"""
+import os
+import re
+import shutil
+import time
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows
+    fcntl = None
+
+VERSION_POINTER = "CURRENT"
+LEASE_FILE = ".lease"
+# Unpublished versions younger than this may still be acquiring their lease.
+STAGING_GRACE_SECONDS = 60
+LEGACY_FILES = ("index.faiss", "chunks.sqlite", "index.pkl", "vectors.f32.npy", "index_state.json", "bm25.sqlite")
+
+_VERSION_RE = re.compile(r"^v\d+$")
+
+
+def active_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, VERSION_POINTER), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    return name if _VERSION_RE.match(name) else None
+
+
+def active_path(db_path: str) -> str:
+    """Directory holding the active index files of db_path (db_path itself for unversioned roots)."""
+    name = active_version(db_path)
+    return os.path.join(db_path, name) if name else db_path
+
+
+def has_index(db_path: str) -> bool:
+    return os.path.exists(os.path.join(active_path(db_path), "index.faiss"))
+
+
+def list_versions(root: str) -> List[str]:
+    try:
+        return sorted(n for n in os.listdir(root) if _VERSION_RE.match(n) and os.path.isdir(os.path.join(root, n)))
+    except OSError:
+        return []
+
+
+class Lease:
+    """Shared lock that keeps one version directory from being collected."""
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def release(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def __del__(self):
+        self.release()
+
+
+def acquire_lease(version_path: str) -> Optional[Lease]:
+    """A shared lease on version_path, or None if it is gone or being deleted."""
+    try:
+        handle = open(os.path.join(version_path, LEASE_FILE), "rb")
+    except OSError:
+        return None
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return Lease(handle)
+
+
+def open_active(db_path: str, retries: int = 5) -> Tuple[str, Optional[Lease]]:
+    """(active directory, lease on it); retries if a concurrent publish removes the version first."""
+    for _ in range(retries):
+        name = active_version(db_path)
+        if name is None:
+            return db_path, None
+        path = os.path.join(db_path, name)
+        lease = acquire_lease(path)
+        if lease is not None and os.path.exists(os.path.join(path, "index.faiss")):
+            return path, lease
+        if lease is not None:
+            lease.release()
+        time.sleep(0.01)
+    raise FileNotFoundError(f"no readable index version under {db_path}")
+
+
+def new_version(root: str) -> Tuple[str, Lease]:
+    """An empty, leased version directory that is not active until publish()."""
+    os.makedirs(root, exist_ok=True)
+    while True:
+        path = os.path.join(root, f"v{time.time_ns()}")
+        try:
+            os.mkdir(path)
+            break
+        except FileExistsError:
+            continue
+    open(os.path.join(path, LEASE_FILE), "wb").close()
+    lease = acquire_lease(path)
+    if lease is None:
+        raise OSError(f"could not lease new index version {path}")
+    return path, lease
+
+
+def publish(root: str, version_path: str):
+    """Make version_path the active version of root."""
+    pointer = os.path.join(root, VERSION_POINTER)
+    tmp = f"{pointer}.{os.getpid()}-{time.time_ns()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(version_path))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+
+
+def discard(version_path: str):
+    shutil.rmtree(version_path, ignore_errors=True)
+
+
+def write_version(root: str, write: Callable[[str], None]) -> Tuple[str, Lease]:
+    """Run write(directory) on a new version, then publish it; a failed write leaves nothing behind."""
+    path, lease = new_version(root)
+    try:
+        write(path)
+        publish(root, path)
+    except BaseException:
+        lease.release()
+        discard(path)
+        raise
+    gc_versions(root)
+    return path, lease
+
+
+def retire_active(root: str) -> bool:
+    """Stop serving root's active index, so the next build starts from scratch.
+
+    Its files stay where open readers can finish with them; gc_versions()
+    collects them after the next publish.
+    """
+    if active_version(root):
+        try:
+            os.remove(os.path.join(root, VERSION_POINTER))
+            return True
+        except FileNotFoundError:
+            return False
+    legacy = [n for n in LEGACY_FILES if os.path.exists(os.path.join(root, n))]
+    if not legacy:
+        return False
+    path, lease = new_version(root)
+    lease.release()
+    for name in legacy:
+        os.replace(os.path.join(root, name), os.path.join(path, name))
+    return True
+
+
+def _try_remove(path: str) -> bool:
+    handle = None
+    try:
+        if fcntl is not None:
+            try:
+                handle = open(os.path.join(path, LEASE_FILE), "rb")
+            except OSError:
+                handle = None
+            if handle is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        trash = f"{path}.trash-{time.time_ns()}"
+        # Fails on Windows while a reader has any file of the version open.
+        os.rename(path, trash)
+        shutil.rmtree(trash, ignore_errors=True)
+        return True
+    except OSError:
+        return False
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+def gc_versions(root: str) -> int:
+    """Delete inactive versions that no reader or writer holds; returns how many were removed."""
+    active = active_version(root)
+    if active is None:
+        return 0
+    removed = 0
+    now = time.time()
+    for name in list_versions(root):
+        path = os.path.join(root, name)
+        if name == active:
+            continue
+        try:
+            if now - os.path.getmtime(path) < STAGING_GRACE_SECONDS:
+                continue
+        except OSError:
+            continue
+        if _try_remove(path):
+            removed += 1
+    try:
+        for name in os.listdir(root):
+            if ".trash-" in name:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    except OSError:
+        pass
+    # Files of the pre-versioning layout: readers that still have them open keep their copy.
+    for name in LEGACY_FILES:
+        try:
+            os.remove(os.path.join(root, name))
+        except OSError:
+            pass
+    return removed
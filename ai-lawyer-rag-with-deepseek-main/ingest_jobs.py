@@ -0,0 +1,141 @@
+"""Background ingestion jobs with their state persisted on the manifest entry.
+
+Each job moves an entry through queued -> parsing -> embedding -> ready (or
+failed). Because the state lives in the manifest, a restarted app finds the
+unfinished entries and queues them again. One daemon worker thread per process
+runs jobs one at a time.
+"""
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from embedding_pipeline import running_count
+from manifest import get_manifest_entry, load_manifest, update_manifest_entry
+
+STATUS_QUEUED = "queued"
+STATUS_PARSING = "parsing"
+STATUS_EMBEDDING = "embedding"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_PARSING, STATUS_EMBEDDING)
+
+# Persist progress at most this often so large documents don't rewrite the manifest per page.
+PROGRESS_WRITE_INTERVAL = 1.0
+
+# build_fn(entry, progress_callback, embed_progress_callback) indexes one manifest entry:
+# pages read (done, total), and chunks embedded (done, total) per embedding call.
+BuildFn = Callable[[Dict, Callable[[int, int], None], Callable[[int, int], None]], object]
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def job_status(entry: Optional[Dict]) -> str:
+    """Entries written before jobs existed have no status and are ready."""
+    if not entry:
+        return STATUS_FAILED
+    return entry.get("status", STATUS_READY)
+
+
+def set_job_status(doc_id: str, status: str, **fields) -> Optional[Dict]:
+    return update_manifest_entry(doc_id, status=status, status_updated_at=_now(), **fields)
+
+
+class IngestWorker:
+    """Single-thread job runner fed by a de-duplicating queue of doc_ids."""
+
+    def __init__(self, build_fn: BuildFn):
+        self.build_fn = build_fn
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, doc_id: str, persist: bool = True):
+        if persist:
+            set_job_status(doc_id, STATUS_QUEUED, progress=0.0, error=None)
+        with self._lock:
+            if doc_id in self._queued:
+                return
+            self._queued.add(doc_id)
+        self._queue.put(doc_id)
+
+    def resume_pending(self):
+        """Re-queue entries left queued or half-done by a previous process."""
+        for entry in load_manifest():
+            if job_status(entry) in ACTIVE_STATUSES:
+                self.submit(entry["doc_id"], persist=False)
+
+    def _run(self):
+        while True:
+            doc_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(doc_id)
+            try:
+                self._process(doc_id)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, doc_id: str):
+        entry = get_manifest_entry(doc_id)
+        if entry is None:
+            return
+        set_job_status(doc_id, STATUS_PARSING, progress=0.0, error=None, embedded_chunks=0)
+        # Parsing until the first batch of chunks reaches the embedder; progress counts pages either way.
+        stage = {"status": STATUS_PARSING}
+        last_write = [time.monotonic()]
+
+        def progress(done: int, total: int):
+            now = time.monotonic()
+            if done < total and now - last_write[0] < PROGRESS_WRITE_INTERVAL:
+                return
+            last_write[0] = now
+            set_job_status(doc_id, stage["status"], progress=round(done / max(1, total), 3))
+
+        last_embed_write = [0.0]
+
+        def embedded(count: int):
+            now = time.monotonic()
+            if stage["status"] == STATUS_PARSING:
+                stage["status"] = STATUS_EMBEDDING
+                last_embed_write[0] = now
+                set_job_status(doc_id, STATUS_EMBEDDING, embedded_chunks=count)
+                return
+            if now - last_embed_write[0] < PROGRESS_WRITE_INTERVAL:
+                return
+            last_embed_write[0] = now
+            update_manifest_entry(doc_id, embedded_chunks=count)
+
+        try:
+            result = self.build_fn(entry, progress, running_count(embedded))
+        except Exception as e:
+            set_job_status(doc_id, STATUS_FAILED, error=f"{type(e).__name__}: {e}")
+            traceback.print_exc()
+            return
+        extra = {"index_stats": result} if isinstance(result, dict) else {}
+        if extra and result.get("version"):
+            # The version directory the index root's CURRENT pointer was switched to
+            extra["index_version"] = result["version"]
+        set_job_status(doc_id, STATUS_READY, progress=1.0, indexed_at=_now(), **extra)
+
+
+_worker: Optional[IngestWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_ingest_worker(build_fn: BuildFn) -> IngestWorker:
+    """Start the process-wide worker on first use and resume unfinished jobs."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = IngestWorker(build_fn)
+            _worker.resume_pending()
+        else:
+            # Streamlit reruns the script; keep the newest build function.
+            _worker.build_fn = build_fn
+        return _worker
@@ -0,0 +1,129 @@
+"""Legal-structure-aware text splitter.
+
+Splits at Article / Section / Clause / Schedule (and Chapter / Part) headings
+instead of every 1000 characters, packs short consecutive provisions into one
+chunk, and only falls back to a character splitter (without overlap) for a
+single provision that is longer than the chunk size. The heading each chunk
+belongs to is kept in metadata ("section" and "headings").
+
+Pages are split one at a time, so a provision that continues onto the next page
+would lose its heading. annotate_headings() records the heading in force at the
+top of every page as ``section_carry`` metadata before the pages are split.
+"""
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+LEGAL_CHUNK_SIZE = 1200
+LEGAL_MIN_CHUNK = 300
+
+_HEADING_RE = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:ARTICLE|Article|Art\.)\s+[0-9IVXLC]+[A-Za-z]?"
+    r"|(?:SECTION|Section|Sec\.|§)\s*\d+[A-Za-z]?(?:\.\d+)*"
+    r"|(?:CLAUSE|Clause)\s+\d+(?:\.\d+)*"
+    r"|(?:SCHEDULE|Schedule)\s+(?:[0-9IVXLC]+|[A-Z])\b"
+    r"|(?:CHAPTER|Chapter|PART|Part)\s+(?:[0-9IVXLC]+|[A-Z])\b"
+    r"|PREAMBLE|Preamble"
+    r")(?=$|[\s.:\-–—])[^\n]{0,80}$",
+    re.MULTILINE,
+)
+
+
+def find_headings(text: str) -> List[Tuple[int, str]]:
+    """(offset, heading line) for every structural heading in text."""
+    headings = []
+    for m in _HEADING_RE.finditer(text):
+        line = m.group(0).strip()
+        # A heading line is short; long lines are running text that merely starts with "Section 3 ...".
+        if len(line) <= 80 and not line.endswith((",", ";")):
+            headings.append((m.start(), line))
+    return headings
+
+
+def last_heading(text: str) -> Optional[str]:
+    headings = find_headings(text)
+    return headings[-1][1] if headings else None
+
+
+def annotate_headings(pages: Iterable[Document]) -> Iterator[Document]:
+    """Stamp each page with the heading carried over from earlier pages (streaming)."""
+    carry = ""
+    for page in pages:
+        page.metadata["section_carry"] = carry
+        carry = last_heading(page.page_content) or carry
+        yield page
+
+
+class LegalTextSplitter:
+    """Split documents on legal headings; same call shape as split_documents()."""
+
+    def __init__(self, chunk_size: int = LEGAL_CHUNK_SIZE, min_chunk: int = LEGAL_MIN_CHUNK):
+        self.chunk_size = chunk_size
+        self.min_chunk = min_chunk
+        self._fallback = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0)
+
+    def _sections(self, text: str, carry: str) -> List[Tuple[int, str, str]]:
+        """(start offset, heading, body) per provision, the first inheriting carry."""
+        heads = find_headings(text)
+        bounds = [(0, carry)] if not heads or heads[0][0] > 0 else []
+        bounds += heads
+        sections = []
+        for i, (start, heading) in enumerate(bounds):
+            end = bounds[i + 1][0] if i + 1 < len(bounds) else len(text)
+            body = text[start:end]
+            if body.strip():
+                sections.append((start, heading, body))
+        return sections
+
+    def _pack(self, sections: List[Tuple[int, str, str]]) -> List[Tuple[int, List[str], str]]:
+        """Merge consecutive provisions up to chunk_size; split oversized ones."""
+        packed: List[Tuple[int, List[str], str]] = []
+        cur_start, cur_heads, cur_text = 0, [], ""
+        for start, heading, body in sections:
+            if len(body) > self.chunk_size:
+                heads = [heading] if heading else []
+                if cur_text and len(cur_text) < self.min_chunk:
+                    # Fold a short lead-in (e.g. a title line) into the long provision.
+                    start, body = cur_start, cur_text + body
+                    heads = cur_heads + [h for h in heads if h not in cur_heads]
+                elif cur_text:
+                    packed.append((cur_start, cur_heads, cur_text))
+                cur_start, cur_heads, cur_text = 0, [], ""
+                offset = 0
+                for piece in self._fallback.split_text(body):
+                    found = body.find(piece, offset)
+                    offset = found if found >= 0 else offset
+                    packed.append((start + offset, heads, piece))
+                continue
+            if cur_text and len(cur_text) + len(body) > self.chunk_size and len(cur_text) >= self.min_chunk:
+                packed.append((cur_start, cur_heads, cur_text))
+                cur_start, cur_heads, cur_text = 0, [], ""
+            if not cur_text:
+                cur_start = start
+            cur_text += body
+            if heading and heading not in cur_heads:
+                cur_heads.append(heading)
+        if cur_text:
+            packed.append((cur_start, cur_heads, cur_text))
+        return packed
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        chunks: List[Document] = []
+        carry = ""
+        for doc in documents:
+            md: Dict = dict(doc.metadata or {})
+            carry = md.pop("section_carry", carry)
+            for start, heads, text in self._pack(self._sections(doc.page_content, carry)):
+                text = text.strip()
+                if not text:
+                    continue
+                meta = dict(md)
+                meta["start_index"] = start
+                meta["section"] = heads[0] if heads else ""
+                meta["headings"] = heads
+                chunks.append(Document(page_content=text, metadata=meta))
+            carry = last_heading(doc.page_content) or carry
+        return chunks
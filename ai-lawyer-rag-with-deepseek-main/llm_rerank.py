@@ -0,0 +1,174 @@
+"""LLM relevance scoring of retrieval candidates for hybrid_rerank.
+
+RERANK_MODE picks how candidates are scored:
+
+``pointwise`` (default): every candidate chunk is scored by its own chat
+completion. The calls run on a process-wide pool of RERANK_CONCURRENCY
+threads, so scoring costs about one Groq round trip rather than one per
+candidate, and all sessions together never have more than RERANK_CONCURRENCY
+scoring calls in flight.
+
+``listwise``: one JSON-mode call carries the instructions, the query and all
+numbered candidates, and returns a score per candidate number. The prompt is
+kept within RERANK_TOKEN_BUDGET tokens (estimated at 4 characters each, the
+reply included): long candidates are truncated first, the longest the most,
+and candidates that still do not fit are left unscored.
+
+In both modes a score that has not arrived RERANK_TIMEOUT seconds after the
+request(s) went out is dropped: its slot in the result is None and the
+caller falls back to its BM25 and vector blend for that candidate.
+"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Sequence, Tuple
+
+RERANK_MODE = os.environ.get("RERANK_MODE", "pointwise")
+RERANK_CONCURRENCY = int(os.environ.get("RERANK_CONCURRENCY", "16"))
+RERANK_TIMEOUT = float(os.environ.get("RERANK_TIMEOUT", "8"))
+RERANK_TOKEN_BUDGET = int(os.environ.get("RERANK_TOKEN_BUDGET", "4000"))
+# A candidate cut shorter than this is not worth scoring
+RERANK_MIN_CHUNK_TOKENS = 48
+CHARS_PER_TOKEN = 4
+# Reply tokens per candidate: {"id": 12, "score": 0.85},
+_REPLY_TOKENS_PER_ITEM = 12
+
+_LISTWISE_INSTRUCTIONS = (
+    "Rate the relevance of each numbered passage to the query on a 0-1 scale. "
+    'Reply with only a JSON object of the form {"scores": [{"id": <passage number>, "score": <0-1>}, ...]} '
+    "with one item for every passage, most relevant first."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def relevance_prompt(query: str, chunk: str) -> str:
+    return (
+        "Rate the relevance of the chunk to the query on a 0-1 scale. "
+        "Reply with only a number.\n\nQuery:\n" + query + "\n\nChunk:\n" + chunk
+    )
+
+
+def parse_score(text: str) -> Optional[float]:
+    try:
+        val = float(text.strip())
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return min(1.0, max(0.0, val))
+
+
+def llm_score(client, model: str, query: str, chunk: str, timeout: float = RERANK_TIMEOUT) -> Optional[float]:
+    """Relevance of chunk to query in [0, 1], or None if the call fails or the reply is not a number."""
+    try:
+        comp = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": relevance_prompt(query, chunk)}],
+            temperature=0.0,
+            timeout=timeout,
+        )
+        return parse_score(comp.choices[0].message.content)
+    except Exception:
+        return None
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, RERANK_CONCURRENCY), thread_name_prefix="llm-rerank")
+        return _pool
+
+
+def score_chunks(client, model: str, query: str, chunks: Sequence[str],
+                 timeout: float = RERANK_TIMEOUT) -> List[Optional[float]]:
+    """llm_score for every chunk, run concurrently; None where no score arrived within timeout."""
+    if not chunks:
+        return []
+    pool = _get_pool()
+    futures = [pool.submit(llm_score, client, model, query, chunk, timeout) for chunk in chunks]
+    done, late = wait(futures, timeout=timeout)
+    for future in late:
+        # Not started yet (the pool is busy with other sessions): don't spend a call on it
+        future.cancel()
+    return [f.result() if f in done else None for f in futures]
+
+
+def _fit(lengths: List[int], available: int) -> int:
+    """Largest per-candidate cap (in characters) with sum(min(length, cap)) <= available."""
+    if sum(lengths) <= available:
+        return max(lengths, default=0)
+    remaining, count = available, len(lengths)
+    for length in sorted(lengths):
+        if length * count > remaining:
+            return remaining // count
+        remaining -= length
+        count -= 1
+    return max(lengths, default=0)
+
+
+def listwise_prompt(query: str, chunks: Sequence[str], budget: int = RERANK_TOKEN_BUDGET) -> Tuple[str, int]:
+    """(prompt, number of leading chunks it carries) for a budget of prompt + reply tokens."""
+    head = f"{_LISTWISE_INSTRUCTIONS}\n\nQuery:\n{query}\n\nPassages:\n"
+    for n in range(len(chunks), 0, -1):
+        labels = "".join(f"\n\n[{i + 1}] " for i in range(n))
+        available = (budget - n * _REPLY_TOKENS_PER_ITEM - estimate_tokens(head + labels)) * CHARS_PER_TOKEN
+        cap = _fit([len(c) for c in chunks[:n]], available)
+        if cap >= RERANK_MIN_CHUNK_TOKENS * CHARS_PER_TOKEN or cap >= max(len(c) for c in chunks[:n]):
+            body = "\n\n".join(f"[{i + 1}] {c[:cap]}" for i, c in enumerate(chunks[:n]))
+            return head + body, n
+    return head, 0
+
+
+def parse_listwise(text: str, n: int) -> List[Optional[float]]:
+    """Scores for candidates 1..n from a listwise reply; None for any it left out."""
+    scores: List[Optional[float]] = [None] * n
+    try:
+        data = json.loads(text[text.index("{"):text.rindex("}") + 1])
+    except (AttributeError, ValueError):
+        return scores
+    items = data.get("scores", []) if isinstance(data, dict) else []
+    for item in items if isinstance(items, list) else []:
+        try:
+            pos = int(item["id"]) - 1
+            val = float(item["score"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= pos < n:
+            scores[pos] = min(1.0, max(0.0, val))
+    return scores
+
+
+def rank_listwise(client, model: str, query: str, chunks: Sequence[str], timeout: float = RERANK_TIMEOUT,
+                  budget: int = RERANK_TOKEN_BUDGET) -> List[Optional[float]]:
+    """Scores for every chunk from a single call; None where the reply or the budget left one out."""
+    prompt, n = listwise_prompt(query, chunks, budget)
+    scores: List[Optional[float]] = [None] * len(chunks)
+    if n == 0:
+        return scores
+    try:
+        comp = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.0,
+            response_format={"type": "json_object"},
+            timeout=timeout,
+        )
+        scores[:n] = parse_listwise(comp.choices[0].message.content, n)
+    except Exception:
+        pass
+    return scores
+
+
+def rerank_scores(client, model: str, query: str, chunks: Sequence[str],
+                  mode: str = RERANK_MODE) -> List[Optional[float]]:
+    """LLM relevance per chunk in the configured mode; None means rank that chunk without it."""
+    if mode == "listwise":
+        return rank_listwise(client, model, query, chunks)
+    return score_chunks(client, model, query, chunks)
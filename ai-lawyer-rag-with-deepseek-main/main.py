@@ -1,7 +1,5 @@
 import streamlit as st
 
-from langchain_community.document_loaders import PDFPlumberLoader  # type: ignore
-from langchain_text_splitters import RecursiveCharacterTextSplitter  # type: ignore
 from langchain_community.embeddings import OllamaEmbeddings  # type: ignore
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_community.vectorstores import FAISS  # type: ignore
@@ -9,6 +7,7 @@ from groq import Groq, BadRequestError
 import os
 import json
 import hashlib
+import tempfile
 import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
@@ -23,6 +22,29 @@ import requests
 import xml.etree.ElementTree as ET
 from io import BytesIO
 import zipfile
+from embedding_cache import CachedEmbeddings, get_embedding_cache
+from embedding_pipeline import BatchedEmbeddings, running_count
+from index_builder import load_index_state, sync_vector_store
+from pdf_extract import iter_pdf_pages
+from text_store import delete_text_store, iter_document_pages, read_pages
+from corpus_index import CORPUS_INDEX, get_corpus_index
+from ann_index import ANN_QUANTIZATION, QUANTIZATIONS, prepare_for_search
+from faiss_store import load_store
+from store_cache import get_store_cache
+from index_versions import gc_versions, has_index
+from llm_rerank import rerank_scores
+from bm25_index import hybrid_search, reciprocal_rank_fusion, store_bm25, tokenize
+from legal_chunker import annotate_headings
+# One CHUNK_STRATEGY switch and chunk parameters for the app, frontend.py and the CLI, so they share indexes
+from vector_database import CHUNK_STRATEGY, chunk_params, create_chunks
+from manifest import (
+    FAISS_DB_ROOT, PDFS_DIR, ensure_dirs, load_manifest,
+    get_manifest_entry, upsert_manifest_entry, delete_manifest_entry, add_manifest_tag, all_tags,
+    entries_with_tags, query_manifest,
+)
+from ingest_jobs import (
+    ACTIVE_STATUSES, STATUS_FAILED, STATUS_READY, get_ingest_worker, job_status, set_job_status,
+)
 
 
 
@@ -53,9 +75,6 @@ Detailed Answer:
 """
 
 OLLAMA_EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text")
-FAISS_DB_ROOT = "vectorstore/db_faiss"
-MANIFEST_PATH = os.path.join(FAISS_DB_ROOT, "manifest.json")
-PDFS_DIR = "pdfs/"
 
 DEFAULT_NEWS_SOURCES = [
     "https://www.livelaw.in/rss/topstories.xml",
@@ -582,99 +601,198 @@ def resolve_groq_model(client: Groq) -> str:
 
 GROQ_MODEL = resolve_groq_model(groq_client)
 
-def _ensure_dirs():
-    os.makedirs(PDFS_DIR, exist_ok=True)
-    os.makedirs(FAISS_DB_ROOT, exist_ok=True)
+_UPLOAD_BLOCK = 1 << 20
 
-def _sha256_bytes(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+def _iter_upload_blocks(file):
+    file.seek(0)
+    while True:
+        block = file.read(_UPLOAD_BLOCK)
+        if not block:
+            break
+        yield block
+    file.seek(0)
 
-def load_manifest() -> List[Dict]:
-    _ensure_dirs()
-    if os.path.exists(MANIFEST_PATH):
-        try:
-            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return []
-    return []
-
-def save_manifest(entries: List[Dict]):
-    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
-        json.dump(entries, f, indent=2)
-
-def upsert_manifest_entry(entry: Dict):
-    entries = load_manifest()
-    # Remove any existing entry with same doc_id
-    entries = [e for e in entries if e.get("doc_id") != entry.get("doc_id")]
-    entries.append(entry)
-    save_manifest(entries)
-
-def delete_manifest_entry(doc_id: str):
-    entries = load_manifest()
-    entries = [e for e in entries if e.get("doc_id") != doc_id]
-    save_manifest(entries)
-
-def upload_pdf(file) -> Dict:
-    """Save uploaded PDF and return metadata entry (without FAISS yet)."""
-    _ensure_dirs()
-    raw = file.getbuffer()
-    doc_id = _sha256_bytes(raw)
+def save_upload(file) -> Tuple[str, str, int]:
+    """Stream an uploaded file into PDFS_DIR once, hashing it as it is written.
+
+    Returns (doc_id, pdf_path, size). The bytes go to a private temp file that is
+    renamed to the content-addressed name; if that file exists it already holds
+    these bytes and the copy is dropped.
+    """
+    ensure_dirs()
+    safe_name = file.name.replace("/", "_").replace("\\", "_")
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=PDFS_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in _iter_upload_blocks(file):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+        doc_id = digest.hexdigest()
+        pdf_path = os.path.join(PDFS_DIR, f"{doc_id}_{safe_name}")
+        if os.path.exists(pdf_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, pdf_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return doc_id, pdf_path, size
+
+def find_indexed_entry(doc_id: str, embed_model: str = OLLAMA_EMBED_MODEL) -> Optional[Dict]:
+    """Manifest entry whose index is ready for this embed model and the current chunking."""
+    entry = get_manifest_entry(doc_id)
+    if not entry or entry.get("embed_model") != embed_model or job_status(entry) != STATUS_READY:
+        return None
+    if not has_index(entry.get("db_path", "")):
+        return None
+    if load_index_state(entry["db_path"]).get("chunking") != chunk_params():
+        return None
+    return entry
+
+def upload_pdf(file, quantization: Optional[str] = None, saved: Optional[Tuple[str, str, int]] = None) -> Dict:
+    """Save uploaded PDF and return metadata entry (without FAISS yet).
+
+    saved is save_upload()'s result when the caller has already stored the file.
+    """
+    doc_id, pdf_path, size = saved or save_upload(file)
     safe_name = file.name.replace("/", "_").replace("\\", "_")
-    pdf_path = os.path.join(PDFS_DIR, f"{doc_id}_{safe_name}")
-    with open(pdf_path, "wb") as f:
-        f.write(raw)
     entry = {
         "doc_id": doc_id,
         "name": safe_name,
-        "size": len(raw),
+        "size": size,
         "created_at": datetime.utcnow().isoformat() + "Z",
         "pdf_path": pdf_path,
         "db_path": os.path.join(FAISS_DB_ROOT, doc_id),
         "embed_model": OLLAMA_EMBED_MODEL,
     }
+    previous = get_manifest_entry(doc_id)
+    if previous and previous.get("tags"):
+        entry["tags"] = previous["tags"]
+    # Vector storage mode (none/fp16/int8/pq) is a per-document build option
+    entry["quantization"] = quantization or (previous or {}).get("quantization") or ANN_QUANTIZATION
     upsert_manifest_entry(entry)
     return entry
 
 
 def load_pdf(file_path):
-    loader = PDFPlumberLoader(file_path)
-    documents = loader.load()
+    # pypdfium2 text with per-page pdfplumber fallback, page ranges extracted in parallel
+    documents = list(iter_pdf_pages(file_path))
     return documents
 
 
-def create_chunks(documents): 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size = 1000,
-        chunk_overlap = 200,
-        add_start_index = True
-    )
-    text_chunks = text_splitter.split_documents(documents)
-    return text_chunks
+_shared_embedding_models: Dict[str, CachedEmbeddings] = {}
 
 
-def get_embedding_model(ollama_model_name):
-    embeddings = OllamaEmbeddings(model=ollama_model_name)
+def get_embedding_model(ollama_model_name, progress_callback=None):
+    # Chunk vectors are served from the on-disk cache; only new text reaches Ollama,
+    # in bounded batches from a small worker pool.
+    if progress_callback is None and ollama_model_name in _shared_embedding_models:
+        # Stateless without a callback, so one client per model serves every session
+        return _shared_embedding_models[ollama_model_name]
+    batched = BatchedEmbeddings(OllamaEmbeddings(model=ollama_model_name), progress_callback=progress_callback)
+    embeddings = CachedEmbeddings(batched, ollama_model_name)
+    if progress_callback is None:
+        _shared_embedding_models[ollama_model_name] = embeddings
     return embeddings
 
 
-def create_vector_store(db_faiss_path: str, text_chunks, ollama_model_name: str):
-    os.makedirs(db_faiss_path, exist_ok=True)
-    faiss_db = FAISS.from_documents(text_chunks, get_embedding_model(ollama_model_name))
-    faiss_db.save_local(db_faiss_path)
-    return faiss_db
+def indexing_progress(label: str = "Indexing pages"):
+    """Return (page callback, embedding callback) driving one Streamlit progress bar.
 
-def load_vector_store(db_faiss_path: str, ollama_model_name: str) -> Optional[FAISS]:
+    The bar follows pages read; its text also counts the chunks embedded so far.
+    """
+    bar = st.progress(0.0, text=label)
+    state = {"fraction": 0.0, "pages": "", "embedded": 0}
+
+    def render():
+        text = f"{label}: {state['pages']}" if state["pages"] else label
+        if state["embedded"]:
+            text += f" · {state['embedded']} chunks embedded"
+        bar.progress(min(1.0, state["fraction"]), text=text)
+
+    def pages(done: int, total: int):
+        state["fraction"] = done / max(1, total)
+        state["pages"] = f"{done}/{total}"
+        render()
+
+    def embedded(count: int):
+        state["embedded"] = count
+        render()
+
+    return pages, running_count(embedded)
+
+
+def _index_entry(entry: Dict, progress_callback=None, embed_progress_callback=None):
+    """Build function run by the background ingestion worker for one manifest entry."""
+    faiss_db, stats = rebuild_vector_store(
+        entry["db_path"], iter_document_pages(entry["doc_id"], entry["pdf_path"]), entry["embed_model"], progress_callback,
+        quantization=entry.get("quantization"), embed_progress_callback=embed_progress_callback,
+    )
+    sync_corpus_entry(entry, faiss_db)
+    return stats
+
+
+def sync_corpus_entry(entry: Dict, faiss_db: Optional[FAISS]):
+    """Copy a freshly built per-document index into the corpus index (CORPUS_INDEX=1)."""
+    if not CORPUS_INDEX or faiss_db is None:
+        return
+    model = entry.get("embed_model", OLLAMA_EMBED_MODEL)
     try:
-        return FAISS.load_local(
-            db_faiss_path,
-            get_embedding_model(ollama_model_name),
-            allow_dangerous_deserialization=True,
+        get_corpus_index(model, get_embedding_model(model)).upsert_document(
+            entry["doc_id"], faiss_db, entry.get("name"), source_path=entry["db_path"]
         )
+    except Exception as e:
+        print(f"Corpus index update failed for {entry.get('doc_id')}: {e}")
+
+
+def submit_index_job(doc_id: str):
+    """Queue (re)indexing of a manifest entry on the background worker."""
+    get_ingest_worker(_index_entry).submit(doc_id)
+
+
+def rebuild_vector_store(db_faiss_path: str, documents, ollama_model_name: str, progress_callback=None,
+                         quantization: Optional[str] = None, embed_progress_callback=None):
+    """Patch the index in place so only changed pages/chunks are re-split and re-embedded.
+
+    documents may be a page generator (see iter_pdf_pages); it is consumed in a
+    single streaming pass. progress_callback gets pages read, and
+    embed_progress_callback the (done, total) of each embedding batch.
+    """
+    if CHUNK_STRATEGY == "legal":
+        # Pages are split one at a time; carry the heading in force across page breaks
+        documents = annotate_headings(documents)
+    result = sync_vector_store(
+        db_faiss_path, documents, get_embedding_model(ollama_model_name, embed_progress_callback),
+        ollama_model_name, create_chunks, chunk_params(), progress_callback=progress_callback,
+        quantization=quantization,
+    )
+    # A saved rebuild already changes the cache key; this also frees the old copy now,
+    # so its version directory can be collected unless another session still holds it
+    get_store_cache().invalidate(db_faiss_path)
+    gc_versions(db_faiss_path)
+    return result
+
+def _open_vector_store(db_faiss_path: str, ollama_model_name: str) -> Optional[FAISS]:
+    try:
+        # Read-only mmap (FAISS_MMAP): sessions and workers share the index pages
+        faiss_db = load_store(db_faiss_path, get_embedding_model(ollama_model_name))
+        # nprobe / efSearch knobs; int8 / pq indexes re-rank on memory-mapped exact vectors
+        return prepare_for_search(faiss_db, db_faiss_path)
     except Exception:
         return None
 
 
+def load_vector_store(db_faiss_path: str, ollama_model_name: str) -> Optional[FAISS]:
+    """Search-only store, shared across sessions until the index changes (see store_cache)."""
+    return get_store_cache().get(
+        db_faiss_path, ollama_model_name, lambda: _open_vector_store(db_faiss_path, ollama_model_name)
+    )
+
+
 def retrieve_docs(faiss_db, query):
     # Default retrieval using MMR for diversity
     try:
@@ -682,55 +800,37 @@ def retrieve_docs(faiss_db, query):
     except Exception:
         return faiss_db.similarity_search(query)
 
-def _tokenize(text: str) -> List[str]:
-    return [t.lower() for t in text.split() if t.strip()]
-
 def hybrid_rerank(faiss_db, query: str, top_k: int) -> List:
     """Hybrid retrieval: vector (MMR) + lexical BM25 + lightweight LLM scoring.
-    Operates over vector candidates to keep latency acceptable.
+    Vector search and a BM25 search over the document's whole index run in
+    parallel and are merged with reciprocal rank fusion (see bm25_index). LLM
+    scores for the fused candidates are fetched concurrently or in one
+    listwise call (see llm_rerank); a candidate whose score does not arrive in
+    time is ranked on its fused rank instead.
+    Returns (document, final score, normalized RRF score, LLM score, feedback weight).
     """
-    candidates = retrieve_docs(faiss_db, query)
-    if not candidates:
+    fused, _ = hybrid_search(faiss_db, query, lambda: retrieve_docs(faiss_db, query))
+    if not fused:
         return []
+    if store_bm25(faiss_db) is None:
+        # No stored BM25 index (a version saved before bm25.sqlite): rank the vector candidates lexically
+        vector_docs = [d for d, _ in fused]
+        bm_scores = BM25Okapi([tokenize(d.page_content) for d in vector_docs]).get_scores(tokenize(query))
+        order = sorted(range(len(vector_docs)), key=lambda i: bm_scores[i], reverse=True)
+        fused = reciprocal_rank_fusion([vector_docs, [vector_docs[i] for i in order if bm_scores[i] > 0]])
+    # Only as many candidates as the LLM scores: the rest would rank on retrieval alone
+    fused = fused[:max(10, top_k * 3)]
+    candidates = [d for d, _ in fused]
     corpus = [d.page_content for d in candidates]
-    tokenized = [_tokenize(c) for c in corpus]
-    bm25 = BM25Okapi(tokenized)
-    bm_scores = bm25.get_scores(_tokenize(query))
-
-    # Lightweight LLM scoring
-    def llm_score(q: str, chunk: str) -> float:
-        prompt = (
-            "Rate the relevance of the chunk to the query on a 0-1 scale. "
-            "Reply with only a number.\n\nQuery:\n" + q + "\n\nChunk:\n" + chunk
-        )
-        try:
-            comp = groq_client.chat.completions.create(
-                model=GROQ_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.0,
-            )
-            text = comp.choices[0].message.content.strip()
-            val = float(text)
-            if val < 0:
-                return 0.0
-            if val > 1:
-                return 1.0
-            return val
-        except Exception:
-            return 0.5
-
-    # Cap LLM scoring to first N for speed
-    N = min(len(candidates), max(10, top_k * 3))
-    llm_scores = [0.0] * len(candidates)
-    for i in range(N):
-        llm_scores[i] = llm_score(query, corpus[i])
-
-    # Normalize BM25 scores
-    if len(bm_scores) > 0:
-        max_bm = max(bm_scores) or 1.0
-        bm_norm = [s / max_bm for s in bm_scores]
-    else:
-        bm_norm = [0.0] * len(candidates)
+
+    # Retrieval relevance from the fused RRF scores
+    max_rrf = fused[0][1] or 1.0
+    rrf_scores = [s / max_rrf for _, s in fused]
+
+    # Lightweight LLM scoring: one call per chunk in parallel, or one listwise call (RERANK_MODE)
+    scored = rerank_scores(groq_client, GROQ_MODEL, query, corpus)
+    # Failed or late: stand in with the fused retrieval score
+    llm_scores = [val if val is not None else rrf_scores[i] for i, val in enumerate(scored)]
 
     # Apply feedback weights if any
     def chunk_id_from_text(t: str) -> str:
@@ -753,8 +853,8 @@ def hybrid_rerank(faiss_db, query: str, top_k: int) -> List:
     # Final score: weighted blend
     final = []
     for i, d in enumerate(candidates):
-        score = (0.5 * bm_norm[i] + 0.5 * llm_scores[i]) * weights[i]
-        final.append((d, score, bm_norm[i], llm_scores[i], weights[i]))
+        score = (0.5 * rrf_scores[i] + 0.5 * llm_scores[i]) * weights[i]
+        final.append((d, score, rrf_scores[i], llm_scores[i], weights[i]))
     final.sort(key=lambda x: x[1], reverse=True)
     return final[:top_k]
 
@@ -1031,27 +1131,42 @@ def build_timeline(entities: Dict) -> List[Dict]:
 
 # FEATURE 3: Advanced Search Functions
 def search_in_documents(query: str, doc_filter: Optional[str] = None, 
-                       date_from: Optional[str] = None, date_to: Optional[str] = None) -> List:
+                       date_from: Optional[str] = None, date_to: Optional[str] = None,
+                       tags: Optional[List[str]] = None) -> List:
     """Advanced search with filters across documents."""
     results = []
-    manifest = load_manifest()
+    # Name, date and tag (any of the selected) filters run as one indexed manifest query
+    candidates = query_manifest(
+        tags=tags or None, created_from=date_from, created_to=date_to, name_contains=doc_filter
+    )
     
-    for entry in manifest:
-        # Apply document filter
-        if doc_filter and doc_filter not in entry.get("name", ""):
-            continue
-        
-        # Apply date filter
-        created = entry.get("created_at", "")
-        if date_from and created < date_from:
-            continue
-        if date_to and created > date_to:
-            continue
-        
+    if CORPUS_INDEX and candidates:
+        # One filtered ANN search over the corpus index instead of loading every index
+        corpus = get_corpus_index(OLLAMA_EMBED_MODEL, get_embedding_model(OLLAMA_EMBED_MODEL))
+        in_corpus = corpus.doc_ids()
+        covered = {e["doc_id"]: e for e in candidates
+                   if e.get("doc_id") in in_corpus and e.get("embed_model") == OLLAMA_EMBED_MODEL}
+        if covered:
+            # Top 3 per document, as the per-document searches below return
+            for doc_id, hits in corpus.search_per_document(query, per_doc=3, doc_ids=covered).items():
+                for doc, _score in hits:
+                    results.append({
+                        "doc_name": covered[doc_id].get("name"),
+                        "content": doc.page_content[:300],
+                        "metadata": getattr(doc, "metadata", {}) or {}
+                    })
+        candidates = [e for e in candidates if e.get("doc_id") not in covered]
+    
+    query_vectors: Dict[str, List[float]] = {}
+    for entry in candidates:
         # Load and search
         faiss_db = load_vector_store(entry["db_path"], entry["embed_model"])
         if faiss_db:
-            docs = faiss_db.similarity_search(query, k=3)
+            # Embed the query once per model, not once per document
+            model = entry["embed_model"]
+            if model not in query_vectors:
+                query_vectors[model] = get_embedding_model(model).embed_query(query)
+            docs = faiss_db.similarity_search_by_vector(query_vectors[model], k=3)
             for doc in docs:
                 results.append({
                     "doc_name": entry.get("name"),
@@ -1076,21 +1191,12 @@ def save_search_query(query: str, filters: Dict):
 # FEATURE 4: Document Tagging
 def add_tag_to_document(doc_id: str, tag: str):
     """Add tag to document in manifest."""
-    entries = load_manifest()
-    for entry in entries:
-        if entry.get("doc_id") == doc_id:
-            tags = entry.get("tags", [])
-            if tag not in tags:
-                tags.append(tag)
-            entry["tags"] = tags
-            break
-    save_manifest(entries)
+    add_manifest_tag(doc_id, tag)
 
 
 def get_documents_by_tag(tag: str) -> List[Dict]:
     """Get all documents with specific tag."""
-    entries = load_manifest()
-    return [e for e in entries if tag in e.get("tags", [])]
+    return entries_with_tags([tag])
 
 
 # FEATURE 5: Export Utilities
@@ -3364,26 +3470,77 @@ with st.sidebar:
         
         # Document Library - Enhanced
         st.markdown('<h4 style="color: #00f3ff; margin-bottom: 1rem;">📚 Document Library</h4>', unsafe_allow_html=True)
-        manifest = load_manifest()
+        # Starting the worker also resumes jobs interrupted by an app restart
+        get_ingest_worker(_index_entry)
         
         # Tag Filter (Feature 5)
-        all_tags = set()
-        for e in manifest:
-            all_tags.update(e.get("tags", []))
-        
-        if all_tags:
-            selected_tag = st.selectbox("Filter by Tag", ["All"] + sorted(list(all_tags)))
-            if selected_tag != "All":
-                manifest = [e for e in manifest if selected_tag in e.get("tags", [])]
-        
-        options = {f"{e.get('name')} ({e.get('doc_id')[:8]})": e.get("doc_id") for e in manifest}
-        selected_label = st.selectbox("Select indexed document", list(options.keys()) or ["(none)"])
-        selected_doc_id = options.get(selected_label)
+        library_tags = all_tags()
+        selected_tag = "All"
+        if library_tags:
+            selected_tag = st.selectbox("Filter by Tag", ["All"] + library_tags)
+        name_filter = st.text_input("Filter by name", key="library_name_filter").strip()
+        if selected_tag != "All" or name_filter:
+            # Served by the manifest's tag and name-trigram indexes
+            manifest = query_manifest(
+                tags=[selected_tag] if selected_tag != "All" else None, name_contains=name_filter or None
+            )
+        else:
+            manifest = load_manifest()
+        
+        def _doc_label(e: Dict) -> str:
+            label = f"{e.get('name')} ({e.get('doc_id')[:8]})"
+            status = job_status(e)
+            if status in ACTIVE_STATUSES:
+                label += f" ⏳ {status} {int(100 * e.get('progress', 0.0))}%"
+            elif status == STATUS_FAILED:
+                label += " ❌ failed"
+            return label
+
+        # Options are doc_ids so the selection survives label changes as progress updates
+        labels = {e.get("doc_id"): _doc_label(e) for e in manifest}
+        selected_doc_id = st.selectbox(
+            "Select indexed document", list(labels.keys()) or [None],
+            format_func=lambda d: labels.get(d, "(none)"),
+        )
+        selected_label = labels.get(selected_doc_id)
         st.session_state["selected_doc_id"] = selected_doc_id
+        selected_entry = next((e for e in manifest if e.get("doc_id") == selected_doc_id), None)
+        if selected_entry and job_status(selected_entry) in ACTIVE_STATUSES:
+            progress_text = f"Indexing: {job_status(selected_entry)}"
+            if selected_entry.get("embedded_chunks"):
+                progress_text += f" · {selected_entry['embedded_chunks']} chunks embedded"
+            st.progress(float(selected_entry.get("progress", 0.0)), text=progress_text)
+            if st.button("🔄 Refresh status"):
+                st.rerun()
+        elif selected_entry and job_status(selected_entry) == STATUS_FAILED:
+            st.error(f"Indexing failed: {selected_entry.get('error', 'unknown error')}")
+        elif selected_entry and selected_entry.get("index_stats"):
+            idx_stats = selected_entry["index_stats"]
+            cache_stats = get_embedding_cache().stats()
+            dedup_note = ""
+            if idx_stats.get("duplicates"):
+                dedup_note = (
+                    f" · {idx_stats['duplicates']} near-duplicate chunks collapsed "
+                    f"(~{idx_stats.get('dedup_saved_bytes', 0) / 1024:.0f} KB saved)"
+                )
+            if idx_stats.get("index_type"):
+                dedup_note += f" · {idx_stats['index_type']} index, {idx_stats.get('quantization', 'none')} vectors"
+            st.caption(
+                f"Last index: {idx_stats.get('added', 0)} chunks added, {idx_stats.get('removed', 0)} removed, "
+                f"{idx_stats.get('kept', 0)} unchanged{dedup_note}"
+            )
+            store_stats = get_store_cache().stats()
+            # Both caches serve every document and session, so these are counters for the whole app process
+            st.caption(
+                f"App-wide since start: embedding cache {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['entries']} vectors stored) · loaded indexes {store_stats['entries']} shared across "
+                f"sessions ({store_stats['bytes'] / 2**20:.0f} / {store_stats['max_bytes'] / 2**20:.0f} MB), "
+                f"{store_stats['hit_rate']:.0%} hit rate"
+            )
         
         # Document Tags (Feature 5)
         if selected_doc_id:
-            entry = next((e for e in load_manifest() if e.get("doc_id") == selected_doc_id), None)
+            entry = get_manifest_entry(selected_doc_id)
             if entry:
                 current_tags = entry.get("tags", [])
                 st.write(f"**Tags:** {', '.join(current_tags) if current_tags else 'No tags'}")
@@ -3395,20 +3552,29 @@ with st.sidebar:
 
         uploaded_file_sidebar = st.file_uploader("Add PDF to library", type="pdf", accept_multiple_files=False)
         if uploaded_file_sidebar is not None:
+            vector_storage = st.selectbox(
+                "Vector storage", QUANTIZATIONS, index=QUANTIZATIONS.index(ANN_QUANTIZATION),
+                help="none = float32; fp16 halves index RAM, int8 quarters it, pq compresses most (re-ranked on exact vectors)",
+            )
             if st.button("Index PDF"):
-                entry = upload_pdf(uploaded_file_sidebar)
-                docs = load_pdf(entry["pdf_path"])
-                chunks = create_chunks(docs)
-                create_vector_store(entry["db_path"], chunks, entry["embed_model"])
-                st.success(f"Indexed: {entry['name']}")
-                manifest = load_manifest()  # refresh
+                saved = save_upload(uploaded_file_sidebar)
+                existing = find_indexed_entry(saved[0])
+                if existing:
+                    st.info(f"Already indexed as '{existing['name']}' ({saved[0][:8]}); nothing to do.")
+                else:
+                    entry = upload_pdf(uploaded_file_sidebar, quantization=vector_storage, saved=saved)
+                    submit_index_job(entry["doc_id"])
+                    st.success(f"Queued for indexing: {entry['name']}")
+                    st.rerun()
 
         if selected_doc_id:
             col_a, col_b = st.columns(2)
             with col_a:
                 if st.button("Delete selected index", type="secondary"):
                     # Remove index directory and manifest entry
-                    entry = next((e for e in load_manifest() if e.get("doc_id") == selected_doc_id), None)
+                    entry = get_manifest_entry(selected_doc_id)
+                    if entry:
+                        get_store_cache().invalidate(entry["db_path"])
                     if entry and os.path.isdir(entry["db_path"]):
                         try:
                             for root, dirs, files in os.walk(entry["db_path"], topdown=False):
@@ -3419,18 +3585,22 @@ with st.sidebar:
                             os.rmdir(entry["db_path"])
                         except Exception:
                             pass
+                    delete_text_store(selected_doc_id)
+                    if CORPUS_INDEX and entry:
+                        try:
+                            model = entry.get("embed_model", OLLAMA_EMBED_MODEL)
+                            get_corpus_index(model, get_embedding_model(model)).remove_document(selected_doc_id)
+                        except Exception:
+                            pass
                     delete_manifest_entry(selected_doc_id)
                     st.session_state["selected_doc_id"] = None
                     st.success("Index deleted.")
                     st.rerun()
             with col_b:
                 if st.button("Rebuild index"):
-                    entry = next((e for e in load_manifest() if e.get("doc_id") == selected_doc_id), None)
+                    entry = get_manifest_entry(selected_doc_id)
                     if entry:
-                        docs = load_pdf(entry["pdf_path"])
-                        chunks = create_chunks(docs)
-                        create_vector_store(entry["db_path"], chunks, entry["embed_model"])
-                        st.success("Index rebuilt.")
+                        submit_index_job(selected_doc_id)
                         st.rerun()
         
         st.divider()
@@ -3440,10 +3610,13 @@ with st.sidebar:
             st.write("**Search across all documents**")
             search_query = st.text_input("Search query:", key="adv_search")
             doc_filter = st.text_input("Document name filter:", key="doc_filter")
+            search_tags = st.multiselect(
+                "Tag filter:", all_tags(), key="adv_search_tags"
+            )
             
             if st.button("🔎 Search All Docs"):
                 if search_query:
-                    results = search_in_documents(search_query, doc_filter)
+                    results = search_in_documents(search_query, doc_filter, tags=search_tags)
                     st.write(f"**Found {len(results)} results**")
                     for r in results[:5]:
                         st.write(f"📄 {r['doc_name']}")
@@ -3468,12 +3641,12 @@ with st.sidebar:
         # NEW FEATURE 6: Contract Risk Assessment - Enhanced
         st.markdown('<h4 style="color: #ff006e; margin-top: 2rem; margin-bottom: 1rem;">🛡️ Risk Assessment Engine</h4>', unsafe_allow_html=True)
         if selected_doc_id and st.button("🔍 Analyze Contract Risks", use_container_width=True, type="primary"):
-            entry = next((e for e in load_manifest() if e.get("doc_id") == selected_doc_id), None)
+            entry = get_manifest_entry(selected_doc_id)
             if entry:
                 with st.spinner("Analyzing contract for risks..."):
-                    # Load document text
-                    docs = load_pdf(entry["pdf_path"])
-                    full_text = "\n\n".join([doc.page_content for doc in docs[:10]])  # First 10 pages
+                    # Load document text (stored at indexing time, no PDF reparse)
+                    docs = read_pages(entry["doc_id"], entry["pdf_path"], max_pages=10)
+                    full_text = "\n\n".join([doc.page_content for doc in docs])  # First 10 pages
                     
                     # Perform risk analysis
                     risk_data = analyze_contract_risks(full_text, doc_type="contract")
@@ -3510,12 +3683,12 @@ with st.sidebar:
         # NEW FEATURE 7: Citation Validator - Enhanced
         st.markdown('<h4 style="color: #39ff14; margin-top: 2rem; margin-bottom: 1rem;">📚 Citation Validator</h4>', unsafe_allow_html=True)
         if selected_doc_id and st.button("🔎 Extract & Validate Citations", use_container_width=True, type="primary"):
-            entry = next((e for e in load_manifest() if e.get("doc_id") == selected_doc_id), None)
+            entry = get_manifest_entry(selected_doc_id)
             if entry:
                 with st.spinner("Extracting and validating citations..."):
-                    # Load document text
-                    docs = load_pdf(entry["pdf_path"])
-                    full_text = "\n\n".join([doc.page_content for doc in docs[:10]])
+                    # Load document text (stored at indexing time, no PDF reparse)
+                    docs = read_pages(entry["doc_id"], entry["pdf_path"], max_pages=10)
+                    full_text = "\n\n".join([doc.page_content for doc in docs])
                     
                     # Extract citations
                     citations = extract_citations(full_text)
@@ -6865,7 +7038,7 @@ with feature_tabs[4]:
                 selected_id = st.session_state.get("selected_doc_id")
                 context_docs = None
                 if selected_id:
-                    entry = next((e for e in load_manifest() if e.get("doc_id") == selected_id), None)
+                    entry = get_manifest_entry(selected_id)
                     if entry:
                         faiss_db = load_vector_store(entry["db_path"], entry["embed_model"])
                         if faiss_db:
@@ -9263,24 +9436,45 @@ if ask_question:
         # Priority 1: Use selected indexed document from sidebar
         selected_id = st.session_state.get("selected_doc_id")
         if selected_id:
-            entry = next((e for e in load_manifest() if e.get("doc_id") == selected_id), None)
-            if entry:
+            entry = get_manifest_entry(selected_id)
+            if entry and job_status(entry) in ACTIVE_STATUSES:
+                st.info(f"⏳ '{entry.get('name')}' is still being indexed ({job_status(entry)}). Try again shortly.")
+            elif entry:
                 faiss_db = load_vector_store(entry["db_path"], entry["embed_model"])
                 if faiss_db is None:
                     # Attempt rebuild if index missing
-                    source_docs = load_pdf(entry["pdf_path"])
-                    chunks = create_chunks(source_docs)
-                    faiss_db = create_vector_store(entry["db_path"], chunks, entry["embed_model"])
+                    pages_progress, embed_progress = indexing_progress()
+                    faiss_db, index_stats = rebuild_vector_store(
+                        entry["db_path"], iter_document_pages(entry["doc_id"], entry["pdf_path"]), entry["embed_model"],
+                        pages_progress, quantization=entry.get("quantization"), embed_progress_callback=embed_progress,
+                    )
+                    set_job_status(entry["doc_id"], STATUS_READY, progress=1.0, index_stats=index_stats,
+                                   index_version=index_stats.get("version"))
+                    sync_corpus_entry(entry, faiss_db)
         # Priority 2: Session-only uploaded file (no persistence)
         elif uploaded_file:
             key = f"faiss::{uploaded_file.name}::{OLLAMA_EMBED_MODEL}"
             if key in st.session_state:
                 faiss_db = st.session_state[key]
             else:
-                temp_entry = upload_pdf(uploaded_file)  # also adds to manifest
-                documents = load_pdf(temp_entry["pdf_path"])  # use persisted path to avoid temp issues
-                text_chunks = create_chunks(documents)
-                faiss_db = create_vector_store(temp_entry["db_path"], text_chunks, OLLAMA_EMBED_MODEL)
+                saved = save_upload(uploaded_file)
+                existing = find_indexed_entry(saved[0])
+                if existing:
+                    # Known document with a matching index: reuse it instead of re-indexing
+                    faiss_db = load_vector_store(existing["db_path"], existing["embed_model"])
+                if faiss_db is None:
+                    temp_entry = upload_pdf(uploaded_file, saved=saved)  # also adds to manifest
+                    # Stream pages from the persisted path to avoid temp issues and bound memory
+                    pages_progress, embed_progress = indexing_progress()
+                    faiss_db, index_stats = rebuild_vector_store(
+                        temp_entry["db_path"], iter_document_pages(temp_entry["doc_id"], temp_entry["pdf_path"]),
+                        OLLAMA_EMBED_MODEL,
+                        pages_progress, quantization=temp_entry.get("quantization"),
+                        embed_progress_callback=embed_progress,
+                    )
+                    set_job_status(temp_entry["doc_id"], STATUS_READY, progress=1.0, index_stats=index_stats,
+                                   index_version=index_stats.get("version"))
+                    sync_corpus_entry(temp_entry, faiss_db)
                 st.session_state[key] = faiss_db
         else:
             st.error("Select a document from the sidebar or upload a PDF.")
@@ -9375,11 +9569,15 @@ if ask_question:
 
             with st.expander(f"Sources (top {top_k})"):
                 for i, tup in enumerate(ranked, start=1):
-                    d, score, bm_s, llm_s, w = tup
+                    d, score, rrf_s, llm_s, w = tup
                     md = getattr(d, "metadata", {}) or {}
                     page = md.get("page", md.get("source", "unknown"))
+                    section = f" | {md['section']}" if md.get("section") else ""
+                    also_on = sorted({loc.get("page") for loc in md.get("locations", [])[1:] if loc.get("page") != md.get("page")}, key=str)
+                    if also_on:
+                        section += f" | also on page(s) {', '.join(str(p) for p in also_on)}"
                     preview = (d.page_content[:750] + ("…" if len(d.page_content) > 750 else ""))
-                    st.markdown(f"**{i}.** Page: {page} | Score: {score:.2f} (bm={bm_s:.2f}, llm={llm_s:.2f}, w={w:.2f})\n\n{preview}")
+                    st.markdown(f"**{i}.** Page: {page}{section} | Score: {score:.2f} (rrf={rrf_s:.2f}, llm={llm_s:.2f}, w={w:.2f})\n\n{preview}")
 
                     # Feedback controls
                     cid = hashlib.sha256(d.page_content.encode("utf-8", errors="ignore")).hexdigest()
@@ -0,0 +1,361 @@
+"""Document library manifest (vectorstore/db_faiss/manifest.sqlite3).
+
+Shared by the Streamlit app, the background ingestion worker and the CLI.
+Each entry is stored as a JSON document, with doc_id, name, created_at and
+tags in indexed columns so lookups and tag filters do not scan the library.
+Names are also kept case-folded with an inverted index of their trigrams,
+which answers prefix and substring filters without reading every name.
+SQLite in WAL mode lets readers run alongside one writer, and every
+read-modify-write runs in a ``BEGIN IMMEDIATE`` transaction, so concurrent
+writers from other processes cannot lose each other's updates.
+
+load_manifest() is served from a per-process cache, which is dropped when
+this process writes or when SQLite's data_version shows that another
+process has committed. An existing manifest.json is imported once on first
+use; the meta table records the import, and the file is left in place.
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+FAISS_DB_ROOT = "vectorstore/db_faiss"
+# The single index frontend.py rebuilds for its current upload; not a library entry
+FRONTEND_DB_PATH = os.path.join(FAISS_DB_ROOT, "_frontend")
+MANIFEST_PATH = os.path.join(FAISS_DB_ROOT, "manifest.json")
+MANIFEST_DB_PATH = os.environ.get("MANIFEST_DB_PATH", os.path.join(FAISS_DB_ROOT, "manifest.sqlite3"))
+PDFS_DIR = "pdfs/"
+
+_manifest_lock = threading.RLock()
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS documents ("
+    " doc_id TEXT PRIMARY KEY,"
+    " seq INTEGER NOT NULL,"
+    " name TEXT,"
+    " created_at TEXT,"
+    " data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS document_tags ("
+    " doc_id TEXT NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,"
+    " tag TEXT NOT NULL,"
+    " PRIMARY KEY (doc_id, tag))",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_seq ON documents(seq)",
+    "CREATE INDEX IF NOT EXISTS idx_documents_name ON documents(name)",
+    # Filter indexes include doc_id, so a filter reads only the index, never the JSON rows.
+    "DROP INDEX IF EXISTS idx_documents_created_at",
+    "DROP INDEX IF EXISTS idx_document_tags_tag",
+    "CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at, doc_id)",
+    "CREATE INDEX IF NOT EXISTS idx_document_tags_tag_doc ON document_tags(tag, doc_id)",
+    "CREATE TABLE IF NOT EXISTS document_names ("
+    " doc_id TEXT PRIMARY KEY REFERENCES documents(doc_id) ON DELETE CASCADE,"
+    " folded TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_document_names_folded ON document_names(folded, doc_id)",
+    "CREATE TABLE IF NOT EXISTS name_grams ("
+    " gram TEXT NOT NULL,"
+    " doc_id TEXT NOT NULL REFERENCES documents(doc_id) ON DELETE CASCADE,"
+    " PRIMARY KEY (gram, doc_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_name_grams_doc ON name_grams(doc_id)",
+)
+GRAM = 3
+
+
+def ensure_dirs():
+    os.makedirs(PDFS_DIR, exist_ok=True)
+    os.makedirs(FAISS_DB_ROOT, exist_ok=True)
+
+
+class ManifestStore:
+    """One SQLite connection per process, guarded by _manifest_lock."""
+
+    def __init__(self, path: str = MANIFEST_DB_PATH, json_path: Optional[str] = MANIFEST_PATH):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._cache: Optional[Dict[str, Dict]] = None
+        self._cache_version: Optional[int] = None
+        self._order: Dict[str, int] = {}
+        self._folded: Dict[str, str] = {}
+        if json_path:
+            self._import_json(json_path)
+        self._index_names()
+
+    @contextmanager
+    def _write(self):
+        """Immediate transaction: takes the database write lock up front, so read-modify-write is atomic."""
+        with _manifest_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._cache = None
+
+    def _import_json(self, json_path: str):
+        if not os.path.exists(json_path):
+            return
+        with self._write() as conn:
+            if conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone():
+                return
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except Exception:
+                entries = []
+            self._insert(conn, [e for e in entries if isinstance(e, dict) and e.get("doc_id")])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)", (json_path,))
+
+    def _index_names(self):
+        """Fill the name index for databases created before it existed."""
+        with self._write() as conn:
+            if conn.execute("SELECT value FROM meta WHERE key = 'name_index'").fetchone():
+                return
+            for doc_id, name in conn.execute("SELECT doc_id, name FROM documents").fetchall():
+                _set_name(conn, doc_id, name)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('name_index', ?)", (str(GRAM),))
+
+    @staticmethod
+    def _insert(conn, entries: Iterable[Dict]):
+        """Upsert entries at the end of the library order (as the JSON manifest appended them)."""
+        (seq,) = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM documents").fetchone()
+        for entry in entries:
+            seq += 1
+            doc_id = entry["doc_id"]
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, seq, name, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, seq, entry.get("name"), entry.get("created_at"), json.dumps(entry, ensure_ascii=False)),
+            )
+            _set_tags(conn, doc_id, entry.get("tags") or [])
+            _set_name(conn, doc_id, entry.get("name"))
+
+    def _data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _cached(self) -> Dict[str, Dict]:
+        """doc_id -> entry in library order; call with _manifest_lock held."""
+        version = self._data_version()
+        if self._cache is None or version != self._cache_version:
+            rows = self._conn.execute("SELECT doc_id, data FROM documents ORDER BY seq").fetchall()
+            self._cache = {doc_id: json.loads(data) for doc_id, data in rows}
+            self._order = {doc_id: i for i, doc_id in enumerate(self._cache)}
+            self._folded = {doc_id: _fold(e.get("name")) for doc_id, e in self._cache.items()}
+            self._cache_version = version
+        return self._cache
+
+    def entries(self) -> List[Dict]:
+        with _manifest_lock:
+            # Callers may edit what they get; the nested lists and dicts they edit are copied too.
+            return [_copy_entry(e) for e in self._cached().values()]
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        with _manifest_lock:
+            row = self._conn.execute("SELECT data FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def replace_all(self, entries: List[Dict]):
+        with self._write() as conn:
+            conn.execute("DELETE FROM documents")
+            self._insert(conn, [e for e in entries if e.get("doc_id")])
+
+    def upsert(self, entries: List[Dict]):
+        with self._write() as conn:
+            self._insert(conn, entries)
+
+    def update(self, doc_id: str, fields: Dict) -> Optional[Dict]:
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            entry = json.loads(row[0])
+            entry.update(fields)
+            conn.execute(
+                "UPDATE documents SET name = ?, created_at = ?, data = ? WHERE doc_id = ?",
+                (entry.get("name"), entry.get("created_at"), json.dumps(entry, ensure_ascii=False), doc_id),
+            )
+            if "tags" in fields:
+                _set_tags(conn, doc_id, entry.get("tags") or [])
+            if "name" in fields:
+                _set_name(conn, doc_id, entry.get("name"))
+            return entry
+
+    def delete(self, doc_id: str):
+        with self._write() as conn:
+            conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+    def add_tag(self, doc_id: str, tag: str) -> Optional[Dict]:
+        with self._write() as conn:
+            row = conn.execute("SELECT data FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None:
+                return None
+            entry = json.loads(row[0])
+            tags = entry.get("tags", [])
+            if tag not in tags:
+                tags.append(tag)
+            entry["tags"] = tags
+            conn.execute("UPDATE documents SET data = ? WHERE doc_id = ?",
+                         (json.dumps(entry, ensure_ascii=False), doc_id))
+            conn.execute("INSERT OR IGNORE INTO document_tags (doc_id, tag) VALUES (?, ?)", (doc_id, tag))
+            return entry
+
+    def match_ids(self, tags: Optional[Iterable[str]] = None, created_from: Optional[str] = None,
+                  created_to: Optional[str] = None, name_contains: Optional[str] = None,
+                  name_prefix: Optional[str] = None) -> Optional[List[str]]:
+        """doc_ids, in library order, with any of tags, created in [created_from, created_to], whose
+        name contains name_contains and starts with name_prefix (both case-insensitive).
+        None when no filter is given."""
+        with _manifest_lock:
+            filters, needle = [], None
+            if tags is not None:
+                tags = list(dict.fromkeys(tags))
+                if not tags:
+                    return []
+                filters.append((f"SELECT doc_id FROM document_tags WHERE tag IN ({','.join('?' * len(tags))})", tags))
+            if created_from or created_to:
+                filters.append(("SELECT doc_id FROM documents WHERE created_at >= ? AND created_at <= ?",
+                                [created_from or "", created_to or "\U0010ffff"]))
+            if name_contains:
+                needle = _fold(name_contains)
+                grams = _grams(needle)
+                if grams:
+                    # Candidates are the postings of the needle's rarest trigram, checked against the name below.
+                    filters.append(("SELECT doc_id FROM name_grams WHERE gram = ?", [self._rarest_gram(grams)]))
+                else:
+                    filters.append(("SELECT doc_id FROM document_names WHERE instr(folded, ?) > 0", [needle]))
+            if name_prefix:
+                prefix = _fold(name_prefix)
+                filters.append(("SELECT doc_id FROM document_names WHERE folded >= ? AND folded < ?",
+                                [prefix, prefix + "\U0010ffff"]))
+            if not filters:
+                return None
+            ids = None
+            for sql, params in filters:
+                found = {doc_id for (doc_id,) in self._conn.execute(sql, params)}
+                ids = found if ids is None else ids & found
+                if not ids:
+                    return []
+            # Names and library order come from the cache rather than a join against the JSON rows.
+            self._cached()
+            if needle:
+                ids = {doc_id for doc_id in ids if needle in self._folded.get(doc_id, "")}
+            return sorted(ids & self._order.keys(), key=self._order.__getitem__)
+
+    def query(self, **filters) -> List[Dict]:
+        """Entries matching filters (see match_ids)."""
+        with _manifest_lock:
+            ids = self.match_ids(**filters)
+            if ids is None:
+                return self.entries()
+            cached = self._cached()
+            return [_copy_entry(cached[doc_id]) for doc_id in ids]
+
+    def _rarest_gram(self, grams: List[str], cap: int = 1024) -> str:
+        counts = {
+            gram: self._conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM name_grams WHERE gram = ? LIMIT ?)", (gram, cap)
+            ).fetchone()[0]
+            for gram in grams
+        }
+        return min(grams, key=counts.__getitem__)
+
+    def tags(self) -> List[str]:
+        with _manifest_lock:
+            return [t for (t,) in self._conn.execute("SELECT DISTINCT tag FROM document_tags ORDER BY tag")]
+
+
+def _copy_entry(entry: Dict) -> Dict:
+    return {k: (list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v) for k, v in entry.items()}
+
+
+def _fold(name: str) -> str:
+    return " ".join((name or "").casefold().split())
+
+
+def _grams(folded: str) -> List[str]:
+    return list(dict.fromkeys(folded[i:i + GRAM] for i in range(len(folded) - GRAM + 1)))
+
+
+def _set_name(conn, doc_id: str, name: Optional[str]):
+    folded = _fold(name)
+    conn.execute("INSERT OR REPLACE INTO document_names (doc_id, folded) VALUES (?, ?)", (doc_id, folded))
+    conn.execute("DELETE FROM name_grams WHERE doc_id = ?", (doc_id,))
+    conn.executemany("INSERT OR IGNORE INTO name_grams (gram, doc_id) VALUES (?, ?)",
+                     [(g, doc_id) for g in _grams(folded)])
+
+
+def _set_tags(conn, doc_id: str, tags: List[str]):
+    conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+    conn.executemany("INSERT OR IGNORE INTO document_tags (doc_id, tag) VALUES (?, ?)",
+                     [(doc_id, t) for t in tags])
+
+
+_store: Optional[ManifestStore] = None
+
+
+def get_manifest_store() -> ManifestStore:
+    global _store
+    with _manifest_lock:
+        if _store is None:
+            ensure_dirs()
+            _store = ManifestStore()
+        return _store
+
+
+def load_manifest() -> List[Dict]:
+    return get_manifest_store().entries()
+
+
+def save_manifest(entries: List[Dict]):
+    """Replace the whole library with entries (prefer the per-entry functions below)."""
+    get_manifest_store().replace_all(entries)
+
+
+def get_manifest_entry(doc_id: str) -> Optional[Dict]:
+    return get_manifest_store().get(doc_id)
+
+
+def upsert_manifest_entry(entry: Dict):
+    get_manifest_store().upsert([entry])
+
+
+def upsert_manifest_entries(new_entries: List[Dict]):
+    """Bulk upsert in one transaction."""
+    if not new_entries:
+        return
+    get_manifest_store().upsert(new_entries)
+
+
+def update_manifest_entry(doc_id: str, **fields) -> Optional[Dict]:
+    """Merge fields into an existing entry; returns the updated entry or None."""
+    return get_manifest_store().update(doc_id, fields)
+
+
+def delete_manifest_entry(doc_id: str):
+    get_manifest_store().delete(doc_id)
+
+
+def add_manifest_tag(doc_id: str, tag: str) -> Optional[Dict]:
+    return get_manifest_store().add_tag(doc_id, tag)
+
+
+def entries_with_tags(tags: Iterable[str]) -> List[Dict]:
+    return get_manifest_store().query(tags=tags)
+
+
+def query_manifest(**filters) -> List[Dict]:
+    """Filtered entries (tags, created_from, created_to, name_contains, name_prefix) using the manifest's indexes."""
+    return get_manifest_store().query(**filters)
+
+
+def all_tags() -> List[str]:
+    return get_manifest_store().tags()
@@ -0,0 +1,135 @@
+"""PDF text extraction that yields one page at a time.
+
+Pages are produced as LangChain Documents with the same metadata keys that
+PDFPlumberLoader sets (source, file_path, page, total_pages), so the Sources
+expander and page links keep working.
+
+Two text backends are available: ``pdfium`` (pypdfium2, native and fast) and
+``pdfplumber`` (pure Python, better at layout). With ``pdfium`` any page whose
+text looks unusable is re-extracted with pdfplumber. Large files are split into
+page ranges that a process pool extracts in parallel.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple
+
+import pdfplumber  # type: ignore
+import pypdfium2 as pdfium  # type: ignore
+from langchain_core.documents import Document
+
+PDF_TEXT_BACKEND = os.environ.get("PDF_TEXT_BACKEND", "pdfium")
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(min(8, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "16"))
+# Pages with fewer visible characters than this (or mostly undecodable glyphs)
+# are treated as layout-sensitive and handed to pdfplumber.
+PDF_FALLBACK_MIN_CHARS = int(os.environ.get("PDF_FALLBACK_MIN_CHARS", "16"))
+
+
+def _normalize_pdfium_text(text: str) -> str:
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def _needs_layout_fallback(text: str) -> bool:
+    visible = [c for c in text if not c.isspace()]
+    if len(visible) < PDF_FALLBACK_MIN_CHARS:
+        return True
+    garbled = sum(1 for c in visible if c == "�" or (ord(c) < 32))
+    return garbled / len(visible) > 0.05
+
+
+def _plumber_page_text(plumber_pdf, number: int) -> str:
+    page = plumber_pdf.pages[number]
+    try:
+        return page.extract_text() or ""
+    finally:
+        page.close()
+
+
+def _extract_range(file_path: str, start: int, stop: int, backend: str) -> List[Tuple[int, str]]:
+    """Extract pages [start, stop) in this process; runs inside pool workers."""
+    results: List[Tuple[int, str]] = []
+    if backend == "pdfplumber":
+        with pdfplumber.open(file_path) as plumber_pdf:
+            for number in range(start, stop):
+                results.append((number, _plumber_page_text(plumber_pdf, number)))
+        return results
+
+    plumber_pdf = None
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        for number in range(start, stop):
+            page = pdf[number]
+            textpage = page.get_textpage()
+            try:
+                text = _normalize_pdfium_text(textpage.get_text_bounded())
+            finally:
+                textpage.close()
+                page.close()
+            if _needs_layout_fallback(text):
+                if plumber_pdf is None:
+                    plumber_pdf = pdfplumber.open(file_path)
+                fallback = _plumber_page_text(plumber_pdf, number)
+                if len(fallback.strip()) > len(text.strip()):
+                    text = fallback
+            results.append((number, text))
+    finally:
+        pdf.close()
+        if plumber_pdf is not None:
+            plumber_pdf.close()
+    return results
+
+
+def _pdf_info(file_path: str) -> Tuple[int, Dict]:
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        metadata = {k: v for k, v in pdf.get_metadata_dict(skip_empty=True).items() if type(v) in (str, int)}
+        return len(pdf), metadata
+    finally:
+        pdf.close()
+
+
+def _page_document(file_path: str, number: int, text: str, total_pages: int, doc_metadata: Dict) -> Document:
+    return Document(
+        # Trailing newline matches PDFPlumberLoader so chunk hashes and cache keys line up.
+        page_content=text + "\n",
+        metadata={
+            "source": file_path,
+            "file_path": file_path,
+            "page": number,
+            "total_pages": total_pages,
+            **doc_metadata,
+        },
+    )
+
+
+def iter_pdf_pages(file_path: str, backend: str = PDF_TEXT_BACKEND,
+                   workers: int = PDF_EXTRACT_WORKERS) -> Iterator[Document]:
+    """Yield pages in order; page ranges are extracted in parallel for large files."""
+    total_pages, doc_metadata = _pdf_info(file_path)
+    ranges = [(s, min(s + PDF_PAGES_PER_TASK, total_pages)) for s in range(0, total_pages, PDF_PAGES_PER_TASK)]
+    if workers <= 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            for number, text in _extract_range(file_path, start, stop, backend):
+                yield _page_document(file_path, number, text, total_pages, doc_metadata)
+        return
+
+    # Keep a bounded number of ranges in flight and yield strictly in page order.
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        ready: Dict[int, List[Tuple[int, str]]] = {}
+        next_submit = 0
+        next_yield = 0
+        while next_yield < len(ranges):
+            while next_submit < len(ranges) and len(pending) + len(ready) < workers * 2:
+                start, stop = ranges[next_submit]
+                pending[pool.submit(_extract_range, file_path, start, stop, backend)] = next_submit
+                next_submit += 1
+            if next_yield not in ready:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ready[pending.pop(future)] = future.result()
+                continue
+            for number, text in ready.pop(next_yield):
+                yield _page_document(file_path, number, text, total_pages, doc_metadata)
+            next_yield += 1
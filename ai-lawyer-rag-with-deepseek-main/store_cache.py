@@ -0,0 +1,132 @@
+"""Process-wide cache of loaded FAISS stores, shared by every Streamlit session.
+
+Entries are keyed by (db_path, active index file, embed model). Every build
+publishes a new version directory (see index_versions), so a rebuild done in
+another process changes the key and the stale entry is never returned; it is
+evicted like any other, which also releases its lease on the old version.
+Rebuilds and deletes in this process also call invalidate() to drop it at
+once.
+
+Eviction is least-recently-used under a budget of STORE_CACHE_MB, counted
+as the index file sizes. Mapped indexes are mostly page cache rather than
+heap, but they still compete for RAM.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from index_versions import active_path
+
+STORE_CACHE_MB = int(os.environ.get("STORE_CACHE_MB", "2048"))
+STORE_CACHE_MAX_ENTRIES = int(os.environ.get("STORE_CACHE_MAX_ENTRIES", "64"))
+
+CacheKey = Tuple[str, Tuple[int, int], str]
+
+
+def _norm(db_path: str) -> str:
+    return os.path.normcase(os.path.abspath(db_path))
+
+
+def _index_version(db_path: str) -> Optional[Tuple[int, int]]:
+    # A new version is a new file, so the inode changes even when mtimes tie.
+    try:
+        st = os.stat(os.path.join(active_path(db_path), "index.faiss"))
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_ino
+
+
+def _footprint(db_path: str) -> int:
+    try:
+        return os.path.getsize(os.path.join(active_path(db_path), "index.faiss"))
+    except OSError:
+        return 0
+
+
+class VectorStoreCache:
+    """LRU of loaded stores bounded by total index size and entry count."""
+
+    def __init__(self, max_bytes: int = STORE_CACHE_MB * 2**20, max_entries: int = STORE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[CacheKey, Tuple[object, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, db_path: str, embed_model: str, loader: Callable[[], object]):
+        """The cached store for db_path, or loader()'s result (cached unless it is None)."""
+        version = _index_version(db_path)
+        if version is None:
+            return loader()
+        key = (_norm(db_path), version, embed_model)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+        # Loading is not serialized: two sessions racing on a cold key both load, one copy is kept.
+        store = loader()
+        if store is None:
+            return None
+        size = _footprint(db_path)
+        if size > self.max_bytes:
+            return store
+        with self._lock:
+            if key not in self._entries:
+                self._drop_path(key[0])
+                self._entries[key] = (store, size)
+                self._bytes += size
+                self._evict()
+            return self._entries[key][0]
+
+    def _drop_path(self, path: str) -> int:
+        stale = [k for k in self._entries if k[0] == path]
+        for k in stale:
+            self._bytes -= self._entries.pop(k)[1]
+        return len(stale)
+
+    def _evict(self):
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def invalidate(self, db_path: str) -> int:
+        with self._lock:
+            return self._drop_path(_norm(db_path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_default_cache: Optional[VectorStoreCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_store_cache() -> VectorStoreCache:
+    """Return the process-wide store cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VectorStoreCache()
+        return _default_cache
@@ -0,0 +1,29 @@
+"""Shared fixtures.
+
+The app's modules sit next to this directory and keep their data under
+relative paths (vectorstore/, pdfs/), so every test that touches disk runs in
+its own temporary working directory with a fresh manifest store.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    import manifest
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(manifest, "_store", None)
+    return tmp_path
+
+
+@pytest.fixture
+def embeddings():
+    """Offline, deterministic embeddings (no Ollama)."""
+    from benchmarks import HashedBowEmbeddings
+
+    return HashedBowEmbeddings(64)
@@ -0,0 +1,42 @@
+import pytest
+from langchain_core.documents import Document
+
+from bm25_index import open_bm25_index, reciprocal_rank_fusion, write_bm25_index
+
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], key=str, k=60))
+    assert fused["a"] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused["b"] == pytest.approx(1 / 62)
+    assert fused["c"] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_rewards_agreement_and_keeps_one_sided_hits():
+    ranked = [item for item, _ in reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], key=str, k=60)]
+    assert ranked == ["a", "c", "b", "d"]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    ranked = [item for item, _ in reciprocal_rank_fusion([["x", "y"], ["y", "x"]], key=str)]
+    assert ranked == ["x", "y"]
+
+
+def test_rrf_merges_documents_by_text():
+    vector = [Document(page_content="liberty", metadata={"from": "vector"}), Document(page_content="costs")]
+    lexical = [Document(page_content="liberty", metadata={"from": "bm25"})]
+    fused = reciprocal_rank_fusion([vector, lexical])
+    assert [d.page_content for d, _ in fused] == ["liberty", "costs"]
+    assert fused[0][0].metadata["from"] == "vector"
+
+
+def test_bm25_ranks_term_matches_and_ignores_missing_or_stale_files(tmp_path):
+    db_path = str(tmp_path)
+    assert open_bm25_index(db_path) is None
+    write_bm25_index(db_path, [(0, "rent is due monthly"), (1, "the appeal is dismissed"), (2, "appeal appeal costs")])
+    index = open_bm25_index(db_path, expected_count=3)
+    try:
+        assert [pos for pos, _ in index.search("appeal")] == [2, 1]
+        assert index.search("nothing") == []
+    finally:
+        index.close()
+    assert open_bm25_index(db_path, expected_count=4) is None
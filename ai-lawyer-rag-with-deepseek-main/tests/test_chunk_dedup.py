@@ -0,0 +1,42 @@
+from chunk_dedup import SimHashIndex, hamming, simhash
+
+BASE = 0x0123456789ABCDEF
+
+
+def _flip(signature, *bits):
+    for bit in bits:
+        signature ^= 1 << bit
+    return signature
+
+
+def test_simhash_ignores_case_and_whitespace():
+    text = "The lessee shall pay the rent on the first day of each month."
+    assert simhash(text) == simhash("  THE LESSEE shall pay\nthe rent on the first day of each month ")
+    assert hamming(simhash(text), simhash("The court dismissed the appeal with costs.")) > 3
+
+
+def test_found_within_max_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add("a", BASE, 1000)
+    assert index.find(BASE, 1000) == "a"
+    assert index.find(_flip(BASE, 0, 21, 42), 1000) == "a"
+
+
+def test_not_found_beyond_max_distance():
+    index = SimHashIndex(max_distance=3)
+    index.add("a", BASE, 1000)
+    assert index.find(_flip(BASE, 0, 1, 2, 3), 1000) is None
+
+
+def test_length_ratio_rejects_candidates():
+    index = SimHashIndex(max_distance=3)
+    index.add("a", BASE, 1000)
+    assert index.find(BASE, 905) == "a"
+    assert index.find(BASE, 850) is None
+
+
+def test_closest_representative_wins():
+    index = SimHashIndex(max_distance=3)
+    index.add("far", _flip(BASE, 5, 30), 1000)
+    index.add("near", _flip(BASE, 5), 1000)
+    assert index.find(BASE, 1000) == "near"
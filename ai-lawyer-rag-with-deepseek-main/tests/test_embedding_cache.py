@@ -0,0 +1,103 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings, EmbeddingCache, QueryVectorCache, get_query_cache, text_hash
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents = []
+        self.queries = []
+
+    def embed_documents(self, texts):
+        self.documents.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return [float(len(text)), 0.0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Strictly increasing last_used stamps, so LRU order does not depend on timer resolution."""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many("m", {"a": [1.0]})
+    cache.put_many("m", {"b": [2.0]})
+    assert cache.get_many("m", ["a"]) == {"a": [1.0]}
+    cache.put_many("m", {"c": [3.0]})
+    assert cache.get_many("m", ["a", "b", "c"]) == {"a": [1.0], "c": [3.0]}
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_models_do_not_share_vectors(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_many("a", {"h": [1.0]})
+    assert cache.get_many("b", ["h"]) == {}
+    cache.clear("a")
+    assert cache.get_many("a", ["h"]) == {}
+
+
+def test_only_misses_reach_the_model_and_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    inner = RecordingEmbeddings()
+    embeddings = CachedEmbeddings(inner, "m", EmbeddingCache(path))
+    first = embeddings.embed_documents(["rent", "deposit", "rent"])
+    assert inner.documents == [["rent", "deposit"]]
+    assert embeddings.embed_documents(["deposit", "notice"]) == [first[1], [6.0, 1.0]]
+    assert inner.documents[1:] == [["notice"]]
+    restarted = CachedEmbeddings(RecordingEmbeddings(), "m", EmbeddingCache(path))
+    assert restarted.embed_documents(["rent"]) == [first[0]]
+    assert restarted.embeddings.documents == []
+    assert EmbeddingCache(path).get_many("m", [text_hash("notice")]) == {text_hash("notice"): [6.0, 1.0]}
+
+
+@pytest.fixture
+def query_cache(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_query_cache", QueryVectorCache(max_entries=8))
+    return get_query_cache()
+
+
+def test_query_vector_cache_hit_ignores_whitespace(tmp_path, query_cache):
+    inner = RecordingEmbeddings()
+    embeddings = CachedEmbeddings(inner, "m", EmbeddingCache(str(tmp_path / "cache.sqlite3")))
+    vector = embeddings.embed_query("notice  period\n")
+    vector.append(99.0)
+    assert embeddings.embed_query(" notice period") == [13.0, 0.0]
+    assert inner.queries == ["notice period"]
+    assert (query_cache.stats()["hits"], query_cache.stats()["misses"]) == (1, 1)
+    # Case changes the embedding, so it is another key
+    embeddings.embed_query("Notice period")
+    assert inner.queries == ["notice period", "Notice period"]
+
+
+def test_query_vectors_persist_apart_from_chunk_vectors(tmp_path, query_cache, monkeypatch):
+    path = str(tmp_path / "cache.sqlite3")
+    CachedEmbeddings(RecordingEmbeddings(), "m", EmbeddingCache(path)).embed_query("notice period")
+    monkeypatch.setattr(embedding_cache, "_query_cache", QueryVectorCache())
+    inner = RecordingEmbeddings()
+    embeddings = CachedEmbeddings(inner, "m", EmbeddingCache(path))
+    assert embeddings.embed_query("notice period") == [13.0, 0.0]
+    assert inner.queries == []
+    assert embeddings.embed_documents(["notice period"]) == [[13.0, 1.0]]
+
+
+def test_query_vector_cache_is_bounded():
+    cache = QueryVectorCache(max_entries=2)
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    assert cache.get("m", "a") == [1.0]
+    cache.put("m", "c", [3.0])
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") == [1.0]
+    assert cache.get("other", "a") is None
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from bm25_index import BM25_FILE
+from faiss_store import LegacyStoreError, has_legacy_docstore, load_store, migrate_legacy_store
+from index_versions import active_path, active_version
+
+DOCS = [
+    Document(page_content="Article one protects liberty.", metadata={"page": 0, "section": "Article 1"}),
+    Document(page_content="Article two protects equality.", metadata={"page": 1, "section": "Article 2"}),
+    Document(page_content="Schedule A lists the repealed statutes.", metadata={"page": 2, "section": "Schedule A"}),
+]
+
+
+def _legacy(root, embeddings):
+    FAISS.from_documents(DOCS, embeddings).save_local(str(root))
+    return str(root)
+
+
+def _rows(faiss_db):
+    return [(faiss_db.docstore.search(faiss_db.index_to_docstore_id[i]).page_content,
+             faiss_db.docstore.search(faiss_db.index_to_docstore_id[i]).metadata) for i in range(faiss_db.index.ntotal)]
+
+
+def test_load_store_refuses_a_pickled_docstore(tmp_path, embeddings):
+    root = _legacy(tmp_path, embeddings)
+    with pytest.raises(LegacyStoreError, match="check --repair"):
+        load_store(root, embeddings)
+    assert has_legacy_docstore(root)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_migrate_round_trips_chunks_into_a_new_version(tmp_path, embeddings, mmap):
+    root = _legacy(tmp_path, embeddings)
+    assert migrate_legacy_store(root)
+    version = active_path(root)
+    assert version != root
+    assert not os.path.exists(os.path.join(version, "index.pkl"))
+    assert os.path.exists(os.path.join(version, BM25_FILE))
+    faiss_db = load_store(root, embeddings, mmap=mmap)
+    assert _rows(faiss_db) == [(d.page_content, d.metadata) for d in DOCS]
+    assert faiss_db.similarity_search("equality", k=1)[0].metadata["section"] == "Article 2"
+
+
+def test_migrate_without_lexical_and_only_once(tmp_path, embeddings):
+    root = _legacy(tmp_path, embeddings)
+    assert migrate_legacy_store(root, lexical=False)
+    version = active_version(root)
+    assert not os.path.exists(os.path.join(root, version, BM25_FILE))
+    assert not migrate_legacy_store(root)
+    assert active_version(root) == version
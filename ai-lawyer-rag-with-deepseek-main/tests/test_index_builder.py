@@ -0,0 +1,101 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks import HashedBowEmbeddings
+from index_builder import load_index_state, sync_vector_store
+from index_versions import active_version
+
+DB_PATH = "vectorstore/db_faiss/doc"
+PARAMS = {"strategy": "test", "chunk_size": 60}
+
+
+def _pages(*texts):
+    return [Document(page_content=t, metadata={"page": i, "total_pages": len(texts)}) for i, t in enumerate(texts)]
+
+
+def _sync(pages, embeddings, chunk_size=60):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=0, add_start_index=True)
+    params = dict(PARAMS, chunk_size=chunk_size)
+    return sync_vector_store(DB_PATH, pages, embeddings, "hashed", splitter.split_documents, params)
+
+
+class CountingEmbeddings(HashedBowEmbeddings):
+    def __init__(self):
+        super().__init__(64)
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+
+PAGE_A = "Article one protects liberty. Article two protects equality before the law."
+PAGE_B = "Section three covers appeals. Section four covers costs of the proceedings."
+PAGE_C = "Schedule five lists the repealed statutes and the transitional provisions."
+
+
+def test_first_build_adds_every_chunk(workdir, embeddings):
+    faiss_db, stats = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    assert stats["added"] == faiss_db.index.ntotal > 0
+    assert (stats["removed"], stats["kept"]) == (0, 0)
+    assert stats["version"] == active_version(DB_PATH)
+
+
+def test_unchanged_pages_keep_everything_and_publish_nothing(workdir, embeddings):
+    faiss_db, first = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    _, stats = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    assert (stats["added"], stats["removed"], stats["kept"]) == (0, 0, first["added"])
+    assert stats["version"] == first["version"]
+
+
+def test_changed_page_only_reembeds_its_own_chunks(workdir, embeddings):
+    _, first = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    page_b_chunks = len(load_index_state(DB_PATH)["pages"]["1"]["chunks"])
+    faiss_db, stats = _sync(_pages(PAGE_A, PAGE_C), embeddings)
+    page_c_chunks = len(load_index_state(DB_PATH)["pages"]["1"]["chunks"])
+    assert stats["added"] == page_c_chunks
+    assert stats["removed"] == page_b_chunks
+    assert stats["kept"] == first["added"] - page_b_chunks
+    assert faiss_db.index.ntotal == stats["kept"] + stats["added"]
+    assert stats["version"] != first["version"]
+
+
+def test_dropped_page_is_removed(workdir, embeddings):
+    _, first = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    faiss_db, stats = _sync(_pages(PAGE_A), embeddings)
+    assert stats["added"] == 0
+    assert stats["removed"] + stats["kept"] == first["added"]
+    assert faiss_db.index.ntotal == stats["kept"]
+    assert "liberty" in faiss_db.similarity_search("liberty", k=1)[0].page_content
+
+
+def test_reuploaded_pdf_with_the_same_pages_embeds_nothing(workdir):
+    embeddings = CountingEmbeddings()
+    _, first = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    assert len(embeddings.texts) == first["added"]
+    embeddings.texts.clear()
+    _, stats = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    assert embeddings.texts == []
+    assert stats["version"] == first["version"]
+
+
+def test_heading_carried_onto_a_page_changes_its_hash(workdir, embeddings):
+    _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    before = load_index_state(DB_PATH)["pages"]
+    pages = _pages(PAGE_A, PAGE_B)
+    pages[1].metadata["section_carry"] = "Article 2"
+    _sync(pages, embeddings)
+    after = load_index_state(DB_PATH)["pages"]
+    assert after["0"] == before["0"]
+    assert after["1"]["hash"] != before["1"]["hash"]
+
+
+def test_other_chunk_settings_reembed_every_page(workdir):
+    embeddings = CountingEmbeddings()
+    _, first = _sync(_pages(PAGE_A, PAGE_B), embeddings)
+    embeddings.texts.clear()
+    faiss_db, stats = _sync(_pages(PAGE_A, PAGE_B), embeddings, chunk_size=40)
+    assert stats["removed"] == first["added"]
+    assert stats["kept"] == 0
+    assert len(embeddings.texts) == stats["added"] == faiss_db.index.ntotal
+    assert load_index_state(DB_PATH)["chunking"]["chunk_size"] == 40
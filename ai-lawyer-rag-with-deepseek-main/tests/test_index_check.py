@@ -0,0 +1,138 @@
+import os
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from faiss_store import load_store
+from index_builder import sync_vector_store
+from index_check import FAIL, MIGRATE, NORMALIZE, RECLAIM, REBUILD, RELINK, check_library, repair_library
+from index_versions import active_path, active_version, write_version
+from ingest_jobs import STATUS_FAILED, STATUS_QUEUED, job_status
+from manifest import FRONTEND_DB_PATH, get_manifest_entry, upsert_manifest_entries
+
+TEXT = "Article one protects liberty. Article two protects equality before the law."
+
+
+def _index(db_path, embeddings, text=TEXT):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=60, chunk_overlap=0, add_start_index=True)
+    sync_vector_store(db_path, [Document(page_content=text, metadata={"page": 0})], embeddings, "hashed",
+                      splitter.split_documents, {"strategy": "test"})
+
+
+def _add(doc_id, embeddings, index=True, pdf=True, **fields):
+    db_path = f"vectorstore/db_faiss/{doc_id}"
+    pdf_path = f"pdfs/{doc_id}_contract.pdf"
+    os.makedirs("pdfs", exist_ok=True)
+    if pdf:
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-1.4\n")
+    if index:
+        _index(db_path, embeddings)
+    entry = {"doc_id": doc_id, "name": f"{doc_id}.pdf", "db_path": db_path, "pdf_path": pdf_path,
+             "embed_model": "hashed", "status": "ready"}
+    entry.update(fields)
+    upsert_manifest_entries([entry])
+    return entry
+
+
+def _kinds(issues):
+    return sorted((i["kind"], i["action"]) for i in issues)
+
+
+def test_consistent_library_has_no_issues(workdir, embeddings):
+    _add("d1", embeddings)
+    assert check_library(grace=0) == []
+
+
+def test_windows_paths_are_normalized(workdir, embeddings):
+    _add("d1", embeddings, db_path="vectorstore\\db_faiss\\d1", pdf_path="pdfs\\d1_contract.pdf")
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("path", NORMALIZE)]
+    assert repair_library(issues)["fixed"] == issues
+    assert get_manifest_entry("d1")["db_path"] == os.path.normpath("vectorstore/db_faiss/d1")
+    assert check_library(grace=0) == []
+
+
+def test_moved_pdf_is_relinked(workdir, embeddings):
+    _add("d1", embeddings, pdf_path="pdfs/old_name.pdf")
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("pdf_moved", RELINK)]
+    repair_library(issues)
+    assert get_manifest_entry("d1")["pdf_path"] == os.path.join("pdfs", "d1_contract.pdf")
+    assert check_library(grace=0) == []
+
+
+def test_missing_pdf_fails_the_entry(workdir, embeddings):
+    _add("d1", embeddings, pdf=False)
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("missing_pdf", FAIL)]
+    repair_library(issues)
+    assert job_status(get_manifest_entry("d1")) == STATUS_FAILED
+    assert check_library(grace=0) == []
+
+
+def test_missing_index_is_queued(workdir, embeddings):
+    _add("d1", embeddings, index=False)
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("missing_index", REBUILD)]
+    assert repair_library(issues)["queued"] == ["d1"]
+    assert job_status(get_manifest_entry("d1")) == STATUS_QUEUED
+
+
+def test_unreadable_index_is_retired_then_queued(workdir, embeddings):
+    entry = _add("d1", embeddings)
+    with open(os.path.join(active_path(entry["db_path"]), "index.faiss"), "wb") as f:
+        f.write(b"garbage")
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("unreadable_index", REBUILD)]
+    assert repair_library(issues)["queued"] == ["d1"]
+    assert active_version(entry["db_path"]) is None
+    assert job_status(get_manifest_entry("d1")) == STATUS_QUEUED
+
+
+def test_orphan_index_waits_for_the_grace_period(workdir, embeddings):
+    _add("d1", embeddings)
+    orphan = os.path.join("vectorstore", "db_faiss", "ghost")
+    os.makedirs(orphan)
+    with open(os.path.join(orphan, "index.faiss"), "wb") as f:
+        f.write(b"\0" * 64)
+    assert check_library() == []
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("orphan_index", RECLAIM)]
+    assert issues[0]["bytes"] == 64
+    repair_library(issues)
+    assert not os.path.exists(orphan)
+
+
+def test_frontend_index_survives_repair(workdir, embeddings, monkeypatch):
+    monkeypatch.setattr("index_check.STAGING_GRACE_SECONDS", 0)
+    monkeypatch.setattr("index_versions.STAGING_GRACE_SECONDS", 0)
+    _add("d1", embeddings)
+    _index(FRONTEND_DB_PATH, embeddings)
+    first = active_version(FRONTEND_DB_PATH)
+    _index(FRONTEND_DB_PATH, embeddings, text="Section three covers appeals and the costs of the proceedings.")
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("old_versions", RECLAIM)]
+    repair_library(issues)
+    active = active_version(FRONTEND_DB_PATH)
+    assert active not in (None, first)
+    assert not os.path.exists(os.path.join(FRONTEND_DB_PATH, first))
+    assert "appeals" in load_store(FRONTEND_DB_PATH, embeddings).similarity_search("appeals", k=1)[0].page_content
+
+
+def test_legacy_pickle_is_migrated(workdir, embeddings):
+    entry = _add("d1", embeddings, index=False)
+
+    def write(path):
+        FAISS.from_texts(["Article one protects liberty.", "Article two protects equality."],
+                         embeddings).save_local(path)
+
+    _, lease = write_version(entry["db_path"], write)
+    lease.release()
+    issues = check_library(grace=0)
+    assert _kinds(issues) == [("legacy_pickle", MIGRATE)]
+    repair_library(issues)
+    assert check_library(grace=0) == []
+    faiss_db = load_store(entry["db_path"], embeddings)
+    assert "liberty" in faiss_db.similarity_search("liberty", k=1)[0].page_content
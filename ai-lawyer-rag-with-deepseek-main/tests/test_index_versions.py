@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import index_versions
+from index_versions import (
+    LEGACY_FILES, VERSION_POINTER, active_path, active_version, gc_versions, list_versions, new_version, open_active,
+    publish, write_version,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_staging_grace(monkeypatch):
+    monkeypatch.setattr(index_versions, "STAGING_GRACE_SECONDS", 0)
+
+
+def _publish(root, payload=b"index"):
+    """Publish a version without write_version()'s own collection."""
+    path, lease = new_version(str(root))
+    with open(os.path.join(path, "index.faiss"), "wb") as f:
+        f.write(payload)
+    publish(str(root), path)
+    lease.release()
+    return os.path.basename(path)
+
+
+def test_gc_keeps_the_current_version(tmp_path):
+    first = _publish(tmp_path)
+    second = _publish(tmp_path)
+    assert gc_versions(str(tmp_path)) == 1
+    assert list_versions(str(tmp_path)) == [second]
+    assert active_version(str(tmp_path)) == second
+    assert first != second
+
+
+def test_gc_keeps_a_leased_version_until_it_is_released(tmp_path):
+    first = _publish(tmp_path)
+    path, lease = open_active(str(tmp_path))
+    assert os.path.basename(path) == first
+    second = _publish(tmp_path)
+    assert gc_versions(str(tmp_path)) == 0
+    assert list_versions(str(tmp_path)) == [first, second]
+    with open(os.path.join(path, "index.faiss"), "rb") as f:
+        assert f.read() == b"index"
+    lease.release()
+    assert gc_versions(str(tmp_path)) == 1
+    assert list_versions(str(tmp_path)) == [second]
+
+
+def test_gc_leaves_young_unpublished_versions(tmp_path, monkeypatch):
+    _publish(tmp_path)
+    monkeypatch.setattr(index_versions, "STAGING_GRACE_SECONDS", 60)
+    _publish(tmp_path)
+    assert gc_versions(str(tmp_path)) == 0
+    assert len(list_versions(str(tmp_path))) == 2
+
+
+def test_gc_without_a_current_version_removes_nothing(tmp_path):
+    _publish(tmp_path)
+    _publish(tmp_path)
+    os.remove(os.path.join(tmp_path, VERSION_POINTER))
+    assert gc_versions(str(tmp_path)) == 0
+    assert len(list_versions(str(tmp_path))) == 2
+
+
+def test_unversioned_root_is_active_until_the_first_publish(tmp_path):
+    with open(os.path.join(tmp_path, LEGACY_FILES[0]), "wb") as f:
+        f.write(b"old")
+    assert active_path(str(tmp_path)) == str(tmp_path)
+    version = _publish(tmp_path)
+    gc_versions(str(tmp_path))
+    assert active_path(str(tmp_path)) == os.path.join(str(tmp_path), version)
+    assert not os.path.exists(os.path.join(tmp_path, LEGACY_FILES[0]))
+
+
+def test_failed_write_leaves_nothing_and_a_publish_collects(tmp_path):
+    first = _publish(tmp_path)
+    current = _publish(tmp_path)
+
+    def fail(path):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        write_version(str(tmp_path), fail)
+    assert list_versions(str(tmp_path)) == [first, current]
+    assert active_version(str(tmp_path)) == current
+    path, lease = write_version(str(tmp_path), lambda p: open(os.path.join(p, "index.faiss"), "wb").close())
+    lease.release()
+    assert list_versions(str(tmp_path)) == [os.path.basename(path)]
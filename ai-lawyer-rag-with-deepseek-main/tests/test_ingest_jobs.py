@@ -0,0 +1,70 @@
+import ingest_jobs
+from ingest_jobs import STATUS_EMBEDDING, STATUS_FAILED, STATUS_PARSING, STATUS_READY, IngestWorker, job_status
+from manifest import get_manifest_entry, upsert_manifest_entries
+
+
+def _run(build_fn):
+    upsert_manifest_entries([{"doc_id": "d1", "name": "lease.pdf"}])
+    worker = IngestWorker(build_fn)
+    worker.submit("d1")
+    worker._queue.join()
+    return get_manifest_entry("d1")
+
+
+def _snapshot():
+    entry = get_manifest_entry("d1")
+    return job_status(entry), entry.get("progress"), entry.get("embedded_chunks")
+
+
+def test_parsing_until_the_first_batch_is_embedded(workdir, monkeypatch):
+    monkeypatch.setattr(ingest_jobs, "PROGRESS_WRITE_INTERVAL", 0.0)
+    seen = []
+
+    def build(entry, progress, embed_progress):
+        seen.append(_snapshot())
+        progress(1, 4)
+        progress(2, 4)
+        seen.append(_snapshot())
+        embed_progress(8, 8)
+        seen.append(_snapshot())
+        progress(3, 4)
+        embed_progress(5, 5)
+        seen.append(_snapshot())
+        return {"added": 13, "version": "v1"}
+
+    entry = _run(build)
+    assert seen == [
+        (STATUS_PARSING, 0.0, 0),
+        (STATUS_PARSING, 0.5, 0),
+        (STATUS_EMBEDDING, 0.5, 8),
+        (STATUS_EMBEDDING, 0.75, 13),
+    ]
+    assert job_status(entry) == STATUS_READY
+    assert entry["progress"] == 1.0
+    assert entry["index_stats"] == {"added": 13, "version": "v1"}
+    assert entry["index_version"] == "v1"
+
+
+def test_progress_writes_are_throttled_but_not_the_switch_to_embedding(workdir):
+    seen = []
+
+    def build(entry, progress, embed_progress):
+        progress(1, 4)
+        seen.append(_snapshot())
+        embed_progress(8, 8)
+        embed_progress(5, 5)
+        seen.append(_snapshot())
+        return None
+
+    entry = _run(build)
+    assert seen == [(STATUS_PARSING, 0.0, 0), (STATUS_EMBEDDING, 0.0, 8)]
+    assert job_status(entry) == STATUS_READY
+
+
+def test_build_error_fails_the_job(workdir, capsys):
+    def build(entry, progress, embed_progress):
+        raise ValueError("no text layer")
+
+    entry = _run(build)
+    assert job_status(entry) == STATUS_FAILED
+    assert entry["error"] == "ValueError: no text layer"
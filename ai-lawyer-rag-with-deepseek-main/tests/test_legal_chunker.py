@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from legal_chunker import LegalTextSplitter, annotate_headings, find_headings, last_heading
+
+PROVISION = "The tenant shall keep the premises in good repair and condition. " * 8
+
+
+def test_find_headings_skips_running_text():
+    text = (
+        "Article 1. Definitions\n"
+        "In this Act the following terms apply.\n"
+        "Section 3 of the previous Act, as amended by the Finance Act and several later instruments, is repealed\n"
+        "Section 4,\n"
+        "SCHEDULE A\n"
+    )
+    assert [h for _, h in find_headings(text)] == ["Article 1. Definitions", "SCHEDULE A"]
+    assert last_heading(text) == "SCHEDULE A"
+    assert last_heading("no headings here") is None
+
+
+def test_splits_at_headings_and_records_them():
+    text = f"Article 1\n{PROVISION}\nArticle 2\n{PROVISION}\n"
+    chunks = LegalTextSplitter(chunk_size=600, min_chunk=100).split_documents([Document(page_content=text)])
+    assert [c.metadata["section"] for c in chunks] == ["Article 1", "Article 2"]
+    assert chunks[1].page_content.startswith("Article 2")
+    assert text[chunks[1].metadata["start_index"]:].startswith("Article 2")
+
+
+def test_packs_short_provisions_together():
+    text = "Clause 1\nRent is due monthly.\nClause 2\nDeposits are refundable.\n"
+    chunks = LegalTextSplitter(chunk_size=600, min_chunk=100).split_documents([Document(page_content=text)])
+    assert len(chunks) == 1
+    assert chunks[0].metadata["headings"] == ["Clause 1", "Clause 2"]
+
+
+def test_oversized_provision_falls_back_to_character_split():
+    text = f"Section 5\n{PROVISION * 3}"
+    chunks = LegalTextSplitter(chunk_size=600, min_chunk=100).split_documents([Document(page_content=text)])
+    assert len(chunks) > 1
+    assert all(len(c.page_content) <= 600 for c in chunks)
+    assert all(c.metadata["section"] == "Section 5" for c in chunks)
+
+
+def test_heading_carries_over_to_next_page():
+    pages = [
+        Document(page_content=f"Article 7\n{PROVISION}", metadata={"page": 0}),
+        Document(page_content="continued text of the article without a heading.", metadata={"page": 1}),
+    ]
+    chunks = LegalTextSplitter(chunk_size=600, min_chunk=100).split_documents(annotate_headings(pages))
+    assert chunks[-1].metadata["page"] == 1
+    assert chunks[-1].metadata["section"] == "Article 7"
+    assert "section_carry" not in chunks[-1].metadata
@@ -0,0 +1,109 @@
+import json
+import threading
+from types import SimpleNamespace
+
+from llm_rerank import (
+    CHARS_PER_TOKEN, _fit, estimate_tokens, listwise_prompt, parse_listwise, parse_score, rank_listwise, score_chunks,
+)
+
+
+class FakeClient:
+    """Chat client replying per chunk; "slow" chunks wait until release is set."""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.release = threading.Event()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, **kwargs):
+        chunk = messages[0]["content"].rsplit("Chunk:\n", 1)[-1]
+        reply = self.replies[chunk]
+        if reply == "slow":
+            self.release.wait(5)
+            reply = "0.9"
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+
+def test_parse_score_clamps_and_rejects_text():
+    assert parse_score(" 0.25\n") == 0.25
+    assert parse_score("1.7") == 1.0
+    assert parse_score("-2") == 0.0
+    assert parse_score("Highly relevant") is None
+    assert parse_score(None) is None
+
+
+def test_late_failed_and_unparseable_scores_are_none():
+    client = FakeClient({"a": "0.8", "b": "slow", "c": "relevant", "d": RuntimeError("rate limited")})
+    try:
+        scores = score_chunks(client, "m", "query", ["a", "b", "c", "d"], timeout=0.3)
+    finally:
+        client.release.set()
+    assert scores == [0.8, None, None, None]
+
+
+def test_no_chunks_makes_no_calls():
+    assert score_chunks(FakeClient({}), "m", "query", []) == []
+
+
+def test_parse_listwise_reads_json_inside_prose():
+    reply = 'Sure: {"scores": [{"id": 2, "score": 0.9}, {"id": 1, "score": "0.4"}]} Hope this helps.'
+    assert parse_listwise(reply, 3) == [0.4, 0.9, None]
+
+
+def test_parse_listwise_skips_bad_items():
+    reply = json.dumps({"scores": [
+        {"id": 1, "score": 1.5}, {"id": 0, "score": 0.5}, {"id": 9, "score": 0.5},
+        {"id": 3}, {"id": "x", "score": 0.2}, "4:0.8", {"id": 2, "score": None},
+    ]})
+    assert parse_listwise(reply, 4) == [1.0, None, None, None]
+
+
+def test_parse_listwise_malformed_or_truncated_reply():
+    assert parse_listwise("I cannot rank these passages.", 2) == [None, None]
+    assert parse_listwise('{"scores": [{"id": 1, "score": 0.7}, {"id": 2, "sc', 2) == [None, None]
+    assert parse_listwise('{"scores": {"1": 0.7}}', 2) == [None, None]
+    assert parse_listwise("[1, 2]", 2) == [None, None]
+    assert parse_listwise(None, 1) == [None]
+
+
+def test_fit_truncates_the_longest_candidates_first():
+    assert _fit([100, 500, 900], 2000) == 900
+    cap = _fit([100, 500, 900], 900)
+    assert cap == 400
+    assert sum(min(n, cap) for n in (100, 500, 900)) <= 900
+    assert _fit([], 100) == 0
+
+
+def test_listwise_prompt_stays_within_the_budget():
+    chunks = ["a" * 4000, "b" * 400, "c" * 4000]
+    prompt, n = listwise_prompt("query", chunks, budget=1000)
+    assert n == 3
+    assert estimate_tokens(prompt) + n * 12 <= 1000
+    assert "b" * 400 in prompt
+    assert listwise_prompt("query", chunks, budget=10)[1] == 0
+
+
+def test_listwise_prompt_drops_trailing_candidates_that_cannot_fit():
+    chunks = ["x" * 48 * CHARS_PER_TOKEN] * 20
+    _, n = listwise_prompt("query", chunks, budget=1000)
+    assert 0 < n < 20
+
+
+def test_rank_listwise_leaves_unscored_candidates_none():
+    reply = json.dumps({"scores": [{"id": 1, "score": 0.3}]})
+    def create(model, messages, **kwargs):
+        assert kwargs["response_format"] == {"type": "json_object"}
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert rank_listwise(client, "m", "query", ["a", "b"]) == [0.3, None]
+
+
+def test_rank_listwise_failed_call_scores_nothing():
+    def create(model, messages, **kwargs):
+        raise TimeoutError("read timed out")
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert rank_listwise(client, "m", "query", ["a", "b"]) == [None, None]
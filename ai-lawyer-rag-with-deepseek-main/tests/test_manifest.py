@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from manifest import ManifestStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ManifestStore(str(tmp_path / "manifest.sqlite"), json_path=None)
+    store.upsert([
+        {"doc_id": "d1", "name": "Tenancy Agreement 2021.pdf", "created_at": "2021-03-01", "tags": ["lease"]},
+        {"doc_id": "d2", "name": "Employment  CONTRACT.pdf", "created_at": "2022-06-15", "tags": ["hr"]},
+        {"doc_id": "d3", "name": "Lease renewal - tenancy.pdf", "created_at": "2023-01-10", "tags": ["lease", "hr"]},
+        {"doc_id": "d4", "name": "Straße notes.pdf", "created_at": "2024-02-02"},
+    ])
+    return store
+
+
+def test_no_filter_and_empty_tags(store):
+    assert store.match_ids() is None
+    assert store.match_ids(tags=[]) == []
+
+
+def test_name_contains_is_case_insensitive_and_in_library_order(store):
+    assert store.match_ids(name_contains="TENANCY") == ["d1", "d3"]
+    assert store.match_ids(name_contains="employment contract") == ["d2"]
+    assert store.match_ids(name_contains="STRASSE") == ["d4"]
+
+
+def test_trigram_candidates_are_checked_against_the_whole_needle(store):
+    # Every trigram of the needle occurs in d1's name, but not the needle itself.
+    assert store.match_ids(name_contains="agreement 2022") == []
+    assert store.match_ids(name_contains="nowhere") == []
+
+
+def test_short_needle_scans_names(store):
+    assert store.match_ids(name_contains="Le") == ["d3"]
+    assert store.match_ids(name_contains="20") == ["d1"]
+
+
+def test_prefix_tags_and_dates_combine(store):
+    assert store.match_ids(name_prefix="lease") == ["d3"]
+    assert store.match_ids(tags=["lease"]) == ["d1", "d3"]
+    assert store.match_ids(tags=["hr"], name_contains="pdf") == ["d2", "d3"]
+    assert store.match_ids(created_from="2022-01-01", created_to="2023-12-31") == ["d2", "d3"]
+
+
+def test_rename_and_delete_update_the_name_index(store):
+    store.update("d2", {"name": "Consultancy tenancy.pdf"})
+    assert store.match_ids(name_contains="tenancy") == ["d1", "d2", "d3"]
+    assert store.match_ids(name_contains="employment") == []
+    store.delete("d1")
+    assert store.match_ids(name_contains="tenancy") == ["d2", "d3"]
+
+
+def test_legacy_json_is_imported_once_and_left_in_place(tmp_path):
+    json_path = tmp_path / "manifest.json"
+    json_path.write_text(json.dumps([
+        {"doc_id": "d1", "name": "Tenancy Agreement.pdf", "tags": ["lease"], "embed_model": "nomic-embed-text"},
+        {"name": "no id, skipped"},
+        {"doc_id": "d2", "name": "Employment Contract.pdf"},
+    ]), encoding="utf-8")
+    db_path = str(tmp_path / "manifest.sqlite")
+    store = ManifestStore(db_path, json_path=str(json_path))
+    assert [e["doc_id"] for e in store.entries()] == ["d1", "d2"]
+    assert store.get("d1")["embed_model"] == "nomic-embed-text"
+    assert store.match_ids(tags=["lease"]) == ["d1"]
+    assert store.match_ids(name_contains="contract") == ["d2"]
+    assert json_path.exists()
+
+    # Later changes live in SQLite only; reopening must not bring the JSON rows back
+    store.delete("d1")
+    json_path.write_text(json.dumps([{"doc_id": "d3", "name": "Added to the JSON later.pdf"}]), encoding="utf-8")
+    reopened = ManifestStore(db_path, json_path=str(json_path))
+    assert [e["doc_id"] for e in reopened.entries()] == ["d2"]
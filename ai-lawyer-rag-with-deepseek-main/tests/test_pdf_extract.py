@@ -0,0 +1,78 @@
+import pdf_extract
+from pdf_extract import _needs_layout_fallback, iter_pdf_pages
+
+
+def _write_pdf(path, pages):
+    """A minimal PDF with one line of Helvetica text per page."""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(count))
+        + b"] /Count %d >>" % count,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = b"BT /F1 12 Tf 72 720 Td (" + text.encode("latin-1") + b") Tj ET"
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return str(path)
+
+
+PAGES = ["Article 1. The lessee shall pay the rent monthly.", "Article 2. The lessor shall keep the roof in repair."]
+
+
+def test_needs_layout_fallback():
+    assert _needs_layout_fallback("")
+    assert _needs_layout_fallback("   12  \n")
+    assert _needs_layout_fallback("�" * 10 + "Article one of the Act")
+    assert not _needs_layout_fallback("Article one of the Act applies.")
+
+
+def test_pages_in_order_with_loader_metadata(tmp_path):
+    path = _write_pdf(tmp_path / "lease.pdf", PAGES)
+    pages = list(iter_pdf_pages(path, workers=1))
+    assert [p.page_content.strip() for p in pages] == PAGES
+    assert [p.metadata["page"] for p in pages] == [0, 1]
+    assert all(p.metadata["total_pages"] == 2 and p.metadata["source"] == path for p in pages)
+    assert all(p.page_content.endswith("\n") for p in pages)
+
+
+def test_empty_pdfium_page_falls_back_to_pdfplumber(tmp_path, monkeypatch):
+    path = _write_pdf(tmp_path / "lease.pdf", PAGES)
+    normalize = pdf_extract._normalize_pdfium_text
+    pdfium_pages = []
+
+    def blank_second_page(text):
+        text = normalize(text)
+        pdfium_pages.append(text)
+        return "" if "lessor" in text else text
+
+    monkeypatch.setattr(pdf_extract, "_normalize_pdfium_text", blank_second_page)
+    pages = list(iter_pdf_pages(path, workers=1))
+    assert len(pdfium_pages) == 2
+    assert [p.page_content.strip() for p in pages] == PAGES
+
+
+def test_fallback_keeps_pdfium_text_when_pdfplumber_finds_less(tmp_path, monkeypatch):
+    path = _write_pdf(tmp_path / "scan.pdf", ["x"])
+    monkeypatch.setattr(pdf_extract, "_plumber_page_text", lambda pdf, number: "")
+    assert [p.page_content for p in iter_pdf_pages(path, workers=1)] == ["x\n"]
+
+
+def test_parallel_ranges_yield_in_page_order(tmp_path, monkeypatch):
+    texts = [f"Section {i}. Provision number {i} of the schedule." for i in range(5)]
+    path = _write_pdf(tmp_path / "act.pdf", texts)
+    monkeypatch.setattr(pdf_extract, "PDF_PAGES_PER_TASK", 2)
+    pages = list(iter_pdf_pages(path, workers=2))
+    assert [p.page_content.strip() for p in pages] == texts
@@ -0,0 +1,70 @@
+import os
+
+from index_versions import write_version
+from store_cache import VectorStoreCache
+
+
+def _publish(root, payload=b"index"):
+    def write(path):
+        with open(os.path.join(path, "index.faiss"), "wb") as f:
+            f.write(payload)
+
+    _, lease = write_version(str(root), write)
+    lease.release()
+
+
+def _replace_in_place(root, payload, mtime_ns):
+    path = os.path.join(root, "index.faiss")
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_hit_until_a_new_version_is_published(tmp_path):
+    cache = VectorStoreCache()
+    _publish(tmp_path)
+    first = cache.get(str(tmp_path), "m", object)
+    assert cache.get(str(tmp_path), "m", lambda: None) is first
+    _publish(tmp_path, b"rebuilt")
+    second = cache.get(str(tmp_path), "m", object)
+    assert second is not first
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+
+def test_replaced_file_with_the_same_mtime_is_a_new_key(tmp_path):
+    cache = VectorStoreCache()
+    _replace_in_place(tmp_path, b"old", 1_700_000_000_000_000_000)
+    first = cache.get(str(tmp_path), "m", object)
+    _replace_in_place(tmp_path, b"new", 1_700_000_000_000_000_000)
+    assert cache.get(str(tmp_path), "m", object) is not first
+
+
+def test_embed_model_is_part_of_the_key(tmp_path):
+    cache = VectorStoreCache()
+    _publish(tmp_path)
+    assert cache.get(str(tmp_path), "a", object) is not cache.get(str(tmp_path), "b", object)
+
+
+def test_missing_index_and_failed_loads_are_not_cached(tmp_path):
+    cache = VectorStoreCache()
+    assert cache.get(str(tmp_path), "m", lambda: None) is None
+    _publish(tmp_path)
+    assert cache.get(str(tmp_path), "m", lambda: None) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted_and_invalidate_drops(tmp_path):
+    cache = VectorStoreCache(max_entries=2)
+    roots = [tmp_path / name for name in "abc"]
+    for root in roots:
+        _publish(root)
+    a = cache.get(str(roots[0]), "m", object)
+    cache.get(str(roots[1]), "m", object)
+    assert cache.get(str(roots[0]), "m", object) is a
+    cache.get(str(roots[2]), "m", object)
+    assert cache.stats()["evictions"] == 1
+    assert cache.get(str(roots[0]), "m", object) is a
+    assert cache.invalidate(str(roots[0])) == 1
+    assert cache.get(str(roots[0]), "m", object) is not a
@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+
+from langchain_core.documents import Document
+
+import vector_database
+from index_builder import sync_vector_store
+from manifest import ensure_dirs
+
+PDF_BYTES = b"%PDF-1.4\nlease agreement\n"
+
+
+def _ingest(workdir, embeddings, indexed_chunking):
+    ensure_dirs()
+    source = workdir / "lease.pdf"
+    source.write_bytes(PDF_BYTES)
+    doc_id = hashlib.sha256(PDF_BYTES).hexdigest()
+    db_path = os.path.join("vectorstore", "db_faiss", doc_id)
+    pages = [Document(page_content="Article 1\nThe tenant pays the rent monthly.", metadata={"page": 0})]
+    sync_vector_store(db_path, pages, embeddings, "hashed", vector_database.create_chunks, indexed_chunking)
+    known = {doc_id: {"doc_id": doc_id, "db_path": db_path, "embed_model": "hashed", "status": "ready"}}
+    return vector_database.ingest_one(f"file:{source}", "lease.pdf", "hashed", known, set(), threading.Lock())
+
+
+def test_document_indexed_with_current_chunking_is_a_duplicate(workdir, embeddings):
+    result = _ingest(workdir, embeddings, vector_database.chunk_params())
+    assert result["status"] == "duplicate"
+    assert os.listdir("pdfs") == []
+
+
+def test_document_indexed_with_other_chunking_is_reindexed(workdir, embeddings, monkeypatch):
+    calls = []
+
+    def index_pdf(pdf_path, db_path, model_name, doc_id, quantization):
+        calls.append(doc_id)
+        return None, {"added": 1, "removed": 1, "kept": 0, "version": "v2"}
+
+    monkeypatch.setattr(vector_database, "index_pdf", index_pdf)
+    result = _ingest(workdir, embeddings, {"splitter": "recursive", "chunk_size": 1000, "chunk_overlap": 200})
+    assert result["status"] == "indexed"
+    assert calls == [result["doc_id"]]
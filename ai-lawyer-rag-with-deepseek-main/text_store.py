@@ -0,0 +1,140 @@
+"""Per-document store of extracted page text (vectorstore/text/<doc_id>.zst).
+
+Text is extracted once, while a document is indexed, and every later reader
+(rebuilds, the risk engine, the citation validator, the Ask fallback) gets
+pages from here instead of parsing the PDF again. Each page is its own zstd
+frame so a single page can be read without decompressing the rest; the frame
+offsets and the shared page metadata live in a small JSON sidecar.
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import zstandard as zstd  # type: ignore
+from langchain_core.documents import Document
+
+from pdf_extract import iter_pdf_pages
+
+TEXT_STORE_ROOT = os.environ.get("TEXT_STORE_ROOT", os.path.join("vectorstore", "text"))
+TEXT_STORE_LEVEL = int(os.environ.get("TEXT_STORE_LEVEL", "10"))
+TEXT_STORE_VERSION = 1
+
+
+def _paths(doc_id: str):
+    base = os.path.join(TEXT_STORE_ROOT, doc_id)
+    return base + ".zst", base + ".json"
+
+
+def has_text_store(doc_id: str) -> bool:
+    return all(os.path.exists(p) for p in _paths(doc_id))
+
+
+def delete_text_store(doc_id: str):
+    for path in _paths(doc_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def write_through(doc_id: str, pages: Iterable[Document]) -> Iterator[Document]:
+    """Pass pages through unchanged while storing them; the store appears only if all pages are consumed."""
+    os.makedirs(TEXT_STORE_ROOT, exist_ok=True)
+    data_path, index_path = _paths(doc_id)
+    suffix = f".{threading.get_ident()}-{time.time_ns()}.tmp"
+    compressor = zstd.ZstdCompressor(level=TEXT_STORE_LEVEL)
+    offsets: List[List[int]] = []
+    shared: Optional[Dict] = None
+    raw_bytes = 0
+    try:
+        with open(data_path + suffix, "wb") as out:
+            for page in pages:
+                if shared is None:
+                    shared = {k: v for k, v in page.metadata.items() if k != "page"}
+                raw = page.page_content.encode("utf-8")
+                frame = compressor.compress(raw)
+                offsets.append([out.tell(), len(frame)])
+                out.write(frame)
+                raw_bytes += len(raw)
+                yield page
+        with open(index_path + suffix, "w", encoding="utf-8") as f:
+            json.dump({"version": TEXT_STORE_VERSION, "metadata": shared or {}, "pages": offsets,
+                       "raw_bytes": raw_bytes}, f)
+        # Data first: a reader that sees the new index always finds matching frames.
+        os.replace(data_path + suffix, data_path)
+        os.replace(index_path + suffix, index_path)
+    finally:
+        for path in (data_path + suffix, index_path + suffix):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class PageTextStore:
+    """Random access to the stored pages of one document."""
+
+    def __init__(self, doc_id: str):
+        data_path, index_path = _paths(doc_id)
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != TEXT_STORE_VERSION:
+            raise ValueError(f"unsupported text store version {index.get('version')}")
+        self.data_path = data_path
+        self.metadata: Dict = index.get("metadata", {})
+        self.offsets: List[List[int]] = index.get("pages", [])
+        self.raw_bytes: int = index.get("raw_bytes", 0)
+        self._decompressor = zstd.ZstdDecompressor()
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def _document(self, number: int, frame: bytes) -> Document:
+        text = self._decompressor.decompress(frame).decode("utf-8")
+        return Document(page_content=text, metadata={**self.metadata, "page": number})
+
+    def page(self, number: int) -> Document:
+        offset, length = self.offsets[number]
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            return self._document(number, f.read(length))
+
+    def iter_pages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Document]:
+        stop = len(self.offsets) if stop is None else min(stop, len(self.offsets))
+        with open(self.data_path, "rb") as f:
+            for number in range(start, stop):
+                offset, length = self.offsets[number]
+                f.seek(offset)
+                yield self._document(number, f.read(length))
+
+    def stats(self) -> Dict:
+        return {"pages": len(self), "raw_bytes": self.raw_bytes, "stored_bytes": os.path.getsize(self.data_path)}
+
+
+def open_text_store(doc_id: str) -> Optional[PageTextStore]:
+    """The stored pages of doc_id, or None (an unreadable store is discarded)."""
+    if not has_text_store(doc_id):
+        return None
+    try:
+        return PageTextStore(doc_id)
+    except Exception:
+        delete_text_store(doc_id)
+        return None
+
+
+def iter_document_pages(doc_id: str, pdf_path: str) -> Iterator[Document]:
+    """Pages from the store, or extracted from the PDF (and stored) on first use."""
+    store = open_text_store(doc_id)
+    if store is not None:
+        return store.iter_pages()
+    return write_through(doc_id, iter_pdf_pages(pdf_path))
+
+
+def read_pages(doc_id: str, pdf_path: str, max_pages: Optional[int] = None) -> List[Document]:
+    """The first max_pages pages (all by default) without reparsing a stored document."""
+    store = open_text_store(doc_id)
+    if store is not None:
+        return list(store.iter_pages(0, max_pages))
+    # Extract everything once so the next reader hits the store.
+    pages = list(write_through(doc_id, iter_pdf_pages(pdf_path)))
+    return pages if max_pages is None else pages[:max_pages]
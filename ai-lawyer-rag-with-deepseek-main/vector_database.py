@@ -1,13 +1,43 @@
-from langchain_community.document_loaders import PDFPlumberLoader
+"""Indexing steps plus a bulk ingestion command line.
+
+    python vector_database.py ingest path/to/folder_or_archive.zip --workers 4
+    python vector_database.py migrate-corpus
+    python vector_database.py check --repair
+
+Run from the app directory so manifest and index paths match the Streamlit app.
+"""
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
+from embedding_cache import CachedEmbeddings
+from embedding_pipeline import BatchedEmbeddings
+from index_builder import load_index_state, sync_vector_store
+from pdf_extract import iter_pdf_pages
+from text_store import iter_document_pages
+from corpus_index import CORPUS_INDEX, corpus_path, get_corpus_index
+from ann_index import ANN_QUANTIZATION, QUANTIZATIONS
+from faiss_store import load_store, migrate_legacy_store
+from index_versions import has_index
+from index_check import CHECK_WORKERS, ORPHAN_GRACE_SECONDS, REPORT, check_library, repair_library
+from ingest_jobs import STATUS_FAILED, STATUS_READY, set_job_status
+from legal_chunker import LEGAL_CHUNK_SIZE, LEGAL_MIN_CHUNK, LegalTextSplitter, annotate_headings
+from manifest import FAISS_DB_ROOT, PDFS_DIR, ensure_dirs, get_manifest_entry, load_manifest, upsert_manifest_entries
+import argparse
+import hashlib
+import json
 import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 
+load_dotenv()
+
 #Step 1: Upload & Load raw PDF(s)
 
-pdfs_directory = 'pdfs/'
+pdfs_directory = PDFS_DIR
 
 def upload_pdf(file):
     with open(pdfs_directory + file.name, "wb") as f:
@@ -15,37 +45,384 @@ def upload_pdf(file):
 
 
 def load_pdf(file_path):
-    loader = PDFPlumberLoader(file_path)
-    documents = loader.load()
+    # pypdfium2 text with per-page pdfplumber fallback, page ranges extracted in parallel
+    documents = list(iter_pdf_pages(file_path))
     return documents
 
 
-file_path = 'universal_declaration_of_human_rights.pdf'
-documents = load_pdf(file_path)
-#print("PDF pages: ",len(documents))
+#Step 2: Create Chunks (main.py and frontend.py import these, so every entry point shares indexes)
+# "legal" splits on Article/Section/Clause/Schedule headings; "recursive" is the old 1000/200 splitter
+CHUNK_STRATEGY = os.environ.get("CHUNK_STRATEGY", "legal")
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
 
-#Step 2: Create Chunks
-def create_chunks(documents): 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size = 1000,
-        chunk_overlap = 200,
-        add_start_index = True
-    )
+def create_chunks(documents):
+    if CHUNK_STRATEGY == "legal":
+        text_splitter = LegalTextSplitter(chunk_size=LEGAL_CHUNK_SIZE, min_chunk=LEGAL_MIN_CHUNK)
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size = CHUNK_SIZE,
+            chunk_overlap = CHUNK_OVERLAP,
+            add_start_index = True
+        )
     text_chunks = text_splitter.split_documents(documents)
     return text_chunks
 
-text_chunks = create_chunks(documents)
-#print("Chunks count: ", len(text_chunks))
+
+def chunk_params() -> Dict:
+    if CHUNK_STRATEGY == "legal":
+        return {"splitter": "legal", "chunk_size": LEGAL_CHUNK_SIZE, "min_chunk": LEGAL_MIN_CHUNK}
+    return {"splitter": "recursive", "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP}
 
 
-load_dotenv()
 #Step 3: Setup Embeddings Model (Use lightweight Ollama embedding model by default)
 OLLAMA_EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text")
 def get_embedding_model(model_name: str):
-    embeddings = OllamaEmbeddings(model=model_name)
+    embeddings = CachedEmbeddings(BatchedEmbeddings(OllamaEmbeddings(model=model_name)), model_name)
     return embeddings
 
 #Step 4: Index Documents **Store embeddings in FAISS (vector store)
-FAISS_DB_PATH="vectorstore/db_faiss"
-faiss_db=FAISS.from_documents(text_chunks, get_embedding_model(OLLAMA_EMBED_MODEL))
-faiss_db.save_local(FAISS_DB_PATH)
+def index_pdf(pdf_path: str, db_path: str, model_name: str = OLLAMA_EMBED_MODEL, doc_id: Optional[str] = None,
+              quantization: Optional[str] = None):
+    """Stream one PDF into its FAISS index; returns (faiss_db, stats).
+
+    With a doc_id the page text is kept in (or read from) the text store.
+    """
+    pages = iter_document_pages(doc_id, pdf_path) if doc_id else iter_pdf_pages(pdf_path)
+    if CHUNK_STRATEGY == "legal":
+        pages = annotate_headings(pages)
+    return sync_vector_store(
+        db_path, pages, get_embedding_model(model_name), model_name, create_chunks, chunk_params(),
+        quantization=quantization,
+    )
+
+
+# ==================== Bulk ingestion ====================
+
+INGEST_CHECKPOINT_PATH = os.path.join("vectorstore", "ingest_checkpoint.json")
+_HASH_BLOCK = 1 << 20
+
+
+def _safe_name(name: str) -> str:
+    return os.path.basename(name.replace("\\", "/")).replace("/", "_")
+
+
+def _copy_hashed(src, dest_dir: str) -> Tuple[str, str, int]:
+    """Copy a binary stream into a temp file in dest_dir while hashing it; returns (doc_id, tmp_path, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(dest_dir, f".ingest-{threading.get_ident()}-{time.time_ns()}.part")
+    with open(tmp_path, "wb") as out:
+        while True:
+            block = src.read(_HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return digest.hexdigest(), tmp_path, size
+
+
+def iter_sources(path: str) -> Iterator[Tuple[str, str]]:
+    """Yield (source_key, display_name) for every PDF in a directory or .zip archive."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                member = info.filename
+                if info.is_dir() or member.startswith("__MACOSX/") or not member.lower().endswith(".pdf"):
+                    continue
+                yield f"zip:{os.path.abspath(path)}!{member}", member
+        return
+    for root, _, files in os.walk(path):
+        for fname in sorted(files):
+            if fname.lower().endswith(".pdf"):
+                full = os.path.join(root, fname)
+                yield f"file:{os.path.abspath(full)}", os.path.relpath(full, path)
+
+
+def _open_source(source_key: str):
+    kind, _, location = source_key.partition(":")
+    if kind == "zip":
+        archive, _, member = location.partition("!")
+        zf = zipfile.ZipFile(archive)
+        return zf, zf.open(member)
+    return None, open(location, "rb")
+
+
+class IngestCheckpoint:
+    """JSON record of finished sources so an interrupted run can resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.done = json.load(f).get("done", {})
+            except Exception:
+                self.done = {}
+
+    def mark(self, results: List[Dict]):
+        with self._lock:
+            for r in results:
+                self.done[r["source"]] = {"doc_id": r["doc_id"], "status": r["status"], "seconds": r["seconds"]}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"done": self.done}, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+def ingest_one(source_key: str, display_name: str, model_name: str, known: Dict[str, Dict],
+               claimed: set, claimed_lock: threading.Lock, force: bool = False,
+               quantization: Optional[str] = None) -> Dict:
+    """Copy, dedupe and index one PDF; returns a result dict with the manifest entry."""
+    started = time.perf_counter()
+    result = {"source": source_key, "name": display_name, "doc_id": None, "entry": None}
+    archive, stream = _open_source(source_key)
+    try:
+        doc_id, tmp_path, size = _copy_hashed(stream, PDFS_DIR)
+    finally:
+        stream.close()
+        if archive is not None:
+            archive.close()
+    result["doc_id"] = doc_id
+
+    with claimed_lock:
+        duplicate_in_run = doc_id in claimed
+        claimed.add(doc_id)
+    existing = known.get(doc_id)
+    already_indexed = (
+        existing is not None
+        and existing.get("embed_model") == model_name
+        and existing.get("status", "ready") == "ready"
+        and has_index(existing.get("db_path", ""))
+        # Indexed under another CHUNK_STRATEGY or chunk size: re-chunk rather than report a duplicate
+        and load_index_state(existing["db_path"]).get("chunking") == chunk_params()
+    )
+    if duplicate_in_run or (already_indexed and not force):
+        os.remove(tmp_path)
+        result.update(status="duplicate", seconds=time.perf_counter() - started)
+        return result
+
+    pdf_path = os.path.join(PDFS_DIR, f"{doc_id}_{_safe_name(display_name)}")
+    os.replace(tmp_path, pdf_path)
+    db_path = os.path.join(FAISS_DB_ROOT, doc_id)
+    entry = {
+        "doc_id": doc_id,
+        "name": _safe_name(display_name),
+        "size": size,
+        "created_at": (existing or {}).get("created_at") or datetime.utcnow().isoformat() + "Z",
+        "pdf_path": pdf_path,
+        "db_path": db_path,
+        "embed_model": model_name,
+        "quantization": quantization or (existing or {}).get("quantization") or ANN_QUANTIZATION,
+    }
+    if existing and existing.get("tags"):
+        entry["tags"] = existing["tags"]
+    try:
+        faiss_db, stats = index_pdf(pdf_path, db_path, model_name, doc_id, entry["quantization"])
+        if CORPUS_INDEX and faiss_db is not None:
+            # Saved once per flush by ingest_corpus
+            get_corpus_index(model_name, get_embedding_model(model_name)).upsert_document(
+                doc_id, faiss_db, entry["name"], save=False, source_path=db_path
+            )
+        entry.update(status="ready", progress=1.0, index_stats=stats, index_version=stats.get("version"),
+                     indexed_at=datetime.utcnow().isoformat() + "Z")
+        result.update(status="indexed", entry=entry, stats=stats)
+    except Exception as e:
+        entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+        result.update(status="failed", entry=entry, error=entry["error"])
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def ingest_corpus(path: str, model_name: str = OLLAMA_EMBED_MODEL, workers: int = 2,
+                  checkpoint_path: str = INGEST_CHECKPOINT_PATH, resume: bool = True,
+                  force: bool = False, flush_every: int = 20, quantization: Optional[str] = None) -> List[Dict]:
+    """Ingest every PDF under path (directory or .zip) in parallel, writing the manifest in bulk."""
+    ensure_dirs()
+    checkpoint = IngestCheckpoint(checkpoint_path)
+    sources = list(iter_sources(path))
+    if resume:
+        skipped = [s for s in sources if checkpoint.done.get(s[0], {}).get("status") in ("indexed", "duplicate")]
+        sources = [s for s in sources if s not in skipped]
+        if skipped:
+            print(f"Resuming: {len(skipped)} file(s) already done per {checkpoint_path}")
+    known = {e.get("doc_id"): e for e in load_manifest()}
+    claimed: set = set()
+    claimed_lock = threading.Lock()
+    results: List[Dict] = []
+    pending: List[Dict] = []
+    run_started = time.perf_counter()
+
+    def flush():
+        # Manifest first, then checkpoint: a crash in between only re-indexes, never loses entries.
+        if CORPUS_INDEX:
+            get_corpus_index(model_name, get_embedding_model(model_name)).save()
+        upsert_manifest_entries([r["entry"] for r in pending if r.get("entry")])
+        checkpoint.mark(pending)
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(ingest_one, key, name, model_name, known, claimed, claimed_lock, force, quantization)
+            for key, name in sources
+        ]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            pending.append(r)
+            extra = ""
+            if r.get("stats"):
+                extra = f" (+{r['stats']['added']} chunks, {r['stats']['kept']} unchanged"
+                if r["stats"].get("duplicates"):
+                    extra += f", {r['stats']['duplicates']} duplicates collapsed, {r['stats']['dedup_saved_bytes']} bytes saved"
+                extra += ")"
+            elif r.get("error"):
+                extra = f" ({r['error']})"
+            print(f"[{r['status']:>9}] {r['seconds']:7.2f}s  {r['name']}{extra}")
+            if len(pending) >= flush_every:
+                flush()
+    flush()
+
+    total = time.perf_counter() - run_started
+    counts: Dict[str, int] = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    summary = ", ".join(f"{v} {k}" for k, v in sorted(counts.items())) or "nothing to do"
+    print(f"Done in {total:.1f}s: {summary}")
+    return results
+
+
+def migrate_corpus(model_name: str = OLLAMA_EMBED_MODEL) -> Dict[str, int]:
+    """Copy every ready per-document index built with model_name into the corpus index."""
+    embeddings = get_embedding_model(model_name)
+    # Otherwise the corpus refuses to load, and so to accept the copies
+    if migrate_legacy_store(corpus_path(model_name), lexical=False):
+        print(f"Converted the pickled corpus index at {corpus_path(model_name)}")
+    corpus = get_corpus_index(model_name, embeddings)
+    counts = {"documents": 0, "vectors": 0, "skipped": 0}
+    for entry in load_manifest():
+        doc_id = entry.get("doc_id")
+        db_path = entry.get("db_path", "")
+        if (entry.get("embed_model") != model_name or entry.get("status", "ready") != "ready"
+                or not has_index(db_path)):
+            counts["skipped"] += 1
+            continue
+        try:
+            faiss_db = load_store(db_path, embeddings)
+            added = corpus.upsert_document(doc_id, faiss_db, entry.get("name"), save=False, source_path=db_path)
+        except Exception as e:
+            print(f"[   failed] {entry.get('name')}: {type(e).__name__}: {e}")
+            counts["skipped"] += 1
+            continue
+        counts["documents"] += 1
+        counts["vectors"] += added
+        print(f"[ migrated] {added:6d} vectors  {entry.get('name')}")
+    corpus.save()
+    print(f"Corpus index at {corpus.path}: {counts['documents']} documents, "
+          f"{counts['vectors']} vectors, {counts['skipped']} skipped")
+    return counts
+
+
+def rebuild_entries(doc_ids: List[str], workers: int = 2) -> Dict[str, int]:
+    """Re-index manifest entries now (check --repair --rebuild) instead of leaving them to the app's worker."""
+    counts = {"indexed": 0, "failed": 0}
+
+    def rebuild(doc_id: str):
+        entry = get_manifest_entry(doc_id)
+        if entry is None:
+            return None, "entry deleted"
+        model = entry.get("embed_model", OLLAMA_EMBED_MODEL)
+        try:
+            faiss_db, stats = index_pdf(entry["pdf_path"], entry["db_path"], model, doc_id, entry.get("quantization"))
+            if CORPUS_INDEX and faiss_db is not None:
+                get_corpus_index(model, get_embedding_model(model)).upsert_document(
+                    doc_id, faiss_db, entry.get("name"), source_path=entry["db_path"]
+                )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            set_job_status(doc_id, STATUS_FAILED, error=error)
+            return entry, error
+        set_job_status(doc_id, STATUS_READY, progress=1.0, index_stats=stats, index_version=stats.get("version"),
+                       indexed_at=datetime.utcnow().isoformat() + "Z")
+        return entry, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for entry, error in pool.map(rebuild, doc_ids):
+            counts["failed" if error else "indexed"] += 1
+            name = (entry or {}).get("name", "?")
+            print(f"[{'failed' if error else 'rebuilt':>9}] {name}" + (f" ({error})" if error else ""))
+    return counts
+
+
+def check_command(repair: bool = False, rebuild: bool = False, probe_dims: bool = False,
+                  grace: int = ORPHAN_GRACE_SECONDS, workers: int = CHECK_WORKERS) -> List[Dict]:
+    """Report (and with repair, fix) inconsistencies between the manifest, pdfs/ and the indexes."""
+    ensure_dirs()
+    expected_dims = None
+    if probe_dims:
+        models = {e.get("embed_model") for e in load_manifest() if e.get("embed_model")}
+        expected_dims = {m: len(get_embedding_model(m).embed_query("dimension probe")) for m in sorted(models)}
+    started = time.perf_counter()
+    issues = check_library(expected_dims, grace, workers)
+    for issue in issues:
+        target = issue["name"] or issue["path"]
+        size = f" [{issue['bytes'] / 2**20:.1f} MB]" if issue["bytes"] else ""
+        print(f"[{issue['action']:>9}] {issue['kind']:<16} {target}: {issue['detail']}{size}")
+    reclaimable = sum(i["bytes"] for i in issues if i["action"] != REPORT)
+    print(f"{len(issues)} issue(s) in {time.perf_counter() - started:.2f}s, "
+          f"{reclaimable / 2**20:.1f} MB reclaimable")
+    if not repair or not issues:
+        return issues
+    result = repair_library(issues, workers)
+    for issue, error in result["failed"]:
+        print(f"[   failed] {issue['kind']:<16} {issue['name'] or issue['path']}: {error}")
+    print(f"Repaired {len(result['fixed'])} issue(s), {len(result['queued'])} document(s) queued for rebuild")
+    if rebuild and result["queued"]:
+        rebuild_entries(result["queued"], workers=2)
+    return issues
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AI Lawyer RAG index management")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="Index every PDF in a folder or .zip archive")
+    p.add_argument("path", help="Directory (searched recursively) or .zip archive of PDFs")
+    p.add_argument("--workers", type=int, default=2, help="Files indexed in parallel")
+    p.add_argument("--embed-model", default=OLLAMA_EMBED_MODEL)
+    p.add_argument("--checkpoint", default=INGEST_CHECKPOINT_PATH)
+    p.add_argument("--no-resume", action="store_true", help="Ignore the checkpoint and process every file")
+    p.add_argument("--force", action="store_true", help="Re-index documents that already have an index")
+    p.add_argument("--flush-every", type=int, default=20, help="Files per bulk manifest write")
+    p.add_argument("--quantization", choices=QUANTIZATIONS, default=None,
+                   help=f"Vector storage for new indexes (default ANN_QUANTIZATION={ANN_QUANTIZATION})")
+
+    p = sub.add_parser("migrate-corpus", help="Copy existing per-document indexes into the corpus-wide index")
+    p.add_argument("--embed-model", default=OLLAMA_EMBED_MODEL)
+
+    p = sub.add_parser("check", help="Reconcile the manifest, pdfs/ and index directories")
+    p.add_argument("--repair", action="store_true",
+                   help="Normalize paths, convert pickled indexes, queue rebuilds of broken ones and reclaim disk space")
+    p.add_argument("--rebuild", action="store_true", help="With --repair, rebuild queued indexes now")
+    p.add_argument("--probe-dims", action="store_true",
+                   help="Ask each embed model for its dimension instead of trusting the majority of indexes")
+    p.add_argument("--grace", type=int, default=ORPHAN_GRACE_SECONDS,
+                   help="Seconds before unreferenced index directories and temp files are reclaimed")
+    p.add_argument("--workers", type=int, default=CHECK_WORKERS)
+
+    args = parser.parse_args(argv)
+    if args.command == "ingest":
+        ingest_corpus(args.path, args.embed_model, args.workers, args.checkpoint,
+                      resume=not args.no_resume, force=args.force, flush_every=args.flush_every,
+                      quantization=args.quantization)
+    elif args.command == "migrate-corpus":
+        migrate_corpus(args.embed_model)
+    elif args.command == "check":
+        check_command(args.repair, args.rebuild, args.probe_dims, args.grace, args.workers)
+
+
+if __name__ == "__main__":
+    main()